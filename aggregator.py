@@ -0,0 +1,163 @@
+import numpy as np
+
+# Snapshot of one closed bar: per-slot sample count, field sums (fields x slots) and last values
+class ClosedBar:
+    def __init__(self, timestamp: int, symbols: list, count: np.ndarray, sums: np.ndarray, last: dict,
+                 fields=("r", "p", "i")):
+        self.timestamp = timestamp   # bar close, aligned to the interval
+        self.symbols = symbols       # row slot -> symbol
+        self.count = count
+        self.sums = sums
+        self.last = last
+        self.fields = fields         # row of sums -> field
+
+    # (fields x slots) means in one division
+    def means(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sums / self.count
+
+    def mean(self, field: str) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sums[self.fields.index(field)] / self.count
+
+
+# Running sum/count/last per symbol slot for one bar period, nothing is retained per sample.
+# A bar covers the samples with timestamp in (T-period, T] and is closed as soon as a sample
+# rolls into the next period (or lands exactly on T).
+# Slots are shared with the TickStore and the sums are one (fields x slots) array: a batch is folded
+# with one contiguous fancy-indexed add per field, a closed bar is finalized with one 2-D division.
+class BarAccumulator:
+    mean_fields = ("r", "p", "i")
+
+    def __init__(self, period: int, tick_store):
+        self.period = period
+        self.tick_store = tick_store
+        self.bucket = None   # close timestamp of the open bar
+        self._alloc(max(tick_store.size, 16))
+
+    def _alloc(self, rows: int):
+        self.count = np.zeros(rows, dtype=np.int64)
+        self.sums = np.zeros((len(self.mean_fields), rows), dtype=np.float64)
+        self.last_fr = np.zeros(rows, dtype=np.float64)
+        self.last_event = np.zeros(rows, dtype=np.int64)
+
+    # Grows the slot arrays when the tick store registered new symbols
+    def _reserve(self, rows: int):
+        old_rows = len(self.count)
+        if rows <= old_rows:
+            return
+        rows = max(rows, 2 * old_rows)
+        old = (self.count, self.sums, self.last_fr, self.last_event)
+        self._alloc(rows)
+        self.count[:old_rows] = old[0]
+        self.sums[:, :old_rows] = old[1]
+        self.last_fr[:old_rows] = old[2]
+        self.last_event[:old_rows] = old[3]
+
+    # Bar close timestamp for a sample timestamp in seconds
+    def bucket_of(self, timestamp: int) -> int:
+        return -(-timestamp // self.period) * self.period
+
+    # Closes the open bar and starts an empty one
+    def _close(self) -> ClosedBar:
+        n = self.tick_store.size
+        bar = ClosedBar(
+            self.bucket, list(self.tick_store.symbols[:n]), self.count[:n].copy(), self.sums[:, :n].copy(),
+            {"r": self.last_fr[:n].copy(), "E": self.last_event[:n].copy()}, self.mean_fields,
+        )
+        self.count[:] = 0
+        self.sums[:] = 0
+        self.bucket = None
+        return bar
+
+    # Folds one batch of samples taken at `timestamp` into the open bar.
+    # values holds the r/p/i arrays aligned with slots, last the r/E arrays to carry as last values.
+    # Returns the bars closed by this batch, usually none, one at the boundary.
+    def add(self, slots: np.ndarray, timestamp: int, values: dict, last: dict) -> list:
+        closed = []
+        if len(slots) == 0:
+            return closed
+        self._reserve(self.tick_store.size)
+        bucket = self.bucket_of(timestamp)
+        if self.bucket is not None and bucket > self.bucket:
+            closed.append(self._close())
+        if self.bucket is None:
+            self.bucket = bucket
+
+        self.count[slots] += 1
+        for k, field in enumerate(self.mean_fields):
+            self.sums[k][slots] += values[field]
+        self.last_fr[slots] = last["r"]
+        self.last_event[slots] = last["E"]
+
+        if timestamp == self.bucket:
+            closed.append(self._close())
+        return closed
+
+
+# Stateful aggregator of the finest interval (1m by default, down to 1s), fed with raw ticks one
+# !markPrice@arr frame at a time. With a 1s period every frame closes its own bar, the slot arrays
+# are reused so nothing is allocated per frame besides the closed bar's copy.
+class TickAggregator(BarAccumulator):
+    def __init__(self, tick_store, period: int = 60):
+        super().__init__(period, tick_store)
+
+    # Folds one frame (slots and field -> array, as returned by TickStore.ingest) into the open bar
+    def add_frame(self, slots: np.ndarray, values: dict) -> list:
+        if len(slots) == 0:
+            return []
+        return self.add(slots, int(values["E"].max()), values, {"r": values["r"], "E": values["E"]})
+
+
+class MinuteAggregator(TickAggregator):
+    def __init__(self, tick_store):
+        super().__init__(tick_store, 60)
+
+
+# Cascading in-memory rollups: every 1m bar feeds the 5m accumulator, every closed 5m bar
+# the 1h one and every closed 1h bar the 1d one (the levels of an intervals.IntervalSet in general).
+# A coarser bar holds the mean of its child bars' means and the last child's funding rate,
+# no read-back from the database is needed.
+class RollupEngine:
+    def __init__(self, tick_store, levels=(("5m", 300), ("1h", 3600), ("1d", 86400))):
+        self.levels = [(interval, BarAccumulator(period, tick_store)) for interval, period in levels]
+
+    def accumulator(self, interval: str) -> BarAccumulator:
+        return dict(self.levels)[interval]
+
+    # Folds a closed child bar into one level
+    @staticmethod
+    def _fold(accumulator: BarAccumulator, bar: ClosedBar) -> list:
+        slots = np.flatnonzero(bar.count)
+        means = bar.means()[:, slots]
+        means = {f: means[k] for k, f in enumerate(bar.fields)}
+        last = {"r": bar.last["r"][slots], "E": np.full(len(slots), bar.timestamp, dtype=np.int64)}
+        return accumulator.add(slots, bar.timestamp, means, last)
+
+    # Feeds a closed 1m bar through the cascade.
+    # Returns the (interval, ClosedBar) pairs that were completed by it, finest first.
+    def add_bar(self, bar: ClosedBar) -> list:
+        completed = []
+        children = [bar]
+        for interval, accumulator in self.levels:
+            closed = []
+            for child in children:
+                closed.extend(self._fold(accumulator, child))
+            completed.extend((interval, c) for c in closed)
+            children = closed
+        return completed
+
+    # Restores a partially filled window of one level from rows already in the database.
+    # rows must hold timestamp, funding_rate and the *_mean columns of the child interval.
+    def rehydrate(self, interval: str, slot: int, rows):
+        accumulator = self.accumulator(interval)
+        rows = rows.dropna(subset=["funding_rate_mean", "mark_price_mean", "index_price_mean"])
+        for row in rows.sort_values("timestamp").itertuples(index=False):
+            slots = np.array([slot], dtype=np.int64)
+            means = {
+                "r": np.array([row.funding_rate_mean], dtype=np.float64),
+                "p": np.array([row.mark_price_mean], dtype=np.float64),
+                "i": np.array([row.index_price_mean], dtype=np.float64),
+            }
+            last = {"r": np.array([row.funding_rate], dtype=np.float64), "E": np.array([row.timestamp], dtype=np.int64)}
+            accumulator.add(slots, int(row.timestamp), means, last)
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import datetime as dt
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:   # optional, only needed for the Parquet archive
+    pa = None
+
+from intervals import IntervalSet
+
+# Cold tier of the bar history: Parquet files that analytics read instead of the production DB.
+#
+#   <root>/<interval>/date=YYYY-MM-DD/symbol=BTCUSDT/<part>.parquet
+#
+# date is the UTC day of the bar close. Timestamps are delta encoded, float columns byte-stream-split,
+# the whole file zstd compressed; the datetime columns are not stored (they follow from the timestamps).
+# Files are named after the rows they hold, so exporting the same range again overwrites them.
+#
+#   ParquetArchive  writes columnar bars into the partitioned layout
+#   ArchiveSink     bar sink for the pipeline / replays: buffers bars, writes a day once it closed
+#   export_tables   copies oi*_SYMBOL (or fr_<interval>) rows with streaming cursors, incrementally
+#   ArchiveReader   range queries with partition pruning and row group predicate pushdown
+#
+#   python archive.py export /data/fr_archive --keep-days 30        (daily cron)
+#   python archive.py query /data/fr_archive --interval 1h --symbol BTCUSDT --start 2024-06-01 --end 2024-07-01
+
+archive_columns = ("timestamp", "funding_rate", "funding_rate_mean", "mark_price_mean", "index_price_mean",
+                   "oi_transaction_timestamp", "open_interest")
+int_columns = ("timestamp", "oi_transaction_timestamp")
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for the Parquet archive")
+
+def day_of(timestamp: int) -> str:
+    return dt.datetime.fromtimestamp(int(timestamp), dt.timezone.utc).strftime("%Y-%m-%d")
+
+def day_start(day: str) -> int:
+    return int(dt.datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=dt.timezone.utc).timestamp())
+
+
+class ParquetArchive:
+    manifest_name = "_archive.json"
+
+    def __init__(self, root: str, partition_by=("date", "symbol"), compression: str = "zstd",
+                 row_group_rows: int = 256 * 1024):
+        require_pyarrow()
+        self.root = root
+        self.compression = compression
+        self.row_group_rows = row_group_rows
+        os.makedirs(root, exist_ok=True)
+        self.manifest = self.read_manifest(root) or {"partition_by": list(partition_by), "exported": {}}
+        self.partition_by = list(self.manifest["partition_by"])   # an existing archive keeps its layout
+        self.schema = pa.schema([("symbol", pa.string())] +
+                                [(c, pa.int64() if c in int_columns else pa.float64()) for c in archive_columns] +
+                                [("date", pa.string())])
+        self.save_manifest()
+
+    @classmethod
+    def read_manifest(cls, root: str):
+        path = os.path.join(root, cls.manifest_name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def save_manifest(self):
+        path = os.path.join(self.root, self.manifest_name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+    # Table of one interval's rows: symbol + bar columns, missing columns as NULL
+    def to_table(self, frame: pd.DataFrame):
+        arrays = [pa.array(frame["symbol"].astype(str), pa.string())]
+        for c in archive_columns:
+            values = pd.to_numeric(frame[c], errors="coerce") if c in frame else pd.Series(np.nan, index=frame.index)
+            if c in int_columns:
+                arrays.append(pa.array(values.round().astype("Int64"), pa.int64()))
+            else:
+                arrays.append(pa.array(values.astype(np.float64), pa.float64(), from_pandas=True))
+        arrays.append(pa.array([day_of(ts) for ts in frame["timestamp"]], pa.string()))
+        return pa.Table.from_arrays(arrays, schema=self.schema)
+
+    # Writes rows (DataFrame with symbol and bar columns) of one interval. name identifies the rows
+    # (e.g. the source and first/last timestamp); writing the same name again replaces the files.
+    def write(self, interval: str, frame: pd.DataFrame, name: str) -> int:
+        if frame.empty:
+            return 0
+        frame = frame.sort_values(["symbol", "timestamp"], kind="stable")
+        stored = [c for c in ("symbol",) + archive_columns if c not in self.partition_by]
+        encoding = {c: "DELTA_BINARY_PACKED" if c in int_columns else "BYTE_STREAM_SPLIT" for c in archive_columns}
+        pq.write_to_dataset(
+            self.to_table(frame), os.path.join(self.root, interval), partition_cols=self.partition_by,
+            basename_template=name + "-{i}.parquet", existing_data_behavior="overwrite_or_ignore",
+            compression=self.compression, use_dictionary=["symbol"] if "symbol" in stored else False,
+            column_encoding=encoding, row_group_size=self.row_group_rows)
+        return len(frame)
+
+    # Latest bar close already exported from the database, per interval
+    def exported_upto(self, interval: str) -> int:
+        return int(self.manifest["exported"].get(interval, 0))
+
+    def mark_exported(self, interval: str, timestamp: int):
+        self.manifest["exported"][interval] = int(timestamp)
+        self.save_manifest()
+
+
+# Sink of the pipeline (or a replay) into the archive. Bars are kept column by column until their day
+# is over or flush_rows rows are buffered; rows of the same bar (a late open interest batch) are
+# merged, non-NULL values first. Its insert_bars result counts buffered rows per interval.
+class ArchiveSink:
+    def __init__(self, archive: ParquetArchive, flush_rows: int = 2_000_000, logger=None):
+        self.archive = archive
+        self.flush_rows = flush_rows
+        self.logger = logger
+        self.buffers = {}   # interval -> [DataFrame, ...] of the open days
+        self.rows = {}      # interval -> buffered rows
+
+    def insert_bars(self, bars) -> dict:
+        satir_sayilari = {}
+        try:
+            for batch in bars:
+                if not len(batch):
+                    continue
+                frame = pd.DataFrame({name: arr for name, arr in batch.columns.items() if name in archive_columns})
+                frame.insert(0, "symbol", batch.symbols)
+                frame.insert(1, "timestamp", batch.timestamp)
+                acik = self.buffers.get(batch.interval)
+                if acik and day_of(acik[-1]["timestamp"].iat[0]) < day_of(batch.timestamp):
+                    self.flush(batch.interval)   # the previous day is complete
+                self.buffers.setdefault(batch.interval, []).append(frame)
+                self.rows[batch.interval] = self.rows.get(batch.interval, 0) + len(frame)
+                if self.rows[batch.interval] >= self.flush_rows:
+                    self.flush(batch.interval)
+                key = "archive/" + batch.interval
+                satir_sayilari[key] = satir_sayilari.get(key, 0) + len(batch)
+            return satir_sayilari
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.warning(f"Archive write error: {type(e).__name__}: {e}")
+            return None
+
+    # Writes the buffered rows of one interval (or all) to the archive
+    def flush(self, interval: str = None):
+        for iv in [interval] if interval is not None else list(self.buffers):
+            parcalar = self.buffers.pop(iv, None)
+            self.rows.pop(iv, None)
+            if not parcalar:
+                continue
+            frame = pd.concat(parcalar, ignore_index=True)
+            frame = frame.groupby(["symbol", "timestamp"], as_index=False, sort=False).first()
+            self.archive.write(iv, frame, f"live-{int(frame['timestamp'].min())}-{int(frame['timestamp'].max())}")
+
+    def close(self):
+        self.flush()
+
+
+# Copies rows with bar close in (since, until] of the given intervals from MySQL into the archive,
+# one streaming cursor per table (or one per interval on the wide tables), chunk by chunk.
+# Without since it continues after the last export recorded in the archive manifest.
+def export_tables(db_handler, archive: ParquetArchive, intervals, coins, until: int, since: int = None,
+                  chunk_rows: int = 50000, logger=None) -> int:
+    toplam = 0
+    for interval in intervals:
+        start = archive.exported_upto(interval) if since is None else since
+        if start >= until:
+            continue
+        kaynaklar = [None] if db_handler.storage_mode == "wide" else list(coins)
+        satir = 0
+        for coin in kaynaklar:
+            for parca in db_handler.iter_bar_chunks(interval, start, until, coin, chunk_rows):
+                kaynak = "wide" if coin is None else coin.upper()
+                satir += archive.write(interval, parca, f"db-{kaynak}-{int(parca['timestamp'].iat[0])}")
+        archive.mark_exported(interval, until)
+        toplam += satir
+        if logger is not None:
+            logger.info(f"archive export {interval} ({day_of(start)} .. {day_of(until)}]: {satir} rows")
+    return toplam
+
+
+# Range reads over the archive. Filters on symbol, date and timestamp are handed to the dataset
+# scanner: directories of other days/symbols are skipped, row groups are pruned by their statistics.
+class ArchiveReader:
+    def __init__(self, root: str):
+        require_pyarrow()
+        manifest = ParquetArchive.read_manifest(root)
+        if manifest is None:
+            raise FileNotFoundError(f"No archive at {root}")
+        self.root = root
+        self.partitioning = ds.partitioning(pa.schema([(c, pa.string()) for c in manifest["partition_by"]]), flavor="hive")
+
+    def dataset(self, interval: str):
+        return ds.dataset(os.path.join(self.root, interval), format="parquet", partitioning=self.partitioning)
+
+    # Bars of one interval with timestamp in [start, end], sorted by symbol and timestamp
+    def read(self, interval: str, start: int = None, end: int = None, symbols=None, columns=None) -> pd.DataFrame:
+        secilen = ["symbol"] + [c for c in archive_columns if columns is None or c in columns or c == "timestamp"]
+        if not os.path.isdir(os.path.join(self.root, interval)):
+            return pd.DataFrame(columns=secilen)
+        filtre = None
+        kosullar = []
+        if symbols is not None:
+            kosullar.append(ds.field("symbol").isin([s.upper() for s in symbols]))
+        if start is not None:
+            kosullar += [ds.field("date") >= day_of(start), ds.field("timestamp") >= int(start)]
+        if end is not None:
+            kosullar += [ds.field("date") <= day_of(end), ds.field("timestamp") <= int(end)]
+        for kosul in kosullar:
+            filtre = kosul if filtre is None else filtre & kosul
+        frame = self.dataset(interval).to_table(columns=secilen, filter=filtre).to_pandas()
+        if frame.duplicated(["symbol", "timestamp"]).any():   # overlapping exports / live parts
+            frame = frame.groupby(["symbol", "timestamp"], as_index=False).first()
+        return frame.sort_values(["symbol", "timestamp"], ignore_index=True)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Parquet archive of the funding rate bars")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="copy bars older than --keep-days from MySQL into the archive")
+    p_export.add_argument("root")
+    p_export.add_argument("--intervals", nargs="+", default=IntervalSet.from_env().names)
+    p_export.add_argument("--coins", nargs="+", default=None, help="only these pairs (default: every coin in COINS)")
+    p_export.add_argument("--since", default=None, help="YYYY-MM-DD (default: after the last export)")
+    p_export.add_argument("--keep-days", type=int, default=30, help="days that stay only in MySQL")
+    p_export.add_argument("--chunk-rows", type=int, default=50000)
+    p_export.add_argument("--wide", action="store_true", help="read the fr_<interval> tables")
+    p_query = sub.add_parser("query", help="print bars from the archive")
+    p_query.add_argument("root")
+    p_query.add_argument("--interval", default="1m")
+    p_query.add_argument("--symbol", nargs="+", default=None)
+    p_query.add_argument("--start", default=None, help="YYYY-MM-DD")
+    p_query.add_argument("--end", default=None, help="YYYY-MM-DD, inclusive")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    if args.command == "query":
+        reader = ArchiveReader(args.root)
+        start = day_start(args.start) if args.start else None
+        end = day_start(args.end) + 86400 if args.end else None
+        t0 = time.perf_counter()
+        frame = reader.read(args.interval, start, end, args.symbol)
+        print(frame.to_string(max_rows=40))
+        print(f"{len(frame)} rows in {time.perf_counter() - t0:.3f}s")
+        sys.exit(0)
+
+    from logger_setup import LoggerSetup
+    from database_handler import DatabaseHandler
+    logger = LoggerSetup().get_logger()
+    db_handler = DatabaseHandler(logger, storage_mode="wide" if args.wide else "per_symbol")
+    archive = ParquetArchive(args.root)
+    today = int(time.time()) // 86400 * 86400
+    coins = args.coins or db_handler.coin_list_database()["parite"].tolist()
+    toplam = export_tables(db_handler, archive, args.intervals, coins, today - args.keep_days * 86400,
+                           day_start(args.since) if args.since else None, args.chunk_rows, logger)
+    print("Archived rows:", toplam)
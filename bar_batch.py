@@ -0,0 +1,103 @@
+import numpy as np
+import datetime as dt
+
+# Closed bars of one interval for many symbols, kept column by column.
+# The pipeline hands lists of these to the writers (DatabaseHandler, sinks, write queue, spool):
+# timestamp and datetime are computed once per batch, every other column is a 1-D array
+# aligned with `symbols`, so no per-symbol dict is ever built on the hot path.
+class BarBatch:
+    def __init__(self, interval: str, timestamp: int, symbols: list, columns: dict, datetime_str: str = None):
+        self.interval = interval
+        self.timestamp = int(timestamp)   # bar close, aligned to the interval
+        self.datetime = datetime_str or dt.datetime.fromtimestamp(self.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+        self.symbols = list(symbols)
+        self.columns = columns   # column name -> 1-D array aligned with symbols (float NaN or object None = NULL)
+        self._index = None       # symbol -> row, built on the first row() call
+
+    def __len__(self):
+        return len(self.symbols)
+
+    # Table columns of a row, in the order of records()
+    @property
+    def column_names(self) -> tuple:
+        return ("timestamp", "datetime") + tuple(self.columns)
+
+    # One tuple per symbol (timestamp, datetime, *columns) with python values, NaN as None,
+    # ready to be bound as executemany parameters
+    def records(self) -> list:
+        values = []
+        for arr in self.columns.values():
+            liste = arr.tolist()
+            if arr.dtype.kind == "f" and np.isnan(arr).any():
+                liste = [None if v != v else v for v in liste]
+            values.append(liste)
+        head = (self.timestamp, self.datetime)
+        return [head + row for row in zip(*values)] if values else [head] * len(self.symbols)
+
+    # Row dict of one symbol, None if the batch has no bar for it
+    def row(self, symbol: str):
+        if self._index is None:
+            self._index = {s: k for k, s in enumerate(self.symbols)}
+        k = self._index.get(symbol)
+        if k is None:
+            return None
+        row = {"timestamp": self.timestamp, "datetime": self.datetime}
+        for name, arr in self.columns.items():
+            value = arr[k]
+            value = value.item() if hasattr(value, "item") else value
+            row[name] = None if value != value else value
+        return row
+
+    # {symbol: row dict}, the per-symbol form used before the columnar batches
+    def to_dict(self) -> dict:
+        names = self.column_names
+        return {symbol: dict(zip(names, record)) for symbol, record in zip(self.symbols, self.records())}
+
+    @classmethod
+    def from_dict(cls, interval: str, son_veri: dict):
+        symbols = list(son_veri)
+        if not symbols:
+            return cls(interval, 0, [], {}, "")
+        ilk = son_veri[symbols[0]]
+        names = [c for c in ilk if c not in ("timestamp", "datetime")]
+        columns = {c: cls.column([son_veri[s].get(c) for s in symbols]) for c in names}
+        return cls(interval, ilk["timestamp"], symbols, columns, ilk["datetime"])
+
+    # Batch of the rows where mask is True
+    def select(self, mask) -> "BarBatch":
+        mask = np.asarray(mask, dtype=bool)
+        return BarBatch(self.interval, self.timestamp, [s for s, keep in zip(self.symbols, mask) if keep],
+                        {name: arr[mask] for name, arr in self.columns.items()}, self.datetime)
+
+    # One batch out of batches of the same interval and close with disjoint symbols (the shards of
+    # sharding.py). Columns missing from a part are NULL for its rows.
+    @classmethod
+    def concat(cls, batches: list):
+        parts = [batch for batch in batches if len(batch)] or batches[:1]
+        if len(parts) == 1:
+            return parts[0]
+        names = list(dict.fromkeys(name for batch in parts for name in batch.columns))
+        columns = {name: np.concatenate([batch.columns[name] if name in batch.columns else np.full(len(batch), np.nan)
+                                         for batch in parts]) for name in names}
+        ilk = parts[0]
+        return cls(ilk.interval, ilk.timestamp, [s for batch in parts for s in batch.symbols], columns, ilk.datetime)
+
+    # JSON / msgpack friendly form for the spool and the spill file
+    def to_payload(self) -> list:
+        return [self.interval, self.timestamp, self.datetime, self.symbols,
+                {name: [None if v != v else v for v in arr.tolist()] for name, arr in self.columns.items()}]
+
+    # Also reads the older [interval, {symbol: row dict}] records
+    @classmethod
+    def from_payload(cls, payload):
+        if len(payload) == 2:
+            return cls.from_dict(payload[0], payload[1])
+        interval, timestamp, datetime_str, symbols, columns = payload
+        return cls(interval, timestamp, symbols, {name: cls.column(values) for name, values in columns.items()}, datetime_str)
+
+    # Array of a decoded column: float64 with NaN for float columns, object with None otherwise
+    @staticmethod
+    def column(values: list) -> np.ndarray:
+        if any(isinstance(v, float) for v in values):
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return np.array(values, dtype=object if None in values else None)
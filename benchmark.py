@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import numpy as np
+
+from synthetic import SyntheticMarket, synthetic_symbols
+from decoder import available_decoders, make_decoder
+from sinks import NullSink, SQLiteSink
+
+# Benchmarks, run with python benchmark.py <name> [options]
+#
+#   decode    per-frame decode cost of a !markPrice@arr payload for every available decoder
+#   pipeline  ingest -> aggregate -> persist on synthetic frames (1s apart in event time) for
+#             several symbol counts and sinks; per-stage latency percentiles, ticks/s,
+#             allocations per frame and peak RSS. --json writes the results, --baseline compares
+#             p50/p99 against a previous --json file and exits 1 on a regression (for CI). p99 is
+#             only compared for stages with --min-samples samples in both runs: persist runs once
+#             per closed minute, with a few samples its p99 is just the max.
+
+# Per-call latencies in microseconds -> summary line
+def summarize(name: str, latencies_us: np.ndarray) -> str:
+    return (f"{name:<10} mean {latencies_us.mean():9.1f}us  p50 {np.percentile(latencies_us, 50):9.1f}us  "
+            f"p99 {np.percentile(latencies_us, 99):9.1f}us  ({len(latencies_us)} runs)")
+
+def bench_decode(symbols: int = 250, frames: int = 2000) -> dict:
+    market = SyntheticMarket(synthetic_symbols(symbols))
+    start_ms = int(time.time() * 1000)
+    payloads = [market.frame(start_ms + k * 1000).encode() for k in range(50)]
+    print(f"decode: {symbols} symbols, {len(payloads[0])} bytes per frame")
+    results = {}
+    for name in available_decoders():
+        decoder = make_decoder(name)
+        for payload in payloads:   # warm up
+            decoder.decode(payload)
+        latencies = np.empty(frames)
+        for k in range(frames):
+            payload = payloads[k % len(payloads)]
+            t0 = time.perf_counter_ns()
+            decoder.decode(payload)
+            latencies[k] = (time.perf_counter_ns() - t0) / 1000
+        results[name] = latencies
+        print(summarize(name, latencies))
+    return results
+
+
+# Builds the sink of a pipeline run: "null" (in-process fake DB), "sqlite" (temporary file) or "mysql"
+def pipeline_sink(name: str, tmpdir: str):
+    if name == "null":
+        return NullSink()
+    if name == "sqlite":
+        return SQLiteSink(os.path.join(tmpdir, f"bench_{time.time_ns()}.db"))
+    if name == "mysql":
+        from database_handler import DatabaseHandler
+        return DatabaseHandler(logging.getLogger("FundingRate_Benchmark"))
+    raise ValueError(f"Unknown sink: {name}")
+
+def percentiles(latencies_us) -> dict:
+    if len(latencies_us) == 0:
+        return {"n": 0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    arr = np.asarray(latencies_us)
+    return {"n": int(len(arr)), "p50": float(np.percentile(arr, 50)), "p90": float(np.percentile(arr, 90)),
+            "p99": float(np.percentile(arr, 99)), "max": float(arr.max())}
+
+# One run of the full pipeline: decode, ingest_frame (tick store + minute aggregator + rollups) and
+# the synchronous write of the bars closed by the frame (the minute-boundary flush)
+def bench_pipeline_run(symbols: int, sink_name: str, minutes: int, tmpdir: str, alloc_frames: int = 120) -> dict:
+    from main import FundingRateManager
+    logger = logging.getLogger("FundingRate_Benchmark")
+    market = SyntheticMarket(synthetic_symbols(symbols))
+    sink = pipeline_sink(sink_name, tmpdir)
+    manager = FundingRateManager(sink, logger, init_coins=False)
+    start_ms = (int(time.time()) // 86400) * 86400 * 1000 + 1000   # Starts right after a day boundary
+
+    stages = {"decode": [], "aggregate": [], "persist": [], "frame": []}
+    ticks = 0
+    rows = 0
+    busy_ns = 0
+    frames = minutes * 60
+    for k in range(frames):
+        payload = market.frame(start_ms + k * 1000).encode()
+        t0 = time.perf_counter_ns()
+        frame = manager.decoder.decode(payload)
+        t1 = time.perf_counter_ns()
+        kapanan_barlar = manager.ingest_frame(frame)
+        t2 = time.perf_counter_ns()
+        if kapanan_barlar:
+            satir_sayilari = sink.insert_bars(kapanan_barlar) or {}
+            rows += sum(satir_sayilari.values())
+        t3 = time.perf_counter_ns()
+        stages["decode"].append((t1 - t0) / 1000)
+        stages["aggregate"].append((t2 - t1) / 1000)
+        if kapanan_barlar:
+            stages["persist"].append((t3 - t2) / 1000)
+        stages["frame"].append((t3 - t0) / 1000)
+        busy_ns += t3 - t0
+        ticks += len(frame)
+
+    # Allocation profile on a short extra pass, tracemalloc slows everything down
+    tracemalloc.start()
+    peaks = []
+    for k in range(frames, frames + alloc_frames):
+        payload = market.frame(start_ms + k * 1000).encode()
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        kapanan_barlar = manager.ingest_frame(manager.decoder.decode(payload))
+        if kapanan_barlar:
+            sink.insert_bars(kapanan_barlar)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return {
+        "symbols": symbols, "sink": sink_name, "frames": frames, "ticks": ticks, "rows": rows,
+        "ticks_per_sec": ticks / (busy_ns / 1e9),
+        "stages_us": {name: percentiles(values) for name, values in stages.items()},
+        "alloc_peak_bytes_per_frame": float(np.mean(peaks)),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def print_pipeline_result(result: dict):
+    print(f"--- {result['symbols']} symbols, sink={result['sink']}: {result['frames']} frames, {result['rows']} rows, "
+          f"{result['ticks_per_sec']:,.0f} ticks/s, {result['alloc_peak_bytes_per_frame'] / 1024:,.0f} KiB alloc peak/frame, "
+          f"peak RSS {result['peak_rss_mb']:,.0f} MiB")
+    for name, p in result["stages_us"].items():
+        print(f"    {name:<10} n={p['n']:<6} p50 {p['p50']:10.1f}us  p90 {p['p90']:10.1f}us  p99 {p['p99']:10.1f}us  max {p['max']:10.1f}us")
+
+# Regressions of p50/p99 beyond tolerance (relative) against a baseline result list.
+# Stages with fewer than min_samples samples (in either run) are only compared on p50.
+def compare_with_baseline(results: list, baseline: list, tolerance: float, min_samples: int = 100) -> list:
+    onceki = {(r["symbols"], r["sink"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = onceki.get((result["symbols"], result["sink"]))
+        if base is None:
+            continue
+        for stage, p in result["stages_us"].items():
+            eski = base["stages_us"].get(stage, {})
+            keys = ("p50", "p99") if min(p["n"], eski.get("n", 0)) >= min_samples else ("p50",)
+            for key in keys:
+                old = eski.get(key, 0.0)
+                if old > 0 and p[key] > old * (1 + tolerance):
+                    regressions.append(f"{result['symbols']} symbols/{result['sink']} {stage} {key}: {old:.1f}us -> {p[key]:.1f}us")
+    return regressions
+
+def bench_pipeline(symbol_counts, sinks, minutes: int) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for symbols in symbol_counts:
+            for sink_name in sinks:
+                result = bench_pipeline_run(symbols, sink_name, minutes, tmpdir)
+                print_pipeline_result(result)
+                results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Funding rate collector benchmarks")
+    sub = parser.add_subparsers(dest="benchmark", required=True)
+    p_decode = sub.add_parser("decode")
+    p_decode.add_argument("--symbols", type=int, default=250)
+    p_decode.add_argument("--frames", type=int, default=2000)
+    p_pipeline = sub.add_parser("pipeline")
+    p_pipeline.add_argument("--symbols", type=int, nargs="+", default=[50, 250, 1000])
+    p_pipeline.add_argument("--sinks", nargs="+", default=["null", "sqlite"], help="null, sqlite, mysql")
+    p_pipeline.add_argument("--minutes", type=int, default=10, help="event time covered by the run")
+    p_pipeline.add_argument("--json", default=None, help="write the results to this file")
+    p_pipeline.add_argument("--baseline", default=None, help="results of a previous --json run to compare with")
+    p_pipeline.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p50/p99 slowdown")
+    p_pipeline.add_argument("--min-samples", type=int, default=100,
+                            help="stages with fewer samples are only compared on p50 (persist has one per minute)")
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.benchmark == "decode":
+        bench_decode(args.symbols, args.frames)
+    elif args.benchmark == "pipeline":
+        results = bench_pipeline(args.symbols, args.sinks, args.minutes)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_with_baseline(results, json.load(f), args.tolerance, args.min_samples)
+            for line in regressions:
+                print("REGRESSION", line)
+            sys.exit(1 if regressions else 0)
@@ -1,26 +1,113 @@
-import mysql.connector as mysql
 import pandas as pd
+import os
 import sys
+import time
+import configparser
 import datetime as dt
 
+from db_pool import ConnectionPool, is_transient, is_connection_error
+from write_queue import RejectedBars
+from intervals import IntervalSet, table_prefix
+
 class DatabaseHandler():    
-    def __init__(self, logger):
+    # Connection settings: FUNDING_RATE_DB_* environment variables win over the [mysql] section of the
+    # config file (config_path or FUNDING_RATE_DB_CONFIG), which wins over these placeholders
+    db_defaults = {"host": "1.1.1.1", "port": "3306", "user": "username", "password": "password",
+                   "database": "database", "pool_size": "4"}
+
+    def __init__(self, logger, storage_mode: str = "per_symbol", partition_by_day: bool = False, config_path: str = None,
+                 intervals: IntervalSet = None):
         self.coin_list_table = "COINS"     # Name of the coin list table
-        self.DB_IP = "1.1.1.1"       # Database ip 
-        self.DB_USER = "username"
-        self.DB_DATABASE = "database"
-        self.DB_PASS = "password"
         self.logger = logger
+        ayarlar = self.load_db_config(config_path)
+        self.DB_IP = ayarlar["host"]       # Database ip 
+        self.DB_USER = ayarlar["user"]
+        self.DB_DATABASE = ayarlar["database"]
+        self.DB_PASS = ayarlar["password"]
+        self.intervals = IntervalSet.from_env() if intervals is None else intervals
+        self.table_prefixes = {interval: table_prefix(interval) for interval in self.intervals}   # oi_, oi5m_, oi1h_, oi1d_ by default
+        self.oi_columns = ["datetime DATETIME NOT NULL","funding_rate DOUBLE","funding_rate_mean DOUBLE ", 
+                           "mark_price_mean FLOAT UNSIGNED","index_price_mean FLOAT UNSIGNED","oi_transaction_timestamp INT UNSIGNED", 
+                           "oi_transaction_datetime DATETIME", "open_interest DOUBLE UNSIGNED"]   # Bar columns after the key
+
+        # "per_symbol": one oi*_SYMBOL table per coin and interval
+        # "wide": one fr_<interval> table per interval keyed by (symbol_id, timestamp), symbol_id being COINS.id
+        if storage_mode not in ("per_symbol", "wide"):
+            raise ValueError(f"Unknown storage_mode: {storage_mode!r}, expected per_symbol or wide")
+        self.storage_mode = storage_mode
+        self.partition_by_day = partition_by_day   # RANGE partitions of one day on the wide tables
+        self.wide_table_prefix = "fr_"
+        self.symbol_ids = {}   # parite -> COINS.id
+        self._sql_cache = {}   # (table, columns, upsert, ignore) -> INSERT statement text
         
-        self.db = mysql.connect(host = self.DB_IP, database = self.DB_DATABASE, user = self.DB_USER, password = self.DB_PASS, auth_plugin = "mysql_native_password")  
+        # Writer threads check out their own connection, transient errors are retried on a fresh one
+        self.pool = ConnectionPool({"host": self.DB_IP, "port": int(ayarlar["port"]), "database": self.DB_DATABASE,
+                                    "user": self.DB_USER, "password": self.DB_PASS, "auth_plugin": "mysql_native_password"},
+                                   size=int(ayarlar["pool_size"]))
+        if self.storage_mode == "wide":
+            self.load_symbol_ids()
+
+    # Connection settings from the environment / config file, see db_defaults
+    def load_db_config(self, config_path: str = None) -> dict:
+        ayarlar = dict(self.db_defaults)
+        config_path = config_path or os.environ.get("FUNDING_RATE_DB_CONFIG")
+        if config_path:
+            parser = configparser.ConfigParser()
+            if not parser.read(config_path):
+                raise FileNotFoundError(f"DB config not found: {config_path}")
+            if parser.has_section("mysql"):
+                ayarlar.update({k: v for k, v in parser["mysql"].items() if k in ayarlar})
+        for key in ayarlar:
+            value = os.environ.get("FUNDING_RATE_DB_" + key.upper())
+            if value:
+                ayarlar[key] = value
+        return ayarlar
     
+    # Drops the idle pooled connections after a failed write, the next checkout opens a new one
+    def reset_connection(self):
+        try:
+            self.pool.reset()
+        except Exception as e:
+            e = sys.exc_info()[0:2]
+            self.logger.warning("reset_connection error: " + str(e))
+
+    # Runs one statement on a pooled connection (retried on transient errors) and commits.
+    # Returns the fetched rows, or the affected row count for statements without a result set.
+    def execute(self, sql_str: str, params=None):
+        def calistir(conn):
+            db_cursor = conn.cursor()
+            db_cursor.execute(sql_str, params)
+            sonuc = db_cursor.fetchall() if db_cursor.with_rows else db_cursor.rowcount
+            conn.commit()
+            db_cursor.close()
+            return sonuc
+        return self.pool.run(calistir)
+
+    # Name of the table holding the given interval of a coin
+    def table_name(self, coin_name: str, interval: str) -> str:
+        return self.table_prefixes[interval] + coin_name.upper()
+
+    # Name of the wide table holding the given interval of every coin
+    def wide_table(self, interval: str) -> str:
+        return self.wide_table_prefix + interval
+
+    # Where the bars of a coin go: (table_name, key columns before the bar columns, key values)
+    def bar_target(self, coin_name: str, interval: str):
+        if self.storage_mode == "wide":
+            return self.wide_table(interval), ("symbol_id",), (self.symbol_ids.get(coin_name.upper()),)
+        return self.table_name(coin_name, interval), (), ()
+
+    # Refreshes the parite -> COINS.id map used by the wide layout
+    def load_symbol_ids(self):
+        coins = self.coin_list_database()
+        if coins is not None and not coins.empty:
+            self.symbol_ids = {str(p).upper(): int(i) for i, p in zip(coins["id"], coins["parite"])}
+
     # Get the coin list from database
     def coin_list_database(self):
         try:                                    
             sql_str = f"SELECT id,parite,oi_pool_id FROM {self.coin_list_table}"
-            db_cursor = self.db.cursor()
-            db_cursor.execute(sql_str)
-            db_coins =  pd.DataFrame(db_cursor.fetchall(),columns = ["id","parite","oi_pool_id"])[:]
+            db_coins =  pd.DataFrame(self.execute(sql_str),columns = ["id","parite","oi_pool_id"])[:]
             return db_coins
         except Exception as e:
             e = sys.exc_info()[0:2]
@@ -30,12 +117,8 @@ class DatabaseHandler():
     def get_tables(self, prefix: str = "oi"):
         sql_str = ("SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME LIKE '" + prefix + "%'")
         sql_str += ";"
-        self.db_cursor = self.db_connection.cursor()
-        self.db_cursor.execute(sql_str)
-        sonuc = self.db_cursor.fetchall()
+        sonuc = self.execute(sql_str)
         results = pd.DataFrame(sonuc)
-        self.db_connection.commit()
-        self.db_cursor.close()
         return results
 
     # Will check if ther is a new coin, or a delisted coin
@@ -67,95 +150,351 @@ class DatabaseHandler():
         return sql_str
     
     # Creates table in db
-    def create_table(self, table_name: str, columns, second_index = ["none","none"]): 
+    def create_table(self, table_name: str, columns, second_index = ["none","none"], table_options: str = ""): 
+        self.execute(self.create_table_sql(table_name, columns, second_index, table_options))
+
+    def create_table_sql(self, table_name: str, columns, second_index = ["none","none"], table_options: str = "") -> str:
         # Columns will be given as List, with its parameters
-        self.db_cursor = self.db_connection.cursor()
         sql_str = "CREATE TABLE IF NOT EXISTS " + table_name
         sql_str += self.list_to_sql(columns)
         if second_index[0] != "none":
             sql_str = sql_str[:-1]
             sql_str += ", INDEX " + second_index[0] + " (" + second_index[1] + "))"
+        if table_options:
+            sql_str += " " + table_options
         sql_str += ";"        
-        self.db_cursor.execute(sql_str)  
-        self.db_connection.commit()
-        self.db_cursor.close()
+        return sql_str
 
     #   Creates coin tables with prefixes
     def create_coin_tables(self,coin_name: str,interval: str):
-        create_oi_columns = ["timestamp INT UNSIGNED NOT NULL PRIMARY KEY","datetime DATETIME NOT NULL","funding_rate DOUBLE","funding_rate_mean DOUBLE ", 
-                         "mark_price_mean FLOAT UNSIGNED","index_price_mean FLOAT UNSIGNED","oi_transaction_timestamp INT UNSIGNED", 
-                         "oi_transaction_datetime DATETIME", "open_interest DOUBLE UNSIGNED"]
+        create_oi_columns = ["timestamp INT UNSIGNED NOT NULL PRIMARY KEY"] + self.oi_columns
         try:
-            table_name = "oi"
+            table_name = self.table_name(coin_name, interval)
             self.create_table(table_name,create_oi_columns)
         except Exception as e: 
             e = sys.exc_info()[0:2]
             self.logger.warning("create_table error: " + str(e))
         
-    def db_yeni_coin_ekle(self, coin_listesi): 
-        for coin in coin_listesi:
-            self.create_coin_tables(coin,"1m")
-            self.create_coin_tables(coin,"5m")
-            self.create_coin_tables(coin,"1h")
-            self.create_coin_tables(coin,"1d")
-
-    # Inserts a row, or multipel rows, to database
-    def insert_row(self, interval: str,table_name: str,columns,values,multiple_rows = False):
+    # RANGE partition definitions of one day each covering [start_ts, end_ts], plus the catch-all pmax
+    def day_partitions_sql(self, start_ts: int, end_ts: int) -> str:
+        partitions = []
+        day = start_ts - start_ts % 86400
+        while day <= end_ts:
+            name = dt.datetime.fromtimestamp(day, dt.timezone.utc).strftime("p%Y%m%d")
+            partitions.append(f"PARTITION {name} VALUES LESS THAN ({day + 86400})")
+            day += 86400
+        partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        return ", ".join(partitions)
+
+    # Creates the wide fr_<interval> tables. Rows are keyed by (symbol_id, timestamp) for per-coin reads,
+    # the timestamp index serves cross-symbol reads of one bar. Older rows than partition_from go to phist.
+    def create_wide_tables(self, intervals=None, partition_from: int = None, days_ahead: int = 30):
+        columns = ["symbol_id INT UNSIGNED NOT NULL", "timestamp INT UNSIGNED NOT NULL"] + self.oi_columns + ["PRIMARY KEY (symbol_id, timestamp)"]
+        table_options = ""
+        if self.partition_by_day:
+            now = int(time.time())
+            start = now if partition_from is None else partition_from
+            start -= start % 86400
+            table_options = f"PARTITION BY RANGE (timestamp) (PARTITION phist VALUES LESS THAN ({start}), {self.day_partitions_sql(start, now + days_ahead * 86400)})"
+        basarili = True
+        for interval in intervals or self.table_prefixes:
+            try:
+                self.create_table(self.wide_table(interval), columns, second_index=["ts_idx", "timestamp"], table_options=table_options)
+            except Exception as e:
+                basarili = False
+                e = sys.exc_info()[0:2]
+                self.logger.warning("create_wide_tables error: " + str(e))
+        return basarili
+
+    # Splits pmax so that the day partitions of a wide table reach days_ahead days into the future.
+    # Rows never fail for a missing partition (they land in pmax), run this daily to keep days separate.
+    def ensure_day_partitions(self, interval: str, days_ahead: int = 30):
+        table_name = self.wide_table(interval)
         try:
-            db_cursor = self.db.cursor()
-            if multiple_rows: # changes the values from list to string
-                values_str = "(" 
-                for i in range(len(values)): # values should be a dataframe
-                    values_str += str(values.iloc[i,0]) + ',"'+str(values.iloc[i,1]) +'"),('
-                values_str = values_str[:-2]
-        
-                sql_str = "INSERT IGNORE INTO " + table_name + self.list_to_sql(columns) +"VALUES " +values_str+";"
-                
-            else: 
-                sql_str = "INSERT INTO " + table_name + self.list_to_sql(columns) +"VALUES " +self.list_to_sql(values)
-                sql_str += "ON DUPLICATE KEY UPDATE "   # Duplicate key, daha once bu keye bi deger yazilmissa oluyor
-                for i in range(len(columns)):           # Eger oi degeri null ise yeni degerler yazilcak
-                    sql_str += str(columns[i]) + " = IF(" + str(columns[i]) + " IS NULL, " + str(values[i]) + ", " + str(columns[i]) + "),"
-                sql_str = sql_str[:-1]
-                sql_str += ";"
-                
-            db_cursor.execute(sql_str)
-            self.db.commit()
+            sonuc = self.execute("SELECT PARTITION_DESCRIPTION FROM INFORMATION_SCHEMA.PARTITIONS "
+                                 "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL;", (table_name,))
+            sinirlar = [int(r[0]) for r in sonuc if r[0] and r[0] != "MAXVALUE"]
+            hedef = int(time.time()) + days_ahead * 86400
+            if sinirlar and max(sinirlar) <= hedef:
+                self.execute(f"ALTER TABLE {table_name} REORGANIZE PARTITION pmax INTO ({self.day_partitions_sql(max(sinirlar), hedef)});")
+        except Exception as e:
+            e = sys.exc_info()[0:2]
+            self.logger.warning("ensure_day_partitions error: " + str(e))
+
+    # Creates the tables of the given coins. Returns the coins whose tables all exist afterwards;
+    # the others failed (logged) and are left to the caller to retry.
+    def db_yeni_coin_ekle(self, coin_listesi) -> list:
+        if self.storage_mode == "wide":   # No per-coin tables, new coins only need their COINS.id
+            if not self.create_wide_tables():
+                return []
+            self.load_symbol_ids()
+            return [coin for coin in coin_listesi if coin.upper() in self.symbol_ids]
+        # Every table of every coin on one connection; a coin whose CREATE fails does not stop the others
+        create_oi_columns = ["timestamp INT UNSIGNED NOT NULL PRIMARY KEY"] + self.oi_columns
+        olusturulan = []
+        def olustur(conn):
+            db_cursor = conn.cursor()
+            for coin in coin_listesi:
+                if coin in olusturulan:   # Done before a retried connection error
+                    continue
+                try:
+                    for interval in self.table_prefixes:
+                        db_cursor.execute(self.create_table_sql(self.table_name(coin, interval), create_oi_columns))
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    self.logger.warning(f"db_yeni_coin_ekle {coin}: {type(e).__name__}: {e}")
+                    continue
+                olusturulan.append(coin)
+            conn.commit()
             db_cursor.close()
-            
+        try:
+            self.pool.run(olustur)
+        except Exception as e:
+            e = sys.exc_info()[0:2]
+            self.logger.warning("db_yeni_coin_ekle error: " + str(e))
+        return olusturulan
+
+    # Adds coins seen on the stream to the coin list table, existing ones are left alone
+    def add_coins(self, coin_listesi):
+        def ekle(conn):
+            db_cursor = conn.cursor()
+            db_cursor.executemany(f"INSERT IGNORE INTO {self.coin_list_table} (parite) VALUES (%s);", [(c.upper(),) for c in coin_listesi])
+            conn.commit()
+            db_cursor.close()
+        try:
+            self.pool.run(ekle)
+        except Exception as e:
+            e = sys.exc_info()[0:2]
+            self.logger.warning("add_coins error: " + str(e))
+
+    # Converts numpy scalars to python values and NaN to NULL, so they can be bound as parameters
+    def sql_value(self, value):
+        if hasattr(value, "item"):
+            value = value.item()
+        if isinstance(value, float) and value != value:
+            return None
+        return value
+
+    # Parameterized INSERT for a table. With upsert, an existing row only gets its NULL columns filled
+    # (e.g. oi columns written later), timestamp and datetime being the key are never updated.
+    # Statement texts are cached, the same few tables are written every minute.
+    def insert_sql(self, table_name: str, columns, upsert: bool = True, ignore: bool = False) -> str:
+        key = (table_name, tuple(columns), upsert, ignore)
+        sql_str = self._sql_cache.get(key)
+        if sql_str is None:
+            sql_str = self._sql_cache[key] = self.build_insert_sql(table_name, columns, upsert, ignore)
+        return sql_str
+
+    def build_insert_sql(self, table_name: str, columns, upsert: bool = True, ignore: bool = False) -> str:
+        sql_str = "INSERT " + ("IGNORE " if ignore else "") + "INTO " + table_name + " " + self.list_to_sql(columns)
+        sql_str += " VALUES (" + ", ".join(["%s"] * len(columns)) + ")"
+        if upsert:
+            sql_str += self.upsert_clause(columns)
+        return sql_str + ";"
+
+    # ON DUPLICATE KEY UPDATE part that only fills NULL columns of an existing row
+    def upsert_clause(self, columns) -> str:
+        guncellenecek = [c for c in columns if c not in ("symbol_id", "timestamp", "datetime")]
+        if not guncellenecek:
+            return ""
+        return " ON DUPLICATE KEY UPDATE " + ", ".join(f"{c} = IF({c} IS NULL, VALUES({c}), {c})" for c in guncellenecek)
+
+    # Writes rows of one table with a single executemany (sent as one multi-VALUES statement).
+    # Doesn't commit, the caller owns the transaction.
+    # convert=False skips the per-value conversion for rows that already hold python values (BarBatch.records)
+    def insert_many(self, db_cursor, table_name: str, columns, rows, upsert: bool = True, ignore: bool = False, convert: bool = True) -> int:
+        params = [tuple(self.sql_value(v) for v in row) for row in rows] if convert else list(rows)
+        if not params:
+            return 0
+        db_cursor.executemany(self.insert_sql(table_name, columns, upsert, ignore), params)
+        return db_cursor.rowcount
+
+    # Writes finished bars, given as a list of BarBatch, in one transaction.
+    # Rows are grouped per table and every table gets one executemany, so with the wide layout
+    # a whole interval is a single multi-row INSERT built straight from the batch columns.
+    # Returns {table_name: affected rows}, or None if the transaction was rolled back.
+    # A lost connection or deadlock is retried on a fresh connection, the upserts are idempotent;
+    # None after that means "try again later". Any other error (a missing table, a bad value) is not
+    # going to go away: the tables are then written one transaction each and RejectedBars is raised
+    # with the bars of the tables that failed, so they don't hold back every other symbol.
+    def insert_bars(self, bars) -> dict:
+        tablolar = {}   # (table_name, columns) -> rows
+        for batch in bars:
+            if not len(batch):
+                continue
+            if self.storage_mode == "wide":
+                ids = [self.symbol_ids.get(coin.upper()) for coin in batch.symbols]
+                eksik = [coin for coin, symbol_id in zip(batch.symbols, ids) if symbol_id is None]
+                if eksik:
+                    self.logger.warning(f"insert_bars: no COINS.id for {eksik}, bars skipped")
+                rows = tablolar.setdefault((self.wide_table(batch.interval), ("symbol_id",) + batch.column_names), [])
+                rows.extend((symbol_id,) + record for symbol_id, record in zip(ids, batch.records()) if symbol_id is not None)
+            else:
+                for coin, record in zip(batch.symbols, batch.records()):
+                    tablolar.setdefault((self.table_name(coin, batch.interval), batch.column_names), []).append(record)
+
+        def yaz(conn):
+            satir_sayilari = {}
+            db_cursor = conn.cursor()
+            for (table_name, columns), rows in tablolar.items():
+                satir_sayilari[table_name] = satir_sayilari.get(table_name, 0) + self.insert_many(db_cursor, table_name, columns, rows, convert=False)
+            conn.commit()
+            db_cursor.close()
+            return satir_sayilari
+        try:
+            return self.pool.run(yaz)   # An uncommitted transaction is rolled back when the connection is released
+        except Exception as e:
+            if is_transient(e):
+                self.logger.warning(f"insert_bars error: {type(e).__name__}: {e}")
+                return None
+            self.logger.warning(f"insert_bars error: {type(e).__name__}: {e}, writing table by table")
+        return self.insert_tables_separately(bars, tablolar)
+
+    # insert_bars fallback: one transaction per table. Raises RejectedBars for the tables that failed
+    # with a non-transient error, returns None if a transient one came up again.
+    def insert_tables_separately(self, bars, tablolar: dict) -> dict:
+        satir_sayilari = {}
+        hatalar = {}   # table_name -> error text
+        for (table_name, columns), rows in tablolar.items():
+            def yaz(conn):
+                db_cursor = conn.cursor()
+                satir = self.insert_many(db_cursor, table_name, columns, rows, convert=False)
+                conn.commit()
+                db_cursor.close()
+                return satir
+            try:
+                satir_sayilari[table_name] = satir_sayilari.get(table_name, 0) + self.pool.run(yaz)
+            except Exception as e:
+                if is_transient(e):
+                    self.logger.warning(f"insert_bars error: {type(e).__name__}: {e}")
+                    return None
+                hatalar[table_name] = f"{type(e).__name__}: {e}"
+        if not hatalar:
+            return satir_sayilari
+        rejected = []
+        for batch in bars:
+            if not len(batch):
+                continue
+            if self.storage_mode == "wide":
+                mask = [self.wide_table(batch.interval) in hatalar] * len(batch)
+            else:
+                mask = [self.table_name(coin, batch.interval) in hatalar for coin in batch.symbols]
+            if any(mask):
+                rejected.append(batch.select(mask))
+        raise RejectedBars(satir_sayilari, rejected, "; ".join(f"{t}: {h}" for t, h in sorted(hatalar.items())))
+
+    # Inserts a row, or multiple rows, to database
+    def insert_row(self, interval: str,table_name: str,columns,values,multiple_rows = False):
+        def yaz(conn):
+            db_cursor = conn.cursor()
+            if multiple_rows: # values should be a dataframe
+                self.insert_many(db_cursor, table_name, columns, values.itertuples(index=False), upsert=False, ignore=True)
+            else:
+                self.insert_many(db_cursor, table_name, columns, [values])
+            conn.commit()
+            db_cursor.close()
+        try:
+            self.pool.run(yaz)
+
         except Exception as e:
             e = sys.exc_info()[0:2]
             self.logger.warning("insert_row error: " + str(e))
-   
+
     def insert_dataframe(self, table_name: str, df, upsert = False): # INSERT OR UPSERT
         try:
             # Dataframe columns should e same as database columns
-            db_cursor = self.db.cursor()
-            sql_str = "INSERT INTO " + table_name + " " + self.list_to_sql(df.columns) + " VALUES "
-            for i in range(len(df)):
-                sql_str += str(tuple(df.iloc[i,:].values.astype(str)))
-                if i != len(df)-1: sql_str += ", "
-            sql_str += " ON DUPLICATE KEY UPDATE "   # Duplicate key
-            for i in range(len(df.columns)):           # If oi value is null, new data will be written
-                if str(df.columns[i]) == "oi_transaction_datetime":sql_str += str(df.columns[i]) + " = IF(" + str(df.columns[i]) + " IS NULL, '" + str(df.iloc[0,i]) + "', " + str(df.columns[i]) + "),"
-                elif str(df.columns[i]) == "timestamp" or str(df.columns[i]) == "datetime": continue
-                else:sql_str += str(df.columns[i]) + " = IF(" + str(df.columns[i]) + " IS NULL, " + str(df.iloc[0,i]) + ", " + str(df.columns[i]) + "),"
-            sql_str = sql_str[:-1]
-            sql_str += ";"
-            db_cursor.execute(sql_str)
-            self.db.commit()
-            db_cursor.close()
-            return db_cursor.rowcount   
+            def yaz(conn):
+                db_cursor = conn.cursor()
+                rowcount = self.insert_many(db_cursor, table_name, list(df.columns), df.itertuples(index=False))
+                conn.commit()
+                db_cursor.close()
+                return rowcount
+            return self.pool.run(yaz)
         except Exception as e:
             print("'insert_dataframe' hata: ",e)
             e = sys.exc_info()[0:2]
             self.logger.warning("insert_dataframe hata " + str(e))
             return 0  
            
+    # Bars of the given coins newer than the given timestamp, used to rehydrate partial rollup windows.
+    # Returns one DataFrame with a symbol column; the wide layout needs a single range scan for all coins.
+    def get_bars_since(self, interval: str, timestamp: int, coins):
+        columns = ["timestamp", "funding_rate", "funding_rate_mean", "mark_price_mean", "index_price_mean"]
+        def oku(conn):
+            db_cursor = conn.cursor()
+            parcalar = []
+            for coin in coins:
+                sql_str = "SELECT " + ", ".join(columns) + " FROM " + self.table_name(coin, interval) + " WHERE timestamp > %s ORDER BY timestamp;"
+                db_cursor.execute(sql_str, (int(timestamp),))
+                for row in db_cursor.fetchall():
+                    parcalar.append((coin.upper(),) + tuple(row))
+            conn.commit()
+            db_cursor.close()
+            return parcalar
+        try:
+            if self.storage_mode == "wide":
+                symbols = {i: p for p, i in self.symbol_ids.items()}
+                sql_str = "SELECT symbol_id, " + ", ".join(columns) + " FROM " + self.wide_table(interval) + " WHERE timestamp > %s ORDER BY timestamp;"
+                rows = pd.DataFrame(self.execute(sql_str, (int(timestamp),)), columns=["symbol_id"] + columns)
+                rows.insert(0, "symbol", rows.pop("symbol_id").map(symbols))
+                rows = rows[rows["symbol"].isin([c.upper() for c in coins])]
+            else:
+                rows = pd.DataFrame(self.pool.run(oku), columns=["symbol"] + columns)
+            return rows
+        except Exception as e:
+            e = sys.exc_info()[0:2]
+            self.logger.warning("get_bars_since error: " + str(e))
+            return pd.DataFrame(columns=["symbol"] + columns)
+
+    # Copies the rows of one per-symbol table with timestamp in (start_ts, end_ts] into the wide table.
+    # Runs server side as INSERT ... SELECT, rows already in the wide table only get their NULLs filled.
+    def copy_to_wide(self, coin_name: str, interval: str, start_ts: int, end_ts: int) -> int:
+        columns = ["timestamp"] + [c.split()[0] for c in self.oi_columns]
+        sql_str = "INSERT INTO " + self.wide_table(interval) + " " + self.list_to_sql(["symbol_id"] + columns)
+        sql_str += " SELECT %s, " + ", ".join(columns) + " FROM " + self.table_name(coin_name, interval)
+        sql_str += " WHERE timestamp > %s AND timestamp <= %s" + self.upsert_clause(columns) + ";"
+        return self.execute(sql_str, (self.symbol_ids[coin_name.upper()], int(start_ts), int(end_ts)))
+
+    # Streams the rows with timestamp in (start_ts, end_ts] of one coin's table (or of every coin from the
+    # wide table when coin_name is None) in DataFrames of at most chunk_rows rows, with a symbol column.
+    # The cursor is unbuffered: MySQL sends the result as it is read, only one chunk is held in memory.
+    def iter_bar_chunks(self, interval: str, start_ts: int, end_ts: int, coin_name: str = None, chunk_rows: int = 50000,
+                        columns=("timestamp", "funding_rate", "funding_rate_mean", "mark_price_mean", "index_price_mean",
+                                 "oi_transaction_timestamp", "open_interest")):
+        columns = list(columns)
+        if coin_name is None:
+            symbols = {i: p for p, i in self.symbol_ids.items()}
+            sql_str = "SELECT symbol_id, " + ", ".join(columns) + " FROM " + self.wide_table(interval)
+            sql_str += " WHERE timestamp > %s AND timestamp <= %s ORDER BY timestamp, symbol_id;"
+        else:
+            sql_str = "SELECT " + ", ".join(columns) + " FROM " + self.table_name(coin_name, interval)
+            sql_str += " WHERE timestamp > %s AND timestamp <= %s ORDER BY timestamp;"
+        with self.pool.connection() as conn:
+            db_cursor = conn.cursor(buffered=False)
+            try:
+                db_cursor.execute(sql_str, (int(start_ts), int(end_ts)))
+                while True:
+                    rows = db_cursor.fetchmany(chunk_rows)
+                    if not rows:
+                        break
+                    if coin_name is None:
+                        parca = pd.DataFrame(rows, columns=["symbol_id"] + columns)
+                        parca.insert(0, "symbol", parca.pop("symbol_id").map(symbols))
+                    else:
+                        parca = pd.DataFrame(rows, columns=columns)
+                        parca.insert(0, "symbol", coin_name.upper())
+                    yield parca
+            finally:
+                db_cursor.close()
+                conn.commit()
+
+    # MIN/MAX timestamp of a table, (None, None) if it is empty
+    def timestamp_range(self, table_name: str):
+        sonuc = self.execute("SELECT MIN(timestamp), MAX(timestamp) FROM " + table_name + ";")[0]
+        return sonuc[0], sonuc[1]
+
     # can work with any kind of sql query        
     def genel_sql(self, sql_str: str) -> int:
-        db_cursor = self.db.cursor()
-        db_cursor.execute(sql_str)
-        self.db.commit()
-        db_cursor.close()
-        return db_cursor.rowcount    
+        sonuc = self.execute(sql_str)
+        return len(sonuc) if isinstance(sonuc, list) else sonuc    
@@ -0,0 +1,130 @@
+import time
+import queue
+import random
+import threading
+from contextlib import contextmanager
+
+import mysql.connector as mysql
+from mysql.connector import errors as mysql_errors
+
+# Small blocking connection pool for mysql.connector.
+# Connections are opened lazily up to `size`; a checkout waits up to `timeout` seconds for a free one
+# (mysql.connector.pooling raises at once when the pool is exhausted). A connection that sat idle for
+# more than `check_after` seconds is pinged before it is handed out, and dropped if the ping fails.
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Errors worth retrying on a fresh connection: lost/refused connections, deadlocks, lock wait timeouts
+transient_errnos = {1205, 1213, 2002, 2003, 2006, 2013, 2055}
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (PoolTimeout, mysql_errors.OperationalError, mysql_errors.InterfaceError)):
+        return True
+    return getattr(error, "errno", None) in transient_errnos
+
+# Connection-level failures, the connection is closed instead of going back to the pool
+def is_connection_error(error: Exception) -> bool:
+    return isinstance(error, (mysql_errors.OperationalError, mysql_errors.InterfaceError)) or \
+        getattr(error, "errno", None) in (2006, 2013, 2055)
+
+
+class ConnectionPool:
+    def __init__(self, connect_args: dict, size: int = 4, timeout: float = 10.0, check_after: float = 30.0):
+        self.connect_args = connect_args
+        self.size = size
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle = queue.LifoQueue()   # (connection, released at), most recently used first
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        return mysql.connect(**self.connect_args)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    # Health-checked checkout
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_open = self._created < self.size
+                    if can_open:
+                        self._created += 1
+                if can_open:
+                    try:
+                        return self._open()
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No free connection in {self.timeout}s (pool size {self.size})")
+                try:
+                    conn, released_at = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+            if time.monotonic() - released_at < self.check_after:
+                return conn
+            try:
+                conn.ping(reconnect=False)
+                return conn
+            except Exception:
+                self._discard(conn)
+
+    def release(self, conn, broken: bool = False):
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                broken = True
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception as e:
+            self.release(conn, broken=is_connection_error(e))
+            raise
+        else:
+            self.release(conn)
+
+    # Closes the idle connections, the next checkouts open new ones
+    def reset(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    # Runs fn(connection), retrying transient errors on a fresh connection with jittered exponential backoff
+    def run(self, fn, retries: int = 3, min_backoff: float = 0.05, max_backoff: float = 2.0):
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    return fn(conn)
+            except Exception as e:
+                if attempt >= retries or not is_transient(e):
+                    raise
+                time.sleep(random.uniform(0, min(max_backoff, min_backoff * 2 ** attempt)))
+                attempt += 1
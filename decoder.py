@@ -0,0 +1,118 @@
+import json
+import numpy as np
+
+try:
+    import orjson
+except ImportError:   # optional, faster json parsing
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:   # optional, typed decoding straight to numbers
+    msgspec = None
+
+# Decoded !markPrice@arr frame in columnar form: one entry per markPriceUpdate.
+# Per-symbol streams (<symbol>@markPrice@1s) carry a single update as "data", decoded as a frame of one.
+# E and T are in seconds, r/p/i/P are floats, so TickStore can ingest it without any conversion.
+class MarkPriceFrame:
+    float_fields = ("r", "p", "i", "P")
+    int_fields = ("E", "T")
+
+    def __init__(self, symbols: list, values: dict, event_time_ms: int = 0):
+        self.symbols = symbols
+        self.values = values   # field -> 1-D array aligned with symbols
+        self.event_time_ms = event_time_ms   # latest Binance event time in milliseconds, for latency metrics
+
+    def __len__(self):
+        return len(self.symbols)
+
+    # Builds a frame from markPriceUpdate dicts (E/T in milliseconds, numbers as strings)
+    @classmethod
+    def from_items(cls, items: list):
+        n = len(items)
+        values = {f: np.array([item[f] for item in items], dtype=np.float64) for f in cls.float_fields}
+        event_ms = np.fromiter((item["E"] for item in items), dtype=np.int64, count=n)
+        values.update({f: np.fromiter((item[f] for item in items), dtype=np.int64, count=n) // 1000 for f in cls.int_fields})
+        return cls([item["s"] for item in items], values, int(event_ms.max()) if n else 0)
+
+    # One frame out of several, in order (the per-symbol messages of a shard, see sharding.py)
+    @classmethod
+    def concat(cls, frames: list):
+        if len(frames) == 1:
+            return frames[0]
+        values = {f: np.concatenate([frame.values[f] for frame in frames]) for f in cls.float_fields + cls.int_fields}
+        return cls([s for frame in frames for s in frame.symbols], values, max(frame.event_time_ms for frame in frames))
+
+    # field -> column views of the (n x fields) float and int blocks
+    @classmethod
+    def split_columns(cls, floats: np.ndarray, ints: np.ndarray) -> dict:
+        floats = floats.reshape(-1, len(cls.float_fields))
+        ints = ints.reshape(-1, len(cls.int_fields))
+        values = {f: floats[:, k] for k, f in enumerate(cls.float_fields)}
+        values.update({f: ints[:, k] for k, f in enumerate(cls.int_fields)})
+        return values
+
+
+# Stdlib json, items are converted to columns by numpy
+class JsonDecoder:
+    name = "json"
+
+    def loads(self, message):
+        return json.loads(message)
+
+    def decode(self, message) -> MarkPriceFrame:
+        data = self.loads(message)["data"]
+        return MarkPriceFrame.from_items([data] if isinstance(data, dict) else data)
+
+
+# orjson parsing, same column conversion as the stdlib decoder
+class OrjsonDecoder(JsonDecoder):
+    name = "orjson"
+
+    def loads(self, message):
+        return orjson.loads(message)
+
+
+# msgspec with a typed struct: numeric strings are decoded straight to floats (non-strict mode)
+# and fields we don't use ("e", "stream") are skipped by the parser
+class MsgspecDecoder:
+    name = "msgspec"
+
+    def __init__(self):
+        class MarkPriceUpdate(msgspec.Struct):
+            s: str
+            E: int
+            T: int
+            r: float
+            p: float
+            i: float
+            P: float = float("nan")
+
+        class Envelope(msgspec.Struct):
+            data: list[MarkPriceUpdate] | MarkPriceUpdate
+
+        self._decoder = msgspec.json.Decoder(Envelope, strict=False)
+
+    def decode(self, message) -> MarkPriceFrame:
+        items = self._decoder.decode(message).data
+        if not isinstance(items, list):
+            items = [items]
+        floats = np.array([(item.r, item.p, item.i, item.P) for item in items], dtype=np.float64)
+        ints = np.array([(item.E, item.T) for item in items], dtype=np.int64).reshape(-1, 2)
+        event_time_ms = int(ints[:, 0].max()) if len(items) else 0
+        return MarkPriceFrame([item.s for item in items], MarkPriceFrame.split_columns(floats, ints // 1000), event_time_ms)
+
+
+decoders = {"msgspec": MsgspecDecoder, "orjson": OrjsonDecoder, "json": JsonDecoder}
+
+# Names of the decoders usable in this environment, fastest first
+def available_decoders() -> list:
+    return [name for name, module in (("msgspec", msgspec), ("orjson", orjson), ("json", json)) if module is not None]
+
+# Returns the requested decoder, or the fastest available one
+def make_decoder(name: str = None):
+    if name is None:
+        name = available_decoders()[0]
+    if name not in available_decoders():
+        raise ValueError(f"Decoder not available: {name}")
+    return decoders[name]()
@@ -0,0 +1,87 @@
+import sys
+import time
+import random
+import asyncio
+import argparse
+from aiohttp import web
+
+# Local stand-in for the Binance GET /fapi/v1/openInterest endpoint, for tests and local runs.
+# Answers with a random walk per symbol and the X-MBX-USED-WEIGHT-1M header of a one-minute window.
+# Above weight_limit it answers 429 with Retry-After, delay adds latency to every answer.
+#
+#   python fake_oi_server.py --port 8766
+#   FUNDING_RATE_OI_URL=http://127.0.0.1:8766 python main.py
+class FakeOpenInterestServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, weight_limit: int = 2400, delay: float = 0.0, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.weight_limit = weight_limit
+        self.delay = delay
+        self.random = random.Random(seed)
+        self.open_interest = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._window = (0, 0)   # (minute, weight used)
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _open_interest(self, request):
+        symbol = request.query.get("symbol")
+        if not symbol:
+            return web.json_response({"code": -1102, "msg": "Mandatory parameter 'symbol' was not sent"}, status=400)
+        minute = int(time.time() // 60)
+        used = (self._window[1] if self._window[0] == minute else 0) + 1
+        self._window = (minute, used)
+        headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+        if used > self.weight_limit:
+            headers["Retry-After"] = str(60 - int(time.time() % 60))
+            return web.json_response({"code": -1003, "msg": "Too many requests"}, status=429, headers=headers)
+
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            value = self.open_interest.get(symbol, self.random.uniform(1000, 1000000)) * (1 + self.random.gauss(0, 0.001))
+            self.open_interest[symbol] = value
+            return web.json_response({"openInterest": f"{value:.3f}", "symbol": symbol, "time": int(time.time() * 1000)},
+                                     headers=headers)
+        finally:
+            self.in_flight -= 1
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_get("/fapi/v1/openInterest", self._open_interest)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def serve_forever(server: FakeOpenInterestServer):
+    print("Serving", await server.start())
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Binance open interest endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--weight-limit", type=int, default=2400)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args(sys.argv[1:])
+    try:
+        asyncio.run(serve_forever(FakeOpenInterestServer(args.host, args.port, args.weight_limit, args.delay)))
+    except KeyboardInterrupt:
+        pass
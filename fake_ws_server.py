@@ -0,0 +1,95 @@
+import sys
+import time
+import asyncio
+import json
+import argparse
+import websockets
+from urllib.parse import urlparse, parse_qs
+
+from synthetic import SyntheticMarket, synthetic_symbols
+
+# Local stand-in for the Binance !markPrice@arr stream, for tests and local runs.
+# Every client gets a synthetic frame every `interval` seconds. Clients asking for per-symbol
+# streams (streams=btcusdt@markPrice@1s/...) get one message per requested symbol instead. close_after drops each
+# connection after that many frames and stall_after stops sending (without closing),
+# to exercise reconnects and staleness detection.
+#
+#   python fake_ws_server.py --port 8765 --symbols 250 --interval 1
+#   FUNDING_RATE_WS_URL=ws://127.0.0.1:8765/stream?streams=!markPrice@arr python main.py
+#   FUNDING_RATE_SHARDS=4 FUNDING_RATE_WS_URL=ws://127.0.0.1:8765/stream?streams= python main.py
+class FakeMarkPriceServer:
+    def __init__(self, n_symbols: int = 250, interval: float = 1.0, host: str = "127.0.0.1", port: int = 0,
+                 close_after: int = None, stall_after: int = None, seed: int = 0):
+        self.market = SyntheticMarket(synthetic_symbols(n_symbols), seed=seed)
+        self.interval = interval
+        self.host = host
+        self.port = port
+        self.close_after = close_after
+        self.stall_after = stall_after
+        self.connections = 0
+        self.frames_sent = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/stream?streams=!markPrice@arr"
+
+    # Symbols of the per-symbol streams in the request path, None for !markPrice@arr
+    def requested_symbols(self, path: str):
+        streams = parse_qs(urlparse(path).query).get("streams", [""])[0]
+        if not streams or "!markPrice@arr" in streams:
+            return None
+        istenen = {s.split("@")[0].upper() for s in streams.split("/")}
+        return [s for s in self.market.symbols if s in istenen]
+
+    async def _handler(self, ws):
+        self.connections += 1
+        symbols = self.requested_symbols(ws.request.path)
+        sent = 0
+        try:
+            while self.close_after is None or sent < self.close_after:
+                if self.stall_after is not None and sent >= self.stall_after:
+                    await ws.wait_closed()
+                    return
+                event_time = int(time.time() * 1000)
+                if symbols is None:
+                    await ws.send(self.market.frame(event_time))
+                else:
+                    for item in self.market.items(event_time, symbols):
+                        await ws.send(json.dumps({"stream": item["s"].lower() + "@markPrice@1s", "data": item}))
+                sent += 1
+                self.frames_sent += 1
+                await asyncio.sleep(self.interval)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def start(self) -> str:
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+async def serve_forever(server: FakeMarkPriceServer):
+    print("Serving", await server.start())
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Binance !markPrice@arr stream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--symbols", type=int, default=250)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--close-after", type=int, default=None)
+    parser.add_argument("--stall-after", type=int, default=None)
+    args = parser.parse_args(sys.argv[1:])
+    try:
+        asyncio.run(serve_forever(FakeMarkPriceServer(args.symbols, args.interval, args.host, args.port,
+                                                      args.close_after, args.stall_after)))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,81 @@
+import os
+
+# The bar intervals of the pipeline, one configuration for the aggregators, the tables and the caches.
+# The first (finest) interval is aggregated from the ticks, every other one is rolled up from the one
+# before it, so each period must be a multiple of the previous period. Buckets are aligned on the
+# epoch: 8h bars close at 00:00/08:00/16:00 UTC, the Binance funding times.
+#
+#   FUNDING_RATE_INTERVALS=1s,10s,1m,15m,4h,8h python main.py
+
+units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+default_intervals = ("1m", "5m", "1h", "1d")
+
+# Period in seconds of an interval name like "10s", "15m", "8h"
+def interval_seconds(interval: str) -> int:
+    unit = units.get(interval[-1:])
+    if unit is None or not interval[:-1].isdigit() or int(interval[:-1]) <= 0:
+        raise ValueError(f"Invalid interval: {interval!r}, expected e.g. 1s, 10s, 1m, 15m, 4h, 8h, 1d")
+    return int(interval[:-1]) * unit
+
+# Per-symbol table prefix of an interval: oi_ for 1m (the original tables), oi<interval>_ otherwise
+def table_prefix(interval: str) -> str:
+    return "oi_" if interval == "1m" else f"oi{interval}_"
+
+
+class IntervalSet:
+    def __init__(self, intervals=default_intervals):
+        periods = {}
+        for interval in intervals:
+            interval = interval.strip()
+            if interval:
+                periods[interval] = interval_seconds(interval)
+        if not periods:
+            raise ValueError("At least one bar interval is required")
+        self.names = sorted(periods, key=periods.get)
+        self.periods = {interval: periods[interval] for interval in self.names}
+        if len(set(self.periods.values())) != len(self.names):
+            raise ValueError(f"Intervals with the same period: {self.names}")
+        for child, parent in zip(self.names, self.names[1:]):
+            if self.periods[parent] % self.periods[child]:
+                raise ValueError(f"{parent} is not a multiple of {child}, it can not be rolled up from it")
+
+    # From FUNDING_RATE_INTERVALS (comma separated), the default set without it
+    @classmethod
+    def from_env(cls):
+        value = os.environ.get("FUNDING_RATE_INTERVALS")
+        return cls(value.split(",")) if value else cls()
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, interval):
+        return interval in self.periods
+
+    def __repr__(self):
+        return f"IntervalSet({','.join(self.names)})"
+
+    # Interval aggregated straight from the ticks
+    @property
+    def base(self) -> str:
+        return self.names[0]
+
+    @property
+    def base_period(self) -> int:
+        return self.periods[self.base]
+
+    # (interval, period) of the rollup levels, finest first, as RollupEngine takes them
+    @property
+    def rollup_levels(self) -> tuple:
+        return tuple((interval, self.periods[interval]) for interval in self.names[1:])
+
+    # Interval that receives the open interest snapshots (polled once a minute)
+    @property
+    def oi_interval(self) -> str:
+        return "1m" if "1m" in self.periods else self.base
+
+    # Intervals whose bar closes at `timestamp`, finest first
+    def closing(self, timestamp: int) -> list:
+        return [interval for interval in self.names if timestamp % self.periods[interval] == 0]
@@ -1,20 +1,115 @@
 import logging
+import logging.handlers
 import os
+import json
+import time
+import queue
+import atexit
+import threading
 
+# Drops repeats of the same WARNING+ message within `interval` seconds.
+# The next copy that gets through says how many were suppressed, e.g. a DB outage logs
+# "insert_bars error: ..." once per interval instead of once per batch.
+class RepeatFilter(logging.Filter):
+    def __init__(self, interval: float = 60.0, min_level: int = logging.WARNING, max_keys: int = 10000):
+        super().__init__()
+        self.interval = interval
+        self.min_level = min_level
+        self.max_keys = max_keys
+        self._seen = {}   # (level, message) -> [last emitted at, suppressed count]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level or self.interval <= 0:
+            return True
+        key = (record.levelno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            entry = self._seen.get(key)
+            if entry is not None and now - entry[0] < self.interval:
+                entry[1] += 1
+                return False
+            if entry is None and len(self._seen) >= self.max_keys:
+                self._seen.clear()
+            suppressed = entry[1] if entry is not None else 0
+            self._seen[key] = [now, 0]
+        if suppressed:
+            record.msg = f"{record.getMessage()} (suppressed {suppressed} repeats in the last {now - entry[0]:.0f}s)"
+            record.args = None
+        return True
+
+
+# One JSON object per line
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = {
+            "time": self.formatTime(record),
+            "ts": record.created,
+            "level": record.levelname,
+            "process": record.process,
+            "thread": record.threadName,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, ensure_ascii=False)
+
+
+# Logging of the collector, configured on the root logger.
+#   async_mode  callers only put the record on a queue, a listener thread does the formatting and file writes
+#   rotate      "size" (max_bytes, backup_count), "time" (when, e.g. "midnight") or None for a plain file
+#   json_lines  structured JSON lines instead of the text format
+#   repeat_interval  seconds during which identical warnings are suppressed, 0 = log every one
+#   library_level    level of chatty libraries; websockets logs every frame at DEBUG
 class LoggerSetup:
-    def __init__(self, log_path=None):
-        self.log_path =(os.path.expanduser('~') + "/funding_rate.log")
+    libraries = ("websockets", "asyncio", "urllib3")
+
+    def __init__(self, log_path=None, level=logging.DEBUG, async_mode: bool = True, rotate: str = "size",
+                 max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5, when: str = "midnight",
+                 json_lines: bool = False, repeat_interval: float = 60.0, library_level=logging.INFO):
+        self.log_path = log_path or (os.path.expanduser('~') + "/funding_rate.log")
         self.logger = logging.getLogger("FundingRate_Logger")
-        
+        self.listener = None
+
         mode = "release"
 
-        logging.basicConfig(
-            filename=self.log_path, 
-            format='%(asctime)s - %(process)d - %(levelname)s - %(message)s',
-            filemode='w', 
-            level=logging.DEBUG
-        )
+        if rotate == "size":
+            file_handler = logging.handlers.RotatingFileHandler(self.log_path, maxBytes=max_bytes, backupCount=backup_count)
+        elif rotate == "time":
+            file_handler = logging.handlers.TimedRotatingFileHandler(self.log_path, when=when, backupCount=backup_count)
+        elif rotate is None:
+            file_handler = logging.FileHandler(self.log_path, mode='w')
+        else:
+            raise ValueError(f"Unknown log rotation: {rotate}")
+        if json_lines:
+            file_handler.setFormatter(JsonFormatter())
+        else:
+            file_handler.setFormatter(logging.Formatter('%(asctime)s - %(process)d - %(levelname)s - %(message)s'))
+
+        if async_mode:
+            self.queue = queue.SimpleQueue()
+            handler = logging.handlers.QueueHandler(self.queue)
+            self.listener = logging.handlers.QueueListener(self.queue, file_handler, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)   # Flushes the queued records on exit
+        else:
+            handler = file_handler
+        # Repeats are dropped before they reach the queue, on the caller's thread
+        handler.addFilter(RepeatFilter(repeat_interval))
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(handler)
+        self.handler = handler
+        for name in self.libraries:
+            logging.getLogger(name).setLevel(library_level)
 
+    # Stops the listener thread after it has written everything queued so far
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
 
     def get_logger(self):
         return self.logger
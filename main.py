@@ -1,325 +1,212 @@
 import os
-import sys
-import json
 import time
 import logging
-import websocket
+import asyncio
 import requests as rq
 import mysql.connector as mysql
 import pandas as pd
 import numpy as np
-import datetime as dt
-from collections import defaultdict
 
 from logger_setup import LoggerSetup
 from database_handler import DatabaseHandler
+from tick_store import TickStore
+from aggregator import TickAggregator, RollupEngine, ClosedBar
+from intervals import IntervalSet
+from write_queue import BarWriteQueue
+from spool import WriteAheadSpool
+from ws_client import MarkPriceStream
+from decoder import MarkPriceFrame, make_decoder
+from bar_batch import BarBatch
+from oi_collector import OpenInterestCollector, oi_columns
+from query_api import BarCache, LatestSnapshot, QueryServer
+from symbol_registry import SymbolRegistry
+from metrics import Metrics, MetricsServer, symbol_age_collector
+from sharding import ShardCoordinator
 
 # FUNDING RATE MANAGER
 class FundingRateManager:
-    def __init__(self, db_handler: DatabaseHandler, logger: logging.Logger):
+    def __init__(self, db_handler: DatabaseHandler, logger: logging.Logger, write_queue: BarWriteQueue = None, init_coins: bool = True,
+                 metrics: Metrics = None, intervals: IntervalSet = None):
         self.db_handler = db_handler
         self.logger = logger
+        self.write_queue = write_queue   # Bars are written by its writer thread, inline when None
+        self.metrics = Metrics() if metrics is None else metrics   # Hot path counters and timings, see metrics.py
 
         self.futures_coinler = pd.DataFrame()
-        self.coin_dict = defaultdict(lambda: pd.DataFrame([]))
-        self.coin_dict_5m = defaultdict(lambda: pd.DataFrame([]))
-        self.coin_dict_list_1m = []   # Will hold 1-minute dict data
-        self.coin_dict_list_5m = [] # 5 mins
-        self.coin_dict_1h = defaultdict(lambda: pd.DataFrame([]))
-        self.coin_dict_1d = defaultdict(lambda: pd.DataFrame([]))
+        self.decoder = make_decoder()   # msgspec / orjson / stdlib json, whichever is installed
+        self.tick_store = TickStore()   # Latest tick values, one slot per coin
+        self.intervals = IntervalSet.from_env() if intervals is None else intervals   # 1m, 5m, 1h, 1d by default
+        self.tick_aggregator = TickAggregator(self.tick_store, self.intervals.base_period)   # Running sums of the finest interval
+        self.rollup_engine = RollupEngine(self.tick_store, self.intervals.rollup_levels)   # e.g. 1m -> 5m -> 1h -> 1d running sums
+        self.registry = None   # symbol_registry.SymbolRegistry, without it bars of every symbol are written
+        self.oi_collector = None   # oi_collector.OpenInterestCollector, fills the open interest columns when set
+        self.bar_cache = None        # query_api.BarCache, recent bars for local reads
+        self.latest_snapshot = None  # query_api.LatestSnapshot, latest ticks in shared memory
         self.db_rtfr_columns = [
             "timestamp", "datetime", "funding_rate", "funding_rate_mean",
             "mark_price_mean", "index_price_mean", "oi_transaction_timestamp",
             "oi_transaction_datetime", "open_interest"
         ] # columsn of our table. also has oi data
 
-        # On startup, fetch coin list
-        self.init_coin_list()
+        # On startup, fetch coin list. Without it (replays) coins are registered as they appear on the stream
+        if init_coins:
+            self.registry = SymbolRegistry(db_handler, self.tick_store, logger)
+            self.init_coin_list()
 
-    # Initialize the coin list from DB.
+    # Initialize the coin list from DB, waits with backoff until it is readable.
+    # Creates the missing tables of every coin in one batch.
     def init_coin_list(self):
-        while True:
-            df = self.db_handler.coin_list_database()
-            if not df.empty:
-                self.futures_coinler = df
-                break
-            else:
-                time.sleep(1)  # Retry until we get a valid coin list
-
-        for coin in self.futures_coinler["parite"]:
-            self.coin_dict[coin] = pd.DataFrame([])
+        self.registry.load()
+        self.futures_coinler = self.registry.coins
+        self.registry.sync()   # Registers the slots of the whole universe
 
     # Check for newly added or removed coins, create necessary tables for new coins.
+    # The registry thread keeps doing this every refresh_interval and for new symbols on the stream.
     def check_and_create_new_coin_tables(self):
-        silinen_coinler, eklenen_coinler = self.db_handler.check_coins()
+        _, eklenen_coinler = self.registry.refresh()
         if len(eklenen_coinler) > 0:
             self.logger.info(f"New coins: {eklenen_coinler}")
-            self.db_handler.db_yeni_coin_ekle(eklenen_coinler)
-            # Refresh the coin list
-            self.futures_coinler = self.db_handler.coin_list_database()
-
-    # Round the timestamp up or down to the nearest minute.
-    # Returns (roundedtimestamp, [intervals]) where intervals is a list of intervals
+        self.futures_coinler = self.registry.coins
+
+    # Restores the open rollup (5m/1h/1d) windows from the rows already in the database, once at startup,
+    # so a restart mid-hour still produces a correct 1h bar. Each level is filled from its child interval.
+    def rehydrate_rollups(self, now: int = None):
+        self.rehydrate_from(self.rehydrate_rows(now))
+
+    # [(interval, child interval rows of its open window)] read from the database
+    def rehydrate_rows(self, now: int = None) -> list:
+        now = int(time.time()) if now is None else now
+        sonuc = []
+        child_interval = self.intervals.base
+        for interval, accumulator in self.rollup_engine.levels:
+            window_start = now - now % accumulator.period
+            sonuc.append((interval, self.db_handler.get_bars_since(child_interval, window_start, self.futures_coinler["parite"])))
+            child_interval = interval
+        return sonuc
+
+    # Fills the rollup windows from rehydrate_rows(), also used by shard workers that have no database
+    def rehydrate_from(self, levels: list):
+        for interval, rows in levels:
+            for coin, coin_rows in rows.groupby("symbol"):
+                self.rollup_engine.rehydrate(interval, self.tick_store.slot(coin), coin_rows)
+
+    # Hands the bars closed by a frame to the writer queue, or writes them inline without one
+    def bar_yaz(self, kapanan_barlar: list):
+        if not kapanan_barlar:
+            return
+        if self.write_queue is not None:
+            self.write_queue.put(kapanan_barlar)
+            return
+        satir_sayilari = self.db_handler.insert_bars(kapanan_barlar)
+        if satir_sayilari is None:
+            self.logger.warning("Error writing bars to DB: " + ", ".join(batch.interval for batch in kapanan_barlar))
+
+    # Round the timestamp up or down to the nearest multiple of the finest interval (a minute by default).
+    # Returns (roundedtimestamp, [intervals]) where intervals are the configured intervals closing there
     def timestamp_yuvarla(self, timestamp:float):
-        intervals = ["1m"]
-        temp_time = dt.datetime.fromtimestamp(timestamp)
-        if temp_time.second >= 30:
-            temp_time += dt.timedelta(seconds=(60 - temp_time.second))
-        else:
-            temp_time -= dt.timedelta(seconds=temp_time.second)
-
-        new_ts = int(temp_time.timestamp())
-        # Check for 5m, 1h, 1d intervals
-        if new_ts % 300 == 0:
-            intervals.append("5m")
-        if new_ts % 3600 == 0:
-            intervals.append("1h")
-        if new_ts % 86400 == 0:
-            intervals.append("1d")
-
-        return new_ts, intervals
-
-    # Merges 3-second data into 1-minute intervals for each coin.
-    # Returns a dictionary with the 'final' row for each coin, along with mean calculations.
-    def veri_duzenle(self, ham_veri:dict) -> dict:
-        son_veri = {}
-        for coin, df_data in ham_veri.items():
-            if df_data.empty:
-                continue
-            last_event_time = df_data["E"].values[-1]
-            rounded_ts, interval = self.timestamp_yuvarla(last_event_time)
-
-            mean_fr = df_data["r"].astype(float).mean().round(16)
-            mean_mark = df_data["p"].astype(float).mean()
-            mean_index = df_data["i"].astype(float).mean()
-            # The final row funding_rate is the last row
-            final_fr = df_data["r"].values[-1]
-
-            son_veri[coin] = {
-                "timestamp": str(rounded_ts),
-                "datetime": f'"{dt.datetime.fromtimestamp(rounded_ts).strftime("%Y-%m-%d %H:%M:%S")}"',
-                "funding_rate_mean": str(mean_fr),
-                "interval": interval,
-                "symbol": coin,
-                "mark_price_mean": str(mean_mark),
-                "index_price_mean": str(mean_index),
-                "funding_rate": final_fr
-            }
-        return son_veri
-
-    # For 5-minute, 1-hour, 1-day intervals, merges multiple smaller interval data for final averages.
-    def veri_duzenle_5dk(self, ham_veri:dict) -> dict:
-        son_veri = {}
-        for coin, df_data in ham_veri.items():
-            if df_data.empty:
-                continue
-
-            # last row
-            last_ts = df_data["timestamp"].values[-1]
-            last_dt = df_data["datetime"].values[-1]
-
-            # Mean FR, mark, index
-            mean_fr = df_data["funding_rate_mean"].astype(float).mean().round(16)
-            mean_mark = df_data["mark_price_mean"].astype(float).mean()
-            mean_index = df_data["index_price_mean"].astype(float).mean()
-
-            final_fr = df_data["funding_rate"].values[-1]
-
-            son_veri[coin] = {
-                "timestamp": str(last_ts),
-                "datetime": last_dt,
-                "funding_rate_mean": str(mean_fr),
-                "symbol": coin,
-                "mark_price_mean": str(mean_mark),
-                "index_price_mean": str(mean_index),
-                "funding_rate": final_fr
-            }
-        return son_veri
-
-
-#%% WEBSOCKET CALLBACKS
-def on_open(ws):
-    print("Opened connection:", dt.datetime.now())
-
-def on_ping(ws, a):
-    print("FUNDING_RATE Ping signal received, sending pong ->: ", a, " - ", dt.datetime.now())
-
-def on_close(ws, close_status_code, close_msg):
-    print('Connection closed. Code:', close_status_code, " - Msg:", close_msg, dt.datetime.now())
-    logger.warning(f"Connection closed. Code: {close_status_code}, Msg: {close_msg}")
-    # Attempt to reconnect unless user manually closed
-    if not isinstance(sys.exc_info()[1], KeyboardInterrupt):
-        ws.run_forever(reconnect=0)
-
-def on_error(ws, err):
-    print("WEBSOCKET ERROR OCCURRED: ", err, dt.datetime.now())
-    logger.warning(f"{dt.datetime.now()} WEBSOCKET ERROR: {err}")
-    # Attempt to reconnect
-    if not isinstance(sys.exc_info()[1], KeyboardInterrupt):
-        ws.run_forever(reconnect=0)
-
-def on_message(ws, message:str):
+        period = self.intervals.base_period
+        new_ts = int((timestamp + period / 2) // period * period)
+        return new_ts, self.intervals.closing(new_ts)
+
+    # Feeds one decoded !markPrice@arr frame into the tick store, the tick aggregator and the rollups.
+    # Returns the BarBatch of every interval closed by this frame, finest first.
+    def ingest_frame(self, frame: MarkPriceFrame) -> list:
+        kapanan_barlar = []
+        slots, values = self.tick_store.ingest(frame)
+        if self.registry is not None:
+            self.registry.sync()
+        for bar in self.tick_aggregator.add_frame(slots, values):
+            batches = [self.veri_duzenle(bar, self.intervals.base)]
+            for interval, rollup_bar in self.rollup_engine.add_bar(bar):
+                batches.append(self.veri_duzenle(rollup_bar, interval))
+            if self.oi_collector is not None:
+                batches = self.oi_birlestir(bar.timestamp, batches)
+            kapanan_barlar.extend(batches)
+        if self.latest_snapshot is not None:
+            self.latest_snapshot.publish(self.tick_store, slots, values)
+        if self.bar_cache is not None and kapanan_barlar:
+            self.bar_cache.add(kapanan_barlar)
+        return kapanan_barlar
+
+    # Adds the open interest polled during the bar closing at bar_close to the batches of that close
+    # (1m and any 5m/1h/1d closing with it), so both go out in the same write. Snapshots of earlier
+    # bars that arrived late become open-interest-only batches of the oi_interval (1m), upserted
+    # into the existing rows.
+    def oi_birlestir(self, bar_close: int, batches: list) -> list:
+        snapshots = self.oi_collector.take(bar_close)
+        simdiki = snapshots.pop(bar_close, {})
+        for batch in batches:
+            batch.columns.update(oi_columns(batch.symbols, simdiki))
+        gecikmis = [BarBatch(self.intervals.oi_interval, bucket, list(snaps), oi_columns(list(snaps), snaps)) for bucket, snaps in sorted(snapshots.items())]
+        return gecikmis + batches
+
+    # Finalizes a closed bar of the aggregator or the rollup engine into a columnar BarBatch.
+    # The timestamp is rounded once per batch and the means come from one (symbols x fields) division.
+    # For 5m/1h/1d bars the means are the means of the child bars.
+    def veri_duzenle(self, bar: ClosedBar, interval: str = None) -> BarBatch:
+        interval = interval or self.intervals.base
+        rounded_ts, _ = self.timestamp_yuvarla(bar.timestamp)
+        yazilacak = bar.count > 0
+        if self.registry is not None:   # Symbols without tables yet are left out
+            yazilacak &= self.registry.ready_mask(len(yazilacak))
+        slots = np.flatnonzero(yazilacak)
+        means = bar.means()[:, slots]
+        # The final row funding_rate is the last tick (or child bar) of the interval
+        return BarBatch(interval, rounded_ts, [bar.symbols[slot] for slot in slots], {
+            "funding_rate": bar.last["r"][slots],
+            "funding_rate_mean": means[bar.fields.index("r")].round(16),
+            "mark_price_mean": means[bar.fields.index("p")],
+            "index_price_mean": means[bar.fields.index("i")],
+        })
+
+
+#%% WEBSOCKET CALLBACK
+recorder = None   # replay.FrameRecorder, set when FUNDING_RATE_RECORD is given
+
+# Called by MarkPriceStream for every frame, on its single reader task
+def on_message(message:str):
     global manager
+    received_at = time.time()
+    metrics = manager.metrics
+    if recorder is not None:
+        recorder.write(message, received_at)
+    t0 = time.perf_counter()
     try:
-        msg = json.loads(message)
-        msg = msg["data"]  # This is a list of markPriceUpdate events
+        frame = manager.decoder.decode(message)  # Columns of the markPriceUpdate events
     except Exception as e:
         logger.warning("Failed to parse JSON message: " + str(e))
+        metrics.inc("frame_errors_total")
         return
+    t1 = time.perf_counter()
+    # Binance event time vs local receive time, includes clock skew between the two hosts
+    if frame.event_time_ms:
+        metrics.observe("frame_latency_seconds", received_at - frame.event_time_ms / 1000)
 
-    # The code below references the manager's coin_dict etc.
-    coin_dict = defaultdict(lambda: pd.DataFrame([]))
-
-    # Convert the raw data into DataFrames for each coin
-    for item in msg:
-        item["E"] = int(item["E"] / 1000)
-        item["T"] = int(item["T"] / 1000)
-        coin = item["s"]
-
-        # Build a 1-row DataFrame and append to coin_dict[coin]
-        row_df = pd.DataFrame([item])
-        coin_dict[coin] = pd.concat([coin_dict[coin], row_df], ignore_index=True)
-
-    # For each coin, if we get 20+ data points or a full minute (E % 60 == 0), we process & write to DB
-    # We'll replicate the logic from the original code
-    if len(coin_dict["BTCUSDT"]) >= 20 or (not coin_dict["BTCUSDT"].empty and coin_dict["BTCUSDT"]["E"].iloc[-1] % 60 == 0):
-        # Convert 3-second data to 1-minute data
-        try:
-            duzenlenmis_veri = manager.veri_duzenle(coin_dict)
-            manager.coin_dict_list_1m.append(duzenlenmis_veri)
-        except Exception as e:
-            logger.warning("Error during 1m data preparation: " + str(e))
-
-        # Fill manager.coin_dict_5m for future 5m average
-        for coin, final_dict in duzenlenmis_veri.items():
-            if coin not in manager.coin_dict_5m:
-                manager.coin_dict_5m[coin] = pd.DataFrame([])
-            row_df = pd.DataFrame([final_dict])
-            manager.coin_dict_5m[coin] = pd.concat([manager.coin_dict_5m[coin], row_df], ignore_index=True)
-
-        # Write the collected 1-minute data in manager.coin_dict_list_1m
-        try:                
-            for dict_batch in manager.coin_dict_list_1m:
-                for coin, data_dict in dict_batch.items():
-                    intervals = data_dict.pop("interval", ["1m"])
-                    symbol = data_dict.pop("symbol", coin)
-                    table_1m = f"oi_{symbol.upper()}"
-                    manager.db_handler.insert_row(table_1m, list(data_dict.keys()), list(data_dict.values()))                        
-                    # Check intervals
-                    if "5m" in intervals:
-                        manager_5m_write = True
-                    else:
-                        manager_5m_write = False
-                    if "1h" in intervals:
-                        manager_1h_write = True
-                        manager.saatlik_timestamp = int(data_dict["timestamp"])
-                    else:
-                        manager_1h_write = False
-                    if "1d" in intervals:
-                        manager_1d_write = True
-                    else:
-                        manager_1d_write = False
-            manager.coin_dict_list_1m = []
-        except Exception as e:
-            logger.warning("Error writing 1m data to DB: " + str(e))
-            manager.db_handler.reset_connection()
-
-        # 5m data is to be written
-        try:
-            if 'manager_5m_write' in locals() and manager_5m_write:
-                duzenlenmis_veri_5m = manager.veri_duzenle_5dk(manager.coin_dict_5m)
-                manager.coin_dict_list_5m.append(duzenlenmis_veri_5m)
-                manager.coin_dict_5m = defaultdict(lambda: pd.DataFrame([]))
-
-                for dict_batch in manager.coin_dict_list_5m:
-                    for coin, data_dict in dict_batch.items():
-                        data_dict.pop("symbol", coin)
-                        table_5m = f"oi5m_{coin.upper()}"
-                        manager.db_handler.insert_row(table_5m, list(data_dict.keys()), list(data_dict.values()))                            
-                manager.coin_dict_list_5m = []
-        except Exception as e:
-            logger.warning("Error writing 5m data to DB: " + str(e))
-
-        # If 1h data is to be written
-        try:
-            if 'manager_1h_write' in locals() and manager_1h_write:
-                manager_1h_write = False
-                # For each coin, fetch last 12 rows from oi_{coin} to average
-                for coin in manager.futures_coinler["parite"]:
-                    last_rows_5m = manager.db_handler.get_last_row(table_name=f"oi1h_{coin.upper()}", satir_sayisi=12)
-                    if not last_rows_5m:
-                        continue
-                    temp_data = pd.DataFrame(last_rows_5m).fillna(0)
-                    temp_data.columns = manager.db_rtfr_columns
-                    if temp_data.empty:
-                        continue
-
-                    # Build data to write
-                    yazilacak_temp_data = {}
-                    try:
-                        last_ts = int(temp_data.loc[0, "timestamp"])
-                        if last_ts % 3600 == 0:
-                            yazilacak_temp_data['timestamp'] = str(last_ts)
-                            yazilacak_temp_data['datetime'] = f'"{temp_data.loc[0, "datetime"]}"'
-                        else:
-                            # Fallback
-                            st = manager.saatlik_timestamp if manager.saatlik_timestamp % 3600 == 0 else int(dt.datetime.now().timestamp())
-                            yazilacak_temp_data['timestamp'] = str(st)
-                            yazilacak_temp_data['datetime'] = f'"{dt.datetime.fromtimestamp(int(st)).strftime("%Y-%m-%d %H:%M:%S")}"'
-
-                        yazilacak_temp_data['funding_rate'] = str(temp_data.loc[0, "funding_rate"])
-                        yazilacak_temp_data['funding_rate_mean'] = str(temp_data["funding_rate_mean"].astype(float).mean().round(16))
-                        yazilacak_temp_data['mark_price_mean'] = str(temp_data["mark_price_mean"].astype(float).mean())
-                        yazilacak_temp_data['index_price_mean'] = str(temp_data["index_price_mean"].astype(float).mean())
-
-                        manager.db_handler.insert_row(
-                            table_name=f"oi1h_{coin.upper()}",
-                            columns=list(yazilacak_temp_data.keys()),
-                            values=list(yazilacak_temp_data.values())
-                        )
-                    except Exception as e:
-                        logger.warning("Error computing 1h average: " + str(e))
-
-        except Exception as e:
-            logger.warning("Error in 1h writing block: " + str(e))
-
-        # If 1d data is to be written
-        try:
-            if 'manager_1d_write' in locals() and manager_1d_write:
-                manager_1d_write = False
-                for coin in manager.futures_coinler["parite"]:
-                    last_rows_1h = manager.db_handler.get_last_row(table_name=f"oi1d_{coin.upper()}", satir_sayisi=24)
-                    if not last_rows_1h:
-                        continue
-                    temp_data = pd.DataFrame(last_rows_1h).fillna(0)
-                    temp_data.columns = manager.db_rtfr_columns
-
-                    yazilacak_temp_data = {}
-                    try:
-                        last_ts = int(temp_data.loc[0, "timestamp"])
-                        if last_ts % 86400 == 0:
-                            yazilacak_temp_data['timestamp'] = str(last_ts)
-                            yazilacak_temp_data['datetime'] = f'"{temp_data.loc[0, "datetime"]}"'
-                        else:
-                            st = manager.saatlik_timestamp if manager.saatlik_timestamp % 86400 == 0 else int(dt.datetime.now().timestamp())
-                            yazilacak_temp_data['timestamp'] = str(st)
-                            yazilacak_temp_data['datetime'] = f'"{dt.datetime.fromtimestamp(int(st)).strftime("%Y-%m-%d %H:%M:%S")}"'
-
-                        yazilacak_temp_data['funding_rate'] = str(temp_data.loc[0, "funding_rate"])
-                        yazilacak_temp_data['funding_rate_mean'] = str(temp_data["funding_rate_mean"].astype(float).mean().round(16))
-                        yazilacak_temp_data['mark_price_mean'] = str(temp_data["mark_price_mean"].astype(float).mean())
-                        yazilacak_temp_data['index_price_mean'] = str(temp_data["index_price_mean"].astype(float).mean())
+    # Fold the whole frame into the manager's running minute bars
+    try:
+        kapanan_barlar = manager.ingest_frame(frame)
+    except Exception as e:
+        logger.warning("Error during 1m data preparation: " + str(e))
+        metrics.inc("frame_errors_total")
+        return
+    t2 = time.perf_counter()
 
-                        manager.db_handler.insert_row(
-                            table_name=f"oi1d_{coin.upper()}",
-                            columns=list(yazilacak_temp_data.keys()),
-                            values=list(yazilacak_temp_data.values())
-                        )
-                    except Exception as e:
-                        logger.warning("Error computing 1d average: " + str(e))
+    # Bars are only emitted on rollover, the writer thread persists them off the socket thread
+    try:
+        manager.bar_yaz(kapanan_barlar)
+    except Exception as e:
+        logger.warning("Error while queueing bars: " + str(e))
+        metrics.inc("frame_errors_total")
+        return
+    t3 = time.perf_counter()
 
-        except Exception as e:
-            logger.warning("Error in 1d writing block: " + str(e))
+    metrics.observe("stage_decode_seconds", t1 - t0)
+    metrics.observe("stage_aggregate_seconds", t2 - t1)
+    metrics.observe("stage_enqueue_seconds", t3 - t2)
+    metrics.inc("frames_total")
+    metrics.inc("ticks_total", len(frame))
+    if kapanan_barlar:
+        metrics.inc("bars_total", sum(len(batch) for batch in kapanan_barlar))
 
 
 # Main
@@ -329,27 +216,110 @@ if __name__ == "__main__":
     global manager
 
 
-    logger_setup = LoggerSetup()
+    # Records are written by a listener thread, on_message only enqueues them. FUNDING_RATE_LOG_JSON=1 for JSON lines
+    logger_setup = LoggerSetup(json_lines=bool(os.environ.get("FUNDING_RATE_LOG_JSON")))
     logger = logger_setup.get_logger()
-    db_handler = DatabaseHandler(logger)
-    manager = FundingRateManager(db_handler, logger)
+    intervals = IntervalSet.from_env()   # FUNDING_RATE_INTERVALS, e.g. 1s,10s,1m,15m,4h,8h
+    # FUNDING_RATE_STORAGE=wide writes one fr_<interval> table per interval instead of the per-coin tables,
+    # FUNDING_RATE_PARTITION_BY_DAY=1 creates them RANGE partitioned by day
+    db_handler = DatabaseHandler(logger, storage_mode=os.environ.get("FUNDING_RATE_STORAGE", "per_symbol"),
+                                 partition_by_day=os.environ.get("FUNDING_RATE_PARTITION_BY_DAY", "0") != "0",
+                                 intervals=intervals)
+    metrics = Metrics()
+    # Every finished bar goes through the local spool before the DB commit, so DB outages don't lose bars
+    spool = WriteAheadSpool(os.path.expanduser('~') + "/funding_rate_spool")
+    # FUNDING_RATE_ARCHIVE=<dir> also writes every bar into the Parquet archive (archive.py), next to MySQL
+    archive_sink = None
+    sink = db_handler
+    if os.environ.get("FUNDING_RATE_ARCHIVE"):
+        from archive import ParquetArchive, ArchiveSink
+        from sinks import TeeSink
+        archive_sink = ArchiveSink(ParquetArchive(os.environ["FUNDING_RATE_ARCHIVE"]), logger=logger)
+        sink = TeeSink(db_handler, archive_sink, logger)
+    # Backpressure policy: "block", "drop_oldest" or "spill"
+    write_queue = BarWriteQueue(sink, logger, maxsize=1000, policy="spill", spool=spool, metrics=metrics)
+    manager = FundingRateManager(db_handler, logger, write_queue=write_queue, metrics=metrics, intervals=intervals)
     manager.check_and_create_new_coin_tables()
+    if db_handler.storage_mode == "wide" and db_handler.partition_by_day:   # Tables created on an earlier run
+        for interval in intervals:
+            db_handler.ensure_day_partitions(interval)
+    manager.registry.start()
+    write_queue.start()
 
     # Websocket
     link = "wss://fstream.binance.com/stream?streams="
-    markPrice_all_link = link + "!markPrice@arr"
+    markPrice_all_link = os.environ.get("FUNDING_RATE_WS_URL", link + "!markPrice@arr")
+
+    # FUNDING_RATE_SHARDS=N splits the symbols over N worker processes on per-symbol streams, see sharding.py.
+    # The workers aggregate, this process merges their bars and writes them.
+    shards = int(os.environ.get("FUNDING_RATE_SHARDS") or 1)
+    stream = None
+    coordinator = None
+    if shards > 1:
+        coordinator = ShardCoordinator(manager, shards, markPrice_all_link.split("streams=")[0] + "streams=", logger)
+        coordinator.start()
+    else:
+        manager.rehydrate_rollups()
+        # Raw frames can be recorded for replay.py
+        if os.environ.get("FUNDING_RATE_RECORD"):
+            from replay import FrameRecorder
+            recorder = FrameRecorder(os.environ["FUNDING_RATE_RECORD"])
+        stream = MarkPriceStream(markPrice_all_link, on_message, logger)
+
+    # Open interest is polled on the websocket's event loop, FUNDING_RATE_OI=0 turns it off
+    if os.environ.get("FUNDING_RATE_OI", "1") != "0":
+        manager.oi_collector = OpenInterestCollector(lambda: manager.registry.active_symbols, logger,
+                                                     base_url=os.environ.get("FUNDING_RATE_OI_URL", "https://fapi.binance.com"))
+        metrics.add_collector(manager.oi_collector.collect)
+
+    # Local reads of recent bars and latest ticks, FUNDING_RATE_QUERY_PORT=0 turns it off
+    query_server = None
+    query_port = int(os.environ.get("FUNDING_RATE_QUERY_PORT") or 9109)
+    if query_port:
+        manager.bar_cache = BarCache()
+        if coordinator is None:   # Ticks stay in the shard workers in sharded mode, /latest is not served
+            manager.latest_snapshot = LatestSnapshot(os.environ.get("FUNDING_RATE_SHM", "funding_rate_latest"))
+        query_server = QueryServer(manager.bar_cache, manager.latest_snapshot, port=query_port)
+        query_server.start()
+        logger.info(f"Query API on http://127.0.0.1:{query_server.port}")
+
+    async def calistir():
+        tasks = [stream.run() if coordinator is None else coordinator.run()]
+        if manager.oi_collector is not None:
+            tasks.append(manager.oi_collector.run())
+        await asyncio.gather(*tasks)
+
+    # Prometheus endpoint on localhost, FUNDING_RATE_METRICS_PORT=0 turns it off
+    metrics.add_collector(write_queue.collect)
+    if coordinator is None:
+        metrics.add_collector(stream.collect)
+        metrics.add_collector(symbol_age_collector(manager.tick_store))
+    else:
+        metrics.add_collector(coordinator.collect)
+    metrics_server = None
+    metrics_port = int(os.environ.get("FUNDING_RATE_METRICS_PORT") or 9108)
+    if metrics_port:
+        metrics_server = MetricsServer(metrics, port=metrics_port)
+        metrics_server.start()
+        logger.info(f"Metrics on http://127.0.0.1:{metrics_server.port}/metrics")
 
-    while True:
-        try:
-            ws_app = websocket.WebSocketApp(
-                markPrice_all_link,
-                on_open=on_open,
-                on_close=on_close,
-                on_message=on_message,
-                on_error=on_error,
-                on_ping=on_ping
-            )
-            ws_app.run_forever(reconnect=0)
-        except Exception as e:
-            logger.warning("WebSocket connection issue: " + str(e))
-            ws_app.run_forever(reconnect=0)
+    try:
+        asyncio.run(calistir())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.registry.stop()
+        if coordinator is not None:   # Before the write queue, the workers' last bars still go through it
+            coordinator.stop()
+        write_queue.stop()
+        if archive_sink is not None:   # After the writer thread, writes the open day's bars
+            archive_sink.close()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if query_server is not None:
+            query_server.stop()
+        if manager.latest_snapshot is not None:
+            manager.latest_snapshot.close()
+        if recorder is not None:
+            recorder.close()
+        logger_setup.stop()
@@ -0,0 +1,152 @@
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Low-overhead in-process metrics with a Prometheus text endpoint.
+# Counters and histograms are updated on the hot path (one lock, no allocation); values that
+# already live somewhere else (queue depth, reconnects, per-symbol ages) are read by collectors
+# only when /metrics is scraped.
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    latency_buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+    default_help = {
+        "frame_latency_seconds": "Local receive time minus Binance event time (E) of a frame",
+        "stage_decode_seconds": "Frame decode time",
+        "stage_aggregate_seconds": "Tick store, minute aggregator and rollup time per frame",
+        "stage_enqueue_seconds": "Time to hand closed bars to the writer",
+        "db_flush_seconds": "Duration of one batched insert_bars call",
+        "db_rows_written_total": "Rows written by the writer thread",
+        "write_queue_depth": "Frames of bars waiting in the write queue",
+        "websocket_reconnects": "Websocket reconnects since start",
+        "symbol_last_update_age_seconds": "Seconds since the last tick of a symbol",
+    }
+
+    def __init__(self, prefix: str = "funding_rate_"):
+        self.prefix = prefix
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.help = dict(self.default_help)
+        self.collectors = []   # fn() -> iterable of (name, labels dict, value)
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str, buckets=None):
+        self.help[name] = help_text
+        if buckets is not None:
+            self.histograms[name] = Histogram(buckets)
+
+    def inc(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: float):
+        self.gauges[name] = value
+
+    # Histograms need a describe(name, ..., buckets) first, the default buckets are in seconds
+    def observe(self, name: str, value: float):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.latency_buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def _header(self, lines: list, name: str, kind: str):
+        if name in self.help:
+            lines.append(f"# HELP {self.prefix}{name} {self.help[name]}")
+        lines.append(f"# TYPE {self.prefix}{name} {kind}")
+
+    @staticmethod
+    def _labels(labels: dict) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+    # Prometheus text exposition format
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = {name: (list(h.buckets), list(h.counts), h.sum, h.count) for name, h in self.histograms.items()}
+        for name, value in sorted(counters.items()):
+            self._header(lines, name, "counter")
+            lines.append(f"{self.prefix}{name} {value}")
+        for name, value in sorted(self.gauges.items()):
+            self._header(lines, name, "gauge")
+            lines.append(f"{self.prefix}{name} {value}")
+        for name, (buckets, counts, total, count) in sorted(histograms.items()):
+            self._header(lines, name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f'{self.prefix}{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{self.prefix}{name}_sum {total}")
+            lines.append(f"{self.prefix}{name}_count {count}")
+        seen = set()
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                if name not in seen:
+                    self._header(lines, name, "gauge")
+                    seen.add(name)
+                lines.append(f"{self.prefix}{name}{self._labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Serves GET /metrics from a daemon thread
+class MetricsServer:
+    def __init__(self, metrics: Metrics, host: str = "127.0.0.1", port: int = 9108):
+        self.metrics = metrics
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_ref.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):   # Keep scrapes out of the log file
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# Per-symbol age in seconds of the last tick, from the tick store's last event times
+def symbol_age_collector(tick_store):
+    def collect():
+        now = time.time()
+        last_event = tick_store.last("E")
+        for symbol, event_time in zip(tick_store.symbols, last_event):
+            if event_time > 0:
+                yield "symbol_last_update_age_seconds", {"symbol": symbol}, round(now - int(event_time), 3)
+    return collect
@@ -0,0 +1,73 @@
+import sys
+import argparse
+import datetime as dt
+
+from logger_setup import LoggerSetup
+from database_handler import DatabaseHandler
+from intervals import IntervalSet
+
+# Backfills the wide fr_<interval> tables from the per-symbol oi*_SYMBOL tables.
+# The copy runs server side in chunks of --chunk-days, and can be re-run safely:
+# rows already in the wide table only get their NULL columns filled.
+#
+#   python migrate_tables.py --partition-by-day --partition-from 2024-01-01
+#   python migrate_tables.py --intervals 1h 1d --since 2024-06-01
+#   python migrate_tables.py --partitions-only --days-ahead 30     (daily cron, keeps day partitions ahead)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Migrate oi*_SYMBOL tables into fr_<interval> tables")
+    parser.add_argument("--intervals", nargs="+", default=IntervalSet.from_env().names)
+    parser.add_argument("--coins", nargs="+", default=None, help="only these pairs (default: every coin in COINS)")
+    parser.add_argument("--since", default=None, help="YYYY-MM-DD, skip older rows")
+    parser.add_argument("--chunk-days", type=int, default=30)
+    parser.add_argument("--partition-by-day", action="store_true", help="create the wide tables RANGE partitioned by day")
+    parser.add_argument("--partition-from", default=None, help="YYYY-MM-DD, first day partition (older rows go to phist)")
+    parser.add_argument("--days-ahead", type=int, default=30)
+    parser.add_argument("--partitions-only", action="store_true", help="only extend the day partitions")
+    return parser.parse_args(argv)
+
+def to_timestamp(day: str) -> int:
+    return int(dt.datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=dt.timezone.utc).timestamp())
+
+def migrate(db_handler: DatabaseHandler, logger, intervals, coins, since: int, chunk_seconds: int):
+    mevcut_tablolar = set(t.upper() for t in db_handler.get_tables(prefix="oi")[0].tolist())
+    toplam = 0
+    for interval in intervals:
+        for coin in coins:
+            table_name = db_handler.table_name(coin, interval)
+            if table_name.upper() not in mevcut_tablolar:
+                continue
+            if coin.upper() not in db_handler.symbol_ids:
+                logger.warning(f"migrate: no COINS.id for {coin}, {table_name} skipped")
+                continue
+            ilk_ts, son_ts = db_handler.timestamp_range(table_name)
+            if ilk_ts is None:
+                continue
+            start = max(int(ilk_ts) - 1, since)
+            kopyalanan = 0
+            while start < son_ts:
+                end = min(start + chunk_seconds, int(son_ts))
+                kopyalanan += db_handler.copy_to_wide(coin, interval, start, end)
+                start = end
+            toplam += kopyalanan
+            print(f"{table_name} -> {db_handler.wide_table(interval)}: {kopyalanan} rows")
+            logger.info(f"migrate {table_name} -> {db_handler.wide_table(interval)}: {kopyalanan} rows")
+    return toplam
+
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    logger = LoggerSetup().get_logger()
+    db_handler = DatabaseHandler(logger, storage_mode="wide", partition_by_day=args.partition_by_day)
+
+    if args.partitions_only:
+        for interval in args.intervals:
+            db_handler.ensure_day_partitions(interval, days_ahead=args.days_ahead)
+        sys.exit(0)
+
+    partition_from = to_timestamp(args.partition_from) if args.partition_from else None
+    db_handler.create_wide_tables(args.intervals, partition_from=partition_from, days_ahead=args.days_ahead)
+    coins = args.coins or db_handler.coin_list_database()["parite"].tolist()
+    since = to_timestamp(args.since) if args.since else 0
+    toplam = migrate(db_handler, logger, args.intervals, coins, since, args.chunk_days * 86400)
+    print("Migrated rows:", toplam)
@@ -0,0 +1,155 @@
+import time
+import asyncio
+import numpy as np
+import datetime as dt
+
+try:
+    import aiohttp
+except ImportError:   # optional, only needed when open interest is collected
+    aiohttp = None
+
+# Sliding one-minute window of request weight, shared by every request of the collector.
+# The server's own count (X-MBX-USED-WEIGHT-1M) and 429/418 Retry-After answers pause it as well.
+class WeightLimiter:
+    def __init__(self, limit_per_minute: float):
+        self.limit = limit_per_minute
+        self._spent = []   # (monotonic time, weight) of the last minute
+        self._paused_until = 0.0
+
+    def _used(self, now: float) -> float:
+        while self._spent and now - self._spent[0][0] >= 60.0:
+            self._spent.pop(0)
+        return sum(weight for _, weight in self._spent)
+
+    async def acquire(self, weight: float = 1.0):
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if self._used(now) + weight <= self.limit:
+                self._spent.append((now, weight))
+                return
+            await asyncio.sleep(max(0.01, 60.0 - (now - self._spent[0][0])))
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    # Server side weight used in the current minute; over our share, wait for the next minute
+    def observe_used(self, used: float):
+        if used >= self.limit:
+            self.pause(60.0 - time.time() % 60.0)
+
+
+# Polls GET /fapi/v1/openInterest for every symbol once a minute, poll_offset seconds into the
+# minute, with at most `concurrency` requests in flight on one aiohttp session. Runs on the same
+# event loop as the websocket client, so the snapshots are handed to the bar pipeline without locks.
+#
+# A snapshot belongs to the 1m bar (T-60, T] its Binance time falls in, like the mark price ticks.
+# take(T) is called when the 1m bar T closes: snapshots of T are merged into that bar's batch,
+# older ones (a poll that finished late) are returned for their own bars and upserted by themselves.
+class OpenInterestCollector:
+    path = "/fapi/v1/openInterest"
+    request_weight = 1
+
+    def __init__(self, symbols, logger, base_url: str = "https://fapi.binance.com", concurrency: int = 8,
+                 weight_limit: float = 2400, weight_share: float = 0.5, poll_offset: float = 40.0,
+                 timeout: float = 5.0):
+        if aiohttp is None:
+            raise ImportError("aiohttp is required for the open interest collector")
+        self.symbols = symbols   # callable returning the symbols to poll
+        self.logger = logger
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.poll_offset = poll_offset
+        self.timeout = timeout
+        self.limiter = WeightLimiter(weight_limit * weight_share)   # leaves room for other clients of the same IP
+
+        self.snapshots = {}   # symbol -> (open interest, Binance time in seconds), not merged yet
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.last_cycle_seconds = 0.0
+        self._stopped = False
+
+    # Metrics collector
+    def collect(self):
+        yield "oi_requests", {}, self.requests
+        yield "oi_errors", {}, self.errors
+        yield "oi_rate_limited", {}, self.rate_limited
+        yield "oi_last_cycle_seconds", {}, round(self.last_cycle_seconds, 3)
+
+    async def fetch(self, session, symbol: str):
+        await self.limiter.acquire(self.request_weight)
+        self.requests += 1
+        try:
+            async with session.get(self.base_url + self.path, params={"symbol": symbol}) as response:
+                used = response.headers.get("X-MBX-USED-WEIGHT-1M")
+                if used is not None:
+                    self.limiter.observe_used(float(used))
+                if response.status in (418, 429):
+                    self.rate_limited += 1
+                    retry_after = float(response.headers.get("Retry-After", 60))
+                    self.limiter.pause(retry_after)
+                    self.logger.warning(f"Open interest: rate limited ({response.status}), pausing {retry_after:.0f}s")
+                    return
+                if response.status != 200:
+                    self.errors += 1
+                    return
+                data = await response.json(content_type=None)
+                self.snapshots[data["symbol"]] = (float(data["openInterest"]), int(data["time"]) // 1000)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as e:
+            self.errors += 1
+            self.logger.debug(f"Open interest {symbol}: {type(e).__name__}: {e}")
+
+    # One request per symbol, concurrency bounded by a semaphore
+    async def poll_once(self, session, symbols: list):
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(symbol):
+            async with semaphore:
+                await self.fetch(session, symbol)
+
+        await asyncio.gather(*(bounded(symbol) for symbol in symbols))
+        self.last_cycle_seconds = time.perf_counter() - start
+
+    async def run(self):
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            while not self._stopped:
+                await asyncio.sleep((self.poll_offset - time.time() % 60.0) % 60.0 or 60.0)
+                if self._stopped:
+                    break
+                try:
+                    await self.poll_once(session, list(self.symbols()))
+                except Exception as e:
+                    self.logger.warning(f"Open interest poll error: {type(e).__name__}: {e}")
+
+    def stop(self):
+        self._stopped = True
+
+    # Removes and returns the snapshots of bars closing at or before `bar_close`: {bar close: {symbol: (oi, time)}}
+    def take(self, bar_close: int) -> dict:
+        barlar = {}
+        for symbol, (open_interest, oi_time) in list(self.snapshots.items()):
+            bucket = -(-oi_time // 60) * 60
+            if bucket <= bar_close:
+                barlar.setdefault(bucket, {})[symbol] = (open_interest, oi_time)
+                del self.snapshots[symbol]
+        return barlar
+
+
+# open_interest / oi_transaction_* columns aligned with `symbols`, missing values as NaN / None
+def oi_columns(symbols: list, snapshots: dict) -> dict:
+    open_interest = np.full(len(symbols), np.nan)
+    oi_timestamp = np.full(len(symbols), None, dtype=object)
+    oi_datetime = np.full(len(symbols), None, dtype=object)
+    for k, symbol in enumerate(symbols):
+        snapshot = snapshots.get(symbol)
+        if snapshot is not None:
+            open_interest[k] = snapshot[0]
+            oi_timestamp[k] = snapshot[1]
+            oi_datetime[k] = dt.datetime.fromtimestamp(snapshot[1]).strftime("%Y-%m-%d %H:%M:%S")
+    return {"oi_transaction_timestamp": oi_timestamp, "oi_transaction_datetime": oi_datetime, "open_interest": open_interest}
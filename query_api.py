@@ -0,0 +1,228 @@
+import json
+import struct
+import threading
+import numpy as np
+from collections import deque
+from urllib.parse import urlparse, parse_qs
+from multiprocessing import shared_memory
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from intervals import interval_seconds
+
+# Hot reads without the database: recent bars and the latest tick of every symbol, from memory.
+#
+#   BarCache        bounded window of recent BarBatch objects per interval
+#   LatestSnapshot  latest r/p/i/E/T per symbol in a named shared memory block, published every frame;
+#                   other processes on the host read it with LatestSnapshotReader (no socket, no copy
+#                   on the writer side beyond the arrays themselves)
+#   QueryServer     local HTTP/JSON endpoint over both
+#
+#   GET /latest[?symbol=BTCUSDT]                     latest tick values
+#   GET /bars?interval=1m&symbol=BTCUSDT&limit=60    last bars of one symbol, oldest first
+#   GET /bars?interval=1h                            latest closed bar of every symbol
+
+class BarCache:
+    default_depth = {"1m": 1440, "5m": 576, "1h": 168, "1d": 30}
+
+    def __init__(self, depth: dict = None):
+        self.depth = dict(self.default_depth, **(depth or {}))
+        self.batches = {interval: deque(maxlen=n) for interval, n in self.depth.items()}
+
+    # Bars kept for an interval without a configured depth: a day of them, between 30 and 1440
+    # (1s bars keep the last 24 minutes)
+    def depth_of(self, interval: str) -> int:
+        if interval in self.depth:
+            return self.depth[interval]
+        return max(30, min(1440, 86400 // interval_seconds(interval)))
+
+    # Called on the stream thread with the batches closed by a frame. Late open-interest-only batches
+    # (older than the newest cached bar) are not cached, the bars they complete are already here.
+    def add(self, batches: list):
+        for batch in batches:
+            if not len(batch):
+                continue
+            cached = self.batches.get(batch.interval)
+            if cached is None:
+                cached = self.batches[batch.interval] = deque(maxlen=self.depth_of(batch.interval))
+            if cached and batch.timestamp <= cached[-1].timestamp:
+                continue
+            cached.append(batch)
+
+    def latest(self, interval: str):
+        cached = self.batches.get(interval)
+        return cached[-1] if cached else None
+
+    # Last `limit` bars of a symbol, oldest first
+    def recent(self, interval: str, symbol: str, limit: int = 1) -> list:
+        rows = []
+        for batch in reversed(list(self.batches.get(interval, ()))):
+            row = batch.row(symbol)
+            if row is not None:
+                rows.append(row)
+                if len(rows) >= limit:
+                    break
+        return rows[::-1]
+
+
+# Shared memory layout: header <seq u64><count u32><capacity u32>, then `capacity` symbol names of
+# 24 bytes, then one capacity-long array per field. seq is odd while the writer is updating
+# (seqlock), readers retry until they copied the arrays between two equal even values.
+class LatestSnapshot:
+    header = struct.Struct("<QII")
+    name_bytes = 24
+    float_fields = ("r", "p", "i")
+    int_fields = ("E", "T")
+
+    def __init__(self, name: str = "funding_rate_latest", capacity: int = 2048):
+        self.name = name
+        self.capacity = capacity
+        size = self.layout_size(capacity)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:   # Left over by a crashed run
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.views = self.map(self.shm.buf, capacity)
+        self.seq = 0
+        self.count = 0
+        self.header.pack_into(self.shm.buf, 0, self.seq, self.count, capacity)
+
+    @classmethod
+    def layout_size(cls, capacity: int) -> int:
+        return cls.header.size + capacity * cls.name_bytes + capacity * 8 * (len(cls.float_fields) + len(cls.int_fields))
+
+    # numpy views of the names and field arrays inside the buffer
+    @classmethod
+    def map(cls, buf, capacity: int) -> dict:
+        offset = cls.header.size
+        views = {"names": np.ndarray((capacity,), dtype=f"S{cls.name_bytes}", buffer=buf, offset=offset)}
+        offset += capacity * cls.name_bytes
+        for field in cls.float_fields + cls.int_fields:
+            dtype = np.float64 if field in cls.float_fields else np.int64
+            views[field] = np.ndarray((capacity,), dtype=dtype, buffer=buf, offset=offset)
+            offset += capacity * 8
+        return views
+
+    # Copies the ticks of one frame in (slots and values as returned by TickStore.ingest),
+    # called on the stream thread after each frame
+    def publish(self, tick_store, slots: np.ndarray, values: dict):
+        n = min(tick_store.size, self.capacity)
+        self.seq += 1
+        struct.pack_into("<Q", self.shm.buf, 0, self.seq)
+        if n > self.count:
+            self.views["names"][self.count:n] = [s.encode()[:self.name_bytes] for s in tick_store.symbols[self.count:n]]
+        if n < tick_store.size:   # Symbols beyond capacity are left out
+            keep = slots < n
+            slots = slots[keep]
+            values = {f: values[f][keep] for f in self.float_fields + self.int_fields}
+        for field in self.float_fields + self.int_fields:
+            self.views[field][slots] = values[field]
+        self.count = n
+        self.seq += 1
+        self.header.pack_into(self.shm.buf, 0, self.seq, self.count, self.capacity)
+
+    def close(self):
+        self.views = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Reads a LatestSnapshot from another process by name, or in the writer's process from its block
+class LatestSnapshotReader:
+    def __init__(self, name: str = "funding_rate_latest", shm=None):
+        self.owned = shm is None
+        self.shm = shared_memory.SharedMemory(name=name) if shm is None else shm
+        if self.owned:
+            try:   # A reader must not unlink the block when it exits (resource tracker of Python < 3.13)
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            except Exception:
+                pass
+        _, _, capacity = LatestSnapshot.header.unpack_from(self.shm.buf, 0)
+        self.views = LatestSnapshot.map(self.shm.buf, capacity)
+
+    # Consistent copy: (seq, symbols, {field: array})
+    def read(self, retries: int = 1000):
+        for _ in range(retries):
+            seq, count, _ = LatestSnapshot.header.unpack_from(self.shm.buf, 0)
+            if seq % 2:
+                continue
+            names = self.views["names"][:count].copy()
+            fields = {f: self.views[f][:count].copy() for f in LatestSnapshot.float_fields + LatestSnapshot.int_fields}
+            if struct.unpack_from("<Q", self.shm.buf, 0)[0] == seq:
+                return seq, [n.decode() for n in names], fields
+        raise TimeoutError("Latest snapshot kept changing while being read")
+
+    # {symbol: {funding_rate, mark_price, index_price, event_time, next_funding_time}}
+    def latest(self, symbol: str = None) -> dict:
+        seq, symbols, fields = self.read()
+        sonuc = {}
+        for k, s in enumerate(symbols):
+            if symbol is not None and s != symbol:
+                continue
+            sonuc[s] = {"funding_rate": float(fields["r"][k]), "mark_price": float(fields["p"][k]),
+                        "index_price": float(fields["i"][k]), "event_time": int(fields["E"][k]),
+                        "next_funding_time": int(fields["T"][k])}
+        return {"seq": seq, "symbols": sonuc}
+
+    def close(self):
+        self.views = None
+        if self.owned:
+            self.shm.close()
+
+
+# Serves the cache and the snapshot over HTTP/JSON from a daemon thread
+class QueryServer:
+    def __init__(self, bar_cache: BarCache, snapshot: LatestSnapshot = None, host: str = "127.0.0.1", port: int = 9109):
+        self.bar_cache = bar_cache
+        self.reader = LatestSnapshotReader(snapshot.name, snapshot.shm) if snapshot is not None else None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                try:
+                    status, body = server.handle(url.path, query)
+                except (ValueError, KeyError) as e:
+                    status, body = 400, {"error": str(e)}
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, name="query-http", daemon=True)
+
+    # (status, JSON body) of a request
+    def handle(self, path: str, query: dict):
+        symbol = query.get("symbol", "").upper() or None
+        if path == "/latest":
+            if self.reader is None:
+                return 404, {"error": "no latest snapshot"}
+            return 200, self.reader.latest(symbol)
+        if path == "/bars":
+            interval = query.get("interval", "1m")
+            if symbol is not None:
+                return 200, {"interval": interval, "symbol": symbol,
+                             "bars": self.bar_cache.recent(interval, symbol, int(query.get("limit", 1)))}
+            batch = self.bar_cache.latest(interval)
+            return 200, {"interval": interval, "bars": batch.to_dict() if batch is not None else {}}
+        return 404, {"error": "unknown path"}
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.reader is not None:
+            self.reader.close()
@@ -0,0 +1,115 @@
+import sys
+import gzip
+import time
+import asyncio
+import logging
+import argparse
+
+from main import FundingRateManager
+from sinks import make_sink
+from ws_client import MarkPriceStream
+
+# Recording and replay of raw !markPrice@arr frames.
+# A recording is a gzip text file, one frame per line: <local receive time ms>\t<raw frame>
+#
+#   python replay.py record frames.gz --seconds 3600
+#   python replay.py play frames.gz --sink sqlite:bars.db            (as fast as possible)
+#   python replay.py play frames.gz --sink memory --speed 10         (10x wall clock)
+#
+# Replay drives FundingRateManager exactly like the live websocket callback (decode -> tick
+# store -> minute aggregator -> rollups -> sink), so historical bars can be regenerated after a bug.
+
+class FrameRecorder:
+    def __init__(self, path: str, compresslevel: int = 6):
+        self.path = path
+        self._file = gzip.open(path, "at", compresslevel=compresslevel)
+        self.frames = 0
+
+    def write(self, message, received_at: float = None):
+        if isinstance(message, bytes):
+            message = message.decode()
+        received_at = time.time() if received_at is None else received_at
+        self._file.write(f"{int(received_at * 1000)}\t{message}\n")
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+
+
+# Yields (receive time ms, raw frame) from a recording
+def read_frames(path: str):
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            received_ms, message = line.rstrip("\n").split("\t", 1)
+            yield int(received_ms), message
+
+
+# Feeds a recording through the pipeline, speed 0 meaning as fast as possible.
+# Returns counters: frames, ticks, bars per interval, elapsed seconds.
+def replay(path: str, sink, logger, speed: float = 0.0) -> dict:
+    manager = FundingRateManager(sink, logger, init_coins=False)
+    stats = {"frames": 0, "ticks": 0, "bars": {}, "errors": 0}
+    first_ms = None
+    start = time.perf_counter()
+    for received_ms, message in read_frames(path):
+        if speed > 0:
+            if first_ms is None:
+                first_ms = received_ms
+            delay = (received_ms - first_ms) / 1000 / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        try:
+            frame = manager.decoder.decode(message)
+            kapanan_barlar = manager.ingest_frame(frame)
+        except Exception as e:
+            stats["errors"] += 1
+            logger.warning("Replay: bad frame skipped: " + str(e))
+            continue
+        manager.bar_yaz(kapanan_barlar)
+        stats["frames"] += 1
+        stats["ticks"] += len(frame)
+        for batch in kapanan_barlar:
+            stats["bars"][batch.interval] = stats["bars"].get(batch.interval, 0) + len(batch)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+async def record(url: str, path: str, seconds: float, logger) -> int:
+    recorder = FrameRecorder(path)
+    stream = MarkPriceStream(url, recorder.write, logger)
+    task = asyncio.create_task(stream.run())
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await stream.stop()
+        await task
+        recorder.close()
+    return recorder.frames
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay !markPrice@arr frames")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_record = sub.add_parser("record")
+    p_record.add_argument("path")
+    p_record.add_argument("--url", default="wss://fstream.binance.com/stream?streams=!markPrice@arr")
+    p_record.add_argument("--seconds", type=float, default=3600)
+    p_play = sub.add_parser("play")
+    p_play.add_argument("path")
+    p_play.add_argument("--sink", default="memory", help='"memory", "null", "sqlite:<path>", "parquet:<root>" or "mysql"')
+    p_play.add_argument("--speed", type=float, default=0.0, help="N x wall clock, 0 = as fast as possible")
+    args = parser.parse_args(sys.argv[1:])
+
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    logger = logging.getLogger("FundingRate_Replay")
+
+    if args.command == "record":
+        frames = asyncio.run(record(args.url, args.path, args.seconds, logger))
+        print(f"Recorded {frames} frames to {args.path}")
+    else:
+        sink = make_sink(args.sink, logger)
+        stats = replay(args.path, sink, logger, args.speed)
+        if hasattr(sink, "close"):   # the Parquet sink writes its open day here
+            sink.close()
+        print(f"Replayed {stats['frames']} frames / {stats['ticks']} ticks in {stats['seconds']:.2f}s "
+              f"({stats['ticks'] / max(stats['seconds'], 1e-9):,.0f} ticks/s), bars: {stats['bars']}, bad frames: {stats['errors']}")
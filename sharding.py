@@ -0,0 +1,318 @@
+import time
+import zlib
+import queue
+import signal
+import asyncio
+import logging
+import multiprocessing as mp
+from logging.handlers import QueueHandler, QueueListener
+
+from bar_batch import BarBatch
+from decoder import MarkPriceFrame
+from ws_client import MarkPriceStream
+from logger_setup import LoggerSetup
+
+# Sharded ingestion over several processes. The symbol universe is split into N shards by a stable
+# hash; every shard runs in its own worker process with its own websocket connections to the
+# per-symbol <symbol>@markPrice@1s streams, decoder, tick store, minute aggregator and rollups.
+# Workers only send their closed BarBatch lists back; the coordinator, in the main process, merges
+# the batches of the same bar close across shards and hands them to the one batched writer
+# (write queue, spool, DB pool), together with open interest, the bar cache and the registry.
+#
+#   FUNDING_RATE_SHARDS=4 python main.py
+
+# Shard of a symbol, stable across runs and processes (unlike hash())
+def shard_of(symbol: str, shards: int) -> int:
+    return zlib.crc32(symbol.upper().encode()) % shards
+
+# Symbols of each shard, sorted
+def assign_shards(symbols, shards: int) -> list:
+    parcalar = [[] for _ in range(shards)]
+    for symbol in sorted(set(s.upper() for s in symbols)):
+        parcalar[shard_of(symbol, shards)].append(symbol)
+    return parcalar
+
+# Combined stream URLs of the per-symbol mark price streams, at most per_connection streams each.
+# base_url ends with "streams=", e.g. wss://fstream.binance.com/stream?streams=
+def stream_urls(symbols: list, base_url: str, per_connection: int = 200) -> list:
+    return [base_url + "/".join(f"{s.lower()}@markPrice@1s" for s in symbols[k:k + per_connection])
+            for k in range(0, len(symbols), per_connection)]
+
+
+# Per-symbol streams deliver one markPriceUpdate per message. The batcher groups the messages of one
+# event second back into a frame, so the aggregators work on frames like with !markPrice@arr.
+# A frame is closed by the first message of a later second, by a symbol that is already in it,
+# or after max_wait seconds (checked by the worker's timer).
+class FrameBatcher:
+    def __init__(self, max_wait: float = 2.0):
+        self.max_wait = max_wait
+        self.frames = []
+        self.symbols = set()
+        self.second = 0
+        self.started = 0.0
+
+    def add(self, frame: MarkPriceFrame) -> list:
+        if not len(frame):
+            return []
+        kapanan = []
+        second = int(frame.values["E"].max())
+        if self.frames and (second > self.second or not self.symbols.isdisjoint(frame.symbols)):
+            kapanan.append(self.flush())
+        if not self.frames:
+            self.started = time.monotonic()
+        self.frames.append(frame)
+        self.symbols.update(frame.symbols)
+        self.second = max(self.second, second)
+        return kapanan
+
+    def due(self, now: float) -> bool:
+        return bool(self.frames) and now - self.started >= self.max_wait
+
+    def flush(self) -> MarkPriceFrame:
+        frame = MarkPriceFrame.concat(self.frames)
+        self.frames = []
+        self.symbols = set()
+        return frame
+
+
+# Runs in a worker process: websocket connections of one shard, feeding a FundingRateManager
+# without database, registry or write queue. Commands from the coordinator arrive on `control`:
+# ("symbols", [...]) re-subscribes after a universe change, ("stop",) ends the worker.
+class ShardWorker:
+    def __init__(self, shard: int, manager, symbols: list, base_url: str, bars, control, logger,
+                 per_connection: int = 200):
+        self.shard = shard
+        self.manager = manager
+        self.base_url = base_url
+        self.bars = bars
+        self.control = control
+        self.logger = logger
+        self.per_connection = per_connection
+        self.batcher = FrameBatcher()
+        self.symbols = list(symbols)
+        self.streams = {}   # url -> (MarkPriceStream, task)
+
+    def on_message(self, message: str):
+        try:
+            frame = self.manager.decoder.decode(message)
+        except Exception as e:
+            self.logger.warning(f"Shard {self.shard}: failed to parse JSON message: {e}")
+            return
+        for batch_frame in self.batcher.add(frame):
+            self.ingest(batch_frame)
+
+    def ingest(self, frame: MarkPriceFrame):
+        try:
+            kapanan_barlar = self.manager.ingest_frame(frame)
+        except Exception as e:
+            self.logger.warning(f"Shard {self.shard}: error during 1m data preparation: {e}")
+            return
+        if kapanan_barlar:
+            self.bars.put((self.shard, kapanan_barlar))
+
+    # Opens the connections of the new symbol list, connections whose URL did not change are kept
+    async def subscribe(self, symbols: list):
+        self.symbols = list(symbols)
+        urls = stream_urls(self.symbols, self.base_url, self.per_connection)
+        for url in [u for u in self.streams if u not in urls]:
+            stream, task = self.streams.pop(url)
+            await stream.stop()
+            await asyncio.gather(task, return_exceptions=True)
+        for url in urls:
+            if url not in self.streams:
+                stream = MarkPriceStream(url, self.on_message, self.logger)
+                self.streams[url] = (stream, asyncio.create_task(stream.run()))
+
+    async def run(self, poll_interval: float = 0.2):
+        await self.subscribe(self.symbols)
+        self.logger.info(f"Shard {self.shard}: {len(self.symbols)} symbols on {len(self.streams)} connections")
+        while True:
+            await asyncio.sleep(poll_interval)
+            try:
+                command = self.control.get_nowait()
+            except queue.Empty:
+                command = None
+            if self.batcher.due(time.monotonic()):
+                self.ingest(self.batcher.flush())
+            if command is None:
+                continue
+            if command[0] == "stop":
+                break
+            if command[0] == "symbols":
+                await self.subscribe(command[1])
+                self.logger.info(f"Shard {self.shard}: re-subscribed, {len(self.symbols)} symbols")
+        await self.subscribe([])
+
+
+# Process entry point. Log records go to the coordinator's listener through log_queue;
+# Ctrl+C is left to the coordinator, which stops the workers through their control queues.
+def shard_main(shard: int, symbols: list, base_url: str, bars, control, log_queue, rehydrate: list = None,
+               per_connection: int = 200):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(logging.DEBUG)
+    for name in LoggerSetup.libraries:
+        logging.getLogger(name).setLevel(logging.INFO)
+    logger = logging.getLogger(f"FundingRate_Shard{shard}")
+
+    from main import FundingRateManager
+    manager = FundingRateManager(None, logger, init_coins=False)
+    if rehydrate:
+        manager.rehydrate_from(rehydrate)
+    asyncio.run(ShardWorker(shard, manager, symbols, base_url, bars, control, logger, per_connection).run())
+
+
+# Main process side: starts the workers, merges their bars and keeps the shards in line with the
+# registry. Batches of one bar close are merged once every shard with symbols reported it, or
+# merge_timeout seconds after the first one did (a quiet or restarting shard does not hold the
+# others back; its bars are written by themselves when they come, upserts make that safe).
+# Runs on the event loop of main.py next to the open interest collector, so no locks are needed.
+class ShardCoordinator:
+    def __init__(self, manager, shards: int, base_url: str, logger, merge_timeout: float = 5.0,
+                 per_connection: int = 200, watch_interval: float = 30.0):
+        self.manager = manager
+        self.shards = shards
+        self.base_url = base_url
+        self.logger = logger
+        self.merge_timeout = merge_timeout
+        self.per_connection = per_connection
+        self.watch_interval = watch_interval
+
+        self.ctx = mp.get_context("spawn")   # no forked copies of the DB pool, threads or sockets
+        self.bars = self.ctx.Queue()
+        self.log_queue = self.ctx.Queue()
+        self.listener = None
+        self.workers = {}   # shard -> [process, control queue, symbols]
+        self.pending = {}   # bar close -> {"shards": set, "batches": {interval: [BarBatch]}, "first": monotonic}
+        self.written_upto = 0   # latest bar close handed to the writer
+        self.merged = 0
+        self.late = 0
+        self.restarts = 0
+        self._stopped = False
+
+    # Metrics collector
+    def collect(self):
+        yield "shards_alive", {}, sum(1 for process, _, _ in self.workers.values() if process.is_alive())
+        yield "shard_restarts", {}, self.restarts
+        yield "shard_merged_closes", {}, self.merged
+        yield "shard_late_batches", {}, self.late
+        yield "shard_pending_closes", {}, len(self.pending)
+
+    def assignment(self) -> list:
+        symbols = self.manager.registry.active_symbols if self.manager.registry is not None else []
+        return assign_shards(symbols, self.shards)
+
+    # Rows of the open rollup windows of the whole universe, one DB read shared by every shard spawned
+    def _read_rehydrate_rows(self) -> list:
+        try:
+            return self.manager.rehydrate_rows()
+        except Exception as e:
+            self.logger.warning(f"Shard rehydrate error: {type(e).__name__}: {e}")
+            return []
+
+    # Only the rows of the shard's symbols
+    @staticmethod
+    def _shard_rows(levels: list, symbols: list) -> list:
+        return [(interval, rows[rows["symbol"].isin(symbols)]) for interval, rows in levels]
+
+    def _spawn(self, shard: int, symbols: list, levels: list):
+        control = self.ctx.Queue()
+        process = self.ctx.Process(target=shard_main, name=f"shard-{shard}", daemon=True,
+                                   args=(shard, symbols, self.base_url, self.bars, control, self.log_queue,
+                                         self._shard_rows(levels, symbols), self.per_connection))
+        process.start()
+        self.workers[shard] = [process, control, symbols]
+
+    def start(self):
+        self.listener = QueueListener(self.log_queue, *logging.getLogger().handlers)
+        self.listener.start()
+        levels = self._read_rehydrate_rows()
+        for shard, symbols in enumerate(self.assignment()):
+            self._spawn(shard, symbols, levels)
+        self.logger.info(f"Sharded ingestion: {self.shards} workers, " +
+                         ", ".join(str(len(symbols)) for _, _, symbols in self.workers.values()) + " symbols")
+
+    # Files the batches of one worker message under their bar close
+    def _on_bars(self, shard: int, kapanan_barlar: list):
+        for batch in kapanan_barlar:
+            if batch.timestamp <= self.written_upto and batch.timestamp not in self.pending:
+                self.late += 1
+                self._write(batch.timestamp, [batch])
+                continue
+            entry = self.pending.setdefault(batch.timestamp, {"shards": set(), "batches": {}, "first": time.monotonic()})
+            entry["shards"].add(shard)
+            entry["batches"].setdefault(batch.interval, []).append(batch)
+
+    # Takes every worker message already queued, waiting up to `timeout` for each next one
+    def _receive(self, timeout: float = 0.0):
+        while True:
+            try:
+                shard, kapanan_barlar = self.bars.get(timeout=timeout) if timeout else self.bars.get_nowait()
+            except queue.Empty:
+                return
+            self._on_bars(shard, kapanan_barlar)
+
+    # Writes the complete or timed out closes, oldest first
+    def _drain(self, now: float, force: bool = False):
+        beklenen = sum(1 for _, _, symbols in self.workers.values() if symbols)
+        for bar_close in sorted(self.pending):
+            entry = self.pending[bar_close]
+            if not (force or len(entry["shards"]) >= beklenen or now - entry["first"] >= self.merge_timeout):
+                break
+            del self.pending[bar_close]
+            self.merged += 1
+            self._write(bar_close, [BarBatch.concat(batches) for batches in entry["batches"].values()])
+
+    def _write(self, bar_close: int, batches: list):
+        self.written_upto = max(self.written_upto, bar_close)
+        if self.manager.oi_collector is not None and any(batch.interval == self.manager.intervals.base for batch in batches):
+            batches = self.manager.oi_birlestir(bar_close, batches)
+        if self.manager.bar_cache is not None:
+            self.manager.bar_cache.add(batches)
+        self.manager.bar_yaz(batches)
+        self.manager.metrics.inc("bars_total", sum(len(batch) for batch in batches))
+
+    # Restarts dead workers and re-subscribes the shards whose symbols changed in the registry.
+    # The rehydrate rows of restarted workers are read in an executor, off the event loop.
+    async def watch(self):
+        levels = None
+        for shard, symbols in enumerate(self.assignment()):
+            process, control, eski = self.workers[shard]
+            if not process.is_alive():
+                self.restarts += 1
+                self.logger.warning(f"Shard {shard} exited with code {process.exitcode}, restarting")
+                if levels is None:
+                    levels = await asyncio.get_running_loop().run_in_executor(None, self._read_rehydrate_rows)
+                self._spawn(shard, symbols, levels)
+            elif symbols != eski:
+                control.put(("symbols", symbols))
+                self.workers[shard][2] = symbols
+
+    # Polls the bar queue without blocking the event loop; nothing is left half-read when the loop stops
+    async def run(self, poll_interval: float = 0.05):
+        son_kontrol = time.monotonic()
+        while not self._stopped:
+            await asyncio.sleep(poll_interval)
+            self._receive()
+            now = time.monotonic()
+            self._drain(now)
+            if now - son_kontrol >= self.watch_interval:
+                son_kontrol = now
+                await self.watch()
+
+    # Stops the workers, then writes whatever they sent before exiting
+    def stop(self, timeout: float = 5.0):
+        self._stopped = True
+        for process, control, _ in self.workers.values():
+            if process.is_alive():
+                control.put(("stop",))
+        for process, _, _ in self.workers.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._receive(timeout=0.1)
+        self._drain(time.monotonic(), force=True)
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
@@ -0,0 +1,146 @@
+import time
+import sqlite3
+from collections import defaultdict
+
+from intervals import default_intervals
+from write_queue import RejectedBars
+
+# Bar sinks besides DatabaseHandler (MySQL). A sink takes the bars closed by the pipeline as a list
+# of bar_batch.BarBatch through insert_bars and returns {table: rows}, None on failure.
+
+# Keeps every bar in memory: bars[interval][coin] -> list of rows, in arrival order
+class MemorySink:
+    def __init__(self):
+        self.bars = defaultdict(lambda: defaultdict(list))
+
+    def insert_bars(self, bars) -> dict:
+        satir_sayilari = defaultdict(int)
+        for batch in bars:
+            for coin, data_dict in batch.to_dict().items():
+                self.bars[batch.interval][coin].append(data_dict)
+            satir_sayilari[batch.interval] += len(batch)
+        return dict(satir_sayilari)
+
+
+# Stand-in for the database in benchmarks: counts rows, optionally sleeping `latency` seconds per call
+class NullSink:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.rows = 0
+
+    def insert_bars(self, bars) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        satir_sayilari = defaultdict(int)
+        for batch in bars:
+            satir_sayilari[batch.interval] += len(batch)
+        self.rows += sum(satir_sayilari.values())
+        return dict(satir_sayilari)
+
+
+# One bars_<interval> table per interval keyed by (symbol, timestamp) in a local SQLite file.
+# Same upsert rule as the MySQL tables: an existing row only gets its NULL columns filled.
+class SQLiteSink:
+    columns = ["timestamp", "datetime", "funding_rate", "funding_rate_mean", "mark_price_mean", "index_price_mean",
+               "oi_transaction_timestamp", "oi_transaction_datetime", "open_interest"]
+
+    def __init__(self, path: str, intervals=default_intervals):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.tables = set()
+        for interval in intervals:
+            self.create_table(interval)
+
+    def table_name(self, interval: str) -> str:
+        return "bars_" + interval
+
+    def create_table(self, interval: str):
+        column_defs = ", ".join(f"{c} {'TEXT' if 'datetime' in c else 'REAL'}" for c in self.columns[1:])
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name(interval)} "
+                        f"(symbol TEXT NOT NULL, timestamp INTEGER NOT NULL, {column_defs}, PRIMARY KEY (symbol, timestamp))")
+        self.db.commit()
+        self.tables.add(interval)
+
+    def insert_bars(self, bars) -> dict:
+        tablolar = defaultdict(list)   # (interval, columns) -> rows
+        for batch in bars:
+            tablolar[(batch.interval, batch.column_names)].extend(
+                (coin,) + record for coin, record in zip(batch.symbols, batch.records()))
+        satir_sayilari = defaultdict(int)
+        try:
+            for (interval, columns), rows in tablolar.items():
+                if interval not in self.tables:
+                    self.create_table(interval)
+                guncellenecek = [c for c in columns if c not in ("timestamp", "datetime")]
+                sql_str = (f"INSERT INTO {self.table_name(interval)} (symbol, {', '.join(columns)}) "
+                           f"VALUES ({', '.join(['?'] * (len(columns) + 1))}) ON CONFLICT (symbol, timestamp) DO UPDATE SET "
+                           + ", ".join(f"{c} = COALESCE({c}, excluded.{c})" for c in guncellenecek))
+                self.db.executemany(sql_str, rows)
+                satir_sayilari[self.table_name(interval)] += len(rows)
+            self.db.commit()
+            return dict(satir_sayilari)
+        except sqlite3.Error:
+            self.db.rollback()
+            return None
+
+    def close(self):
+        self.db.close()
+
+
+# Hands the bars to a primary sink and a secondary one (e.g. the Parquet archive next to MySQL).
+# The primary's result is what the write queue sees; a failing secondary is only logged.
+# When the primary rejects part of the bars (RejectedBars) the secondary still gets them all.
+class TeeSink:
+    def __init__(self, primary, secondary, logger=None):
+        self.primary = primary
+        self.secondary = secondary
+        self.logger = logger
+
+    def insert_bars(self, bars) -> dict:
+        try:
+            satir_sayilari = self.primary.insert_bars(bars)
+        except RejectedBars:
+            self._secondary_insert(bars)
+            raise
+        self._secondary_insert(bars)
+        return satir_sayilari
+
+    def _secondary_insert(self, bars):
+        try:
+            if self.secondary.insert_bars(bars) is None and self.logger is not None:
+                self.logger.warning("Secondary sink failed to take the bars")
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.warning(f"Secondary sink error: {type(e).__name__}: {e}")
+
+    def reset_connection(self):
+        reset_connection = getattr(self.primary, "reset_connection", None)
+        if reset_connection is not None:
+            reset_connection()
+
+    def close(self):
+        for sink in (self.primary, self.secondary):
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close()
+
+
+# Builds a sink from a spec: "memory", "null", "sqlite:<path>", "parquet:<root>" or "mysql"
+def make_sink(spec: str, logger=None):
+    if spec == "memory":
+        return MemorySink()
+    if spec == "null":
+        return NullSink()
+    if spec.startswith("sqlite:"):
+        return SQLiteSink(spec[len("sqlite:"):])
+    if spec.startswith("parquet:"):
+        from archive import ParquetArchive, ArchiveSink
+        return ArchiveSink(ParquetArchive(spec[len("parquet:"):]), logger=logger)
+    if spec == "mysql":
+        from database_handler import DatabaseHandler
+        return DatabaseHandler(logger)
+    raise ValueError(f"Unknown sink: {spec}")
@@ -0,0 +1,154 @@
+import os
+import json
+import zlib
+import struct
+
+try:
+    import msgpack
+except ImportError:   # optional, records are JSON encoded without it
+    msgpack = None
+
+from bar_batch import BarBatch
+
+# Append-only local write-ahead spool for finished bars.
+# Every batch is appended (and fsynced once per batch) before it is sent to the database and
+# acknowledged after the commit, so a database outage only delays bars: on reconnect the
+# unacknowledged records are replayed in order. Files are segments named after their first
+# sequence number; fully acknowledged segments are deleted. Bars that can never be written are
+# moved to dead_letter.dlq so they do not hold back the records behind them.
+#
+# Record layout: <payload length u32><crc32 u32><codec u8><payload>, payload = [seq, [BarBatch.to_payload()...]]
+class WriteAheadSpool:
+    header = struct.Struct("<IIB")
+    codec_json = 0
+    codec_msgpack = 1
+
+    def __init__(self, directory: str, segment_bytes: int = 4 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.ack_path = os.path.join(directory, "ack")
+        self.dead_letter_path = os.path.join(directory, "dead_letter.dlq")
+        self.acked = self._read_ack()
+        self.last_seq = self.acked
+        for path in self._segments():
+            with open(path, "rb") as f:
+                data = f.read()
+            gecerli = 0
+            for seq, _, gecerli in self._records(data):
+                self.last_seq = max(self.last_seq, seq)
+            if gecerli < len(data):   # Torn by a crash; appends behind it would be unreadable, cut it off
+                with open(path, "r+b") as f:
+                    f.truncate(gecerli)
+        self._file = None
+
+    def _segments(self) -> list:
+        return sorted(os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".wal"))
+
+    def _read_ack(self) -> int:
+        try:
+            with open(self.ack_path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _encode(self, seq: int, bars: list) -> bytes:
+        bars = [batch.to_payload() for batch in bars]
+        if msgpack is not None:
+            codec, payload = self.codec_msgpack, msgpack.packb([seq, bars], use_bin_type=True)
+        else:
+            codec, payload = self.codec_json, json.dumps([seq, bars]).encode()
+        return self.header.pack(len(payload), zlib.crc32(payload), codec) + payload
+
+    def _decode(self, codec: int, payload: bytes):
+        if codec == self.codec_msgpack:
+            seq, bars = msgpack.unpackb(payload, raw=False)
+        else:
+            seq, bars = json.loads(payload)
+        return seq, [BarBatch.from_payload(batch) for batch in bars]
+
+    # Yields (seq, bars, end offset) of the records in data; a torn or corrupt tail (crash mid-write) ends it
+    def _records(self, data: bytes):
+        offset = 0
+        while offset + self.header.size <= len(data):
+            length, crc, codec = self.header.unpack_from(data, offset)
+            payload = data[offset + self.header.size:offset + self.header.size + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            offset += self.header.size + length
+            yield (*self._decode(codec, payload), offset)
+
+    # Yields (seq, bars) records of a segment
+    def _read_segment(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        for seq, bars, _ in self._records(data):
+            yield seq, bars
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, f"{self.last_seq + 1:016d}.wal")
+        self._file = open(path, "ab")
+
+    # Appends one batch of bars (list of BarBatch), returns its sequence number.
+    # The record is only durable after sync().
+    def append(self, bars: list) -> int:
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            self.close()
+            self._open_segment()
+        self.last_seq += 1
+        self._file.write(self._encode(self.last_seq, bars))
+        return self.last_seq
+
+    def sync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    # Unacknowledged records, oldest first
+    def replay(self):
+        for path in self._segments():
+            for seq, bars in self._read_segment(path):
+                if seq > self.acked:
+                    yield seq, bars
+
+    @property
+    def pending(self) -> int:
+        return self.last_seq - self.acked
+
+    # Marks every record up to seq as written. Replaying an acknowledged record again is harmless
+    # (rows are upserts), so the ack file is replaced atomically but not fsynced.
+    def ack(self, seq: int):
+        self.acked = max(self.acked, seq)
+        tmp_path = self.ack_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(self.acked))
+        os.replace(tmp_path, self.ack_path)
+
+        segments = self._segments()
+        if self.acked >= self.last_seq:   # Everything written, start over with an empty segment
+            self.close()
+            for path in segments:
+                os.remove(path)
+            return
+        # A segment is done when the next one starts at or below the first unacknowledged record
+        for path, next_path in zip(segments, segments[1:]):
+            if int(os.path.basename(next_path)[:-4]) <= self.acked + 1:
+                os.remove(path)
+
+    # Keeps bars that can never be written, in the record layout of the segments, outside the replay
+    def dead_letter(self, bars: list):
+        with open(self.dead_letter_path, "ab") as f:
+            f.write(self._encode(0, bars))
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Dead-lettered bars, oldest first, for inspection or a manual replay
+    def dead_letters(self):
+        if os.path.exists(self.dead_letter_path):
+            for _, bars in self._read_segment(self.dead_letter_path):
+                yield bars
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
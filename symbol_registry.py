@@ -0,0 +1,204 @@
+import time
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from collections import deque
+
+# In-memory symbol universe shared by the hot path and the database.
+# The COINS table is cached with a version and an ETag (hash of its ids and symbols); a background
+# thread re-reads it every refresh_interval seconds and only does work when the ETag changed.
+# Symbols that show up on the stream but not in COINS are registered there and get their tables
+# in one batch; symbols removed from COINS are retired (their tables are kept).
+#
+# The tick store stays the only symbol -> slot map (a dict, O(1)) and is only touched on the
+# stream thread: sync() is called once per frame and applies what the background thread decided
+# to the `ready` mask, one bool per slot telling whether bars of that slot can be written.
+class SymbolRegistry:
+    def __init__(self, db_handler, tick_store, logger, refresh_interval: float = 300.0,
+                 retire_after: float = 3600.0, auto_register: bool = True, retry_interval: float = 30.0):
+        self.db_handler = db_handler
+        self.tick_store = tick_store
+        self.logger = logger
+        self.refresh_interval = refresh_interval
+        self.retire_after = retire_after   # seconds without a tick before a symbol counts as delisted
+        self.auto_register = auto_register
+        self.retry_interval = retry_interval   # seconds between retries of failed table creations
+
+        self.universe = {}   # parite -> COINS.id
+        self.coins = pd.DataFrame(columns=["id", "parite", "oi_pool_id"])
+        self.version = 0
+        self.etag = None
+        self.retired = set()   # in COINS (or seen before) but delisted, no bars are written for them
+        self.ready = np.zeros(max(tick_store.size, 16), dtype=bool)   # slot -> bars can be written
+
+        self._tables = None   # symbols that have their tables, one INFORMATION_SCHEMA scan then kept in memory
+        self._missing = set()  # symbols whose CREATE TABLE failed, not ready until a retry creates them
+        self._seen = 0        # tick store slots already looked at by sync()
+        self._new = deque()   # stream symbols missing from COINS, filled by sync()
+        self._updates = deque()   # (symbol, ready) for sync() to apply
+        self._lock = threading.Lock()   # one refresh at a time
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def universe_etag(universe: dict) -> str:
+        payload = ",".join(f"{i}:{p}" for p, i in sorted(universe.items()))
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    @property
+    def active_symbols(self) -> list:
+        return [s for s in self.universe if s not in self.retired]
+
+    # Called on the stream thread after every frame: notices new slots and applies readiness changes
+    def sync(self):
+        guncellemeler = []
+        while self._updates:   # slot() registers symbols not ticked yet, before the mask is grown
+            symbol, ready = self._updates.popleft()
+            guncellemeler.append((self.tick_store.slot(symbol), ready))
+        n = self.tick_store.size
+        if n > len(self.ready):
+            grown = np.zeros(max(n, 2 * len(self.ready)), dtype=bool)
+            grown[:len(self.ready)] = self.ready
+            self.ready = grown
+        if n != self._seen:
+            yeni = [s for s in self.tick_store.symbols[self._seen:n] if s not in self.universe]
+            self._seen = n
+            if yeni:
+                self._new.extend(yeni)
+                self._wake.set()
+        for slot, ready in guncellemeler:
+            self.ready[slot] = ready
+
+    # Bool mask of the first n slots, True where bars can be written
+    def ready_mask(self, n: int) -> np.ndarray:
+        return self.ready[:n]
+
+    # Symbols that already have the tables of every configured interval (an interval added to the
+    # configuration gets its tables created for the existing symbols too)
+    def existing_tables(self, symbols) -> set:
+        if self.db_handler.storage_mode == "wide":   # Shared tables, created with the first refresh
+            return set()
+        tablolar = self.db_handler.get_tables(prefix="oi")
+        if tablolar.empty:
+            return set()
+        mevcut = {t.upper() for t in tablolar[0]}
+        return {s for s in symbols
+                if all(self.db_handler.table_name(s, interval).upper() in mevcut for interval in self.db_handler.table_prefixes)}
+
+    # Re-reads COINS; does nothing if the ETag did not change. Returns (added, removed) symbols.
+    def refresh(self):
+        with self._lock:
+            coins = self.db_handler.coin_list_database()
+            if coins is None:   # DB error, keep serving the cached universe
+                return [], []
+            universe = {str(p).upper(): int(i) for i, p in zip(coins["id"], coins["parite"])}
+            etag = self.universe_etag(universe)
+            if etag == self.etag:
+                if self._missing:
+                    self.create_missing(sorted(self._missing & set(universe)))
+                return [], []
+
+            if self._tables is None:
+                self._tables = self.existing_tables(universe)
+            added = sorted(set(universe) - set(self.universe))
+            removed = sorted(set(self.universe) - set(universe))
+            self.retired.difference_update(added)
+            self._missing.clear()
+            olusturulan = self.create_missing(sorted(s for s in universe if s not in self._tables))
+            self.universe = universe
+            self.coins = coins
+            self.db_handler.symbol_ids = dict(universe)
+            self.etag = etag
+            self.version += 1
+            for symbol in added:
+                if symbol in self._tables and symbol not in olusturulan:   # created ones are already queued
+                    self._updates.append((symbol, True))
+            for symbol in removed:
+                self.retired.add(symbol)
+                self._updates.append((symbol, False))
+            if self.version > 1 and (added or removed):
+                self.logger.info(f"Symbol universe v{self.version} ({etag}): added {added}, retired {removed}")
+            return added, removed
+
+    # Creates the tables of symbols that have none, all in one batch. Only the symbols whose tables
+    # were created become ready, the failed ones stay in _missing and are retried every retry_interval.
+    def create_missing(self, eksik: list) -> set:
+        if not eksik:
+            return set()
+        olusturulan = set(self.db_handler.db_yeni_coin_ekle(eksik))
+        self._tables.update(olusturulan)
+        self._missing = set(eksik) - olusturulan
+        for symbol in sorted(olusturulan):
+            if symbol not in self.retired:
+                self._updates.append((symbol, True))
+        if self._missing:
+            self.logger.warning(f"Symbol registry: tables of {sorted(self._missing)} could not be created, "
+                                f"retrying in {self.retry_interval:.0f}s")
+        return olusturulan
+
+    # Blocks until COINS is readable and non-empty, retrying with backoff (replaces the 1s busy poll)
+    def load(self, max_backoff: float = 30.0):
+        delay = 0.5
+        while True:
+            self.refresh()
+            if self.universe:
+                return
+            self.logger.warning(f"Symbol registry: coin list is empty or unreadable, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(max_backoff, delay * 2)
+
+    # Adds the stream symbols that are missing from COINS, then refreshes so their tables get created
+    def register_new(self):
+        yeni = set()
+        while self._new:
+            yeni.add(self._new.popleft())
+        yeni -= set(self.universe)
+        if not yeni:
+            return
+        if not self.auto_register:
+            self.logger.warning(f"Symbol registry: symbols not in {self.db_handler.coin_list_table}, bars are not written: {sorted(yeni)}")
+            return
+        self.logger.info(f"Symbol registry: new symbols on the stream: {sorted(yeni)}")
+        self.db_handler.add_coins(sorted(yeni))
+        self.refresh()
+
+    # Symbols that stopped ticking for retire_after seconds are retired, and come back with their next tick
+    def retire_stale(self, now: float = None):
+        now = time.time() if now is None else now
+        n = self.tick_store.size
+        last_event = self.tick_store.last("E")[:n]
+        for symbol, event_time in zip(self.tick_store.symbols[:n], last_event):
+            if event_time <= 0 or symbol not in self.universe:
+                continue
+            stale = now - event_time > self.retire_after
+            if stale and symbol not in self.retired:
+                self.retired.add(symbol)
+                self.logger.info(f"Symbol registry: {symbol} retired, no tick for {now - event_time:.0f}s")
+            elif not stale and symbol in self.retired:
+                self.retired.discard(symbol)
+                self.logger.info(f"Symbol registry: {symbol} is ticking again")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.retry_interval if self._missing else self.refresh_interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                self.register_new()
+                self.refresh()
+                self.retire_stale()
+            except Exception as e:
+                self.logger.warning(f"Symbol registry refresh error: {type(e).__name__}: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="symbol-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
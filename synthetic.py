@@ -0,0 +1,40 @@
+import json
+import random
+
+# Synthetic !markPrice@arr frames, shaped like the Binance combined stream payload.
+# Used by the local stand-in websocket server and the benchmarks.
+
+def synthetic_symbols(n: int) -> list:
+    symbols = ["BTCUSDT", "ETHUSDT"]
+    i = 0
+    while len(symbols) < n:
+        symbols.append(f"C{i:04d}USDT")
+        i += 1
+    return symbols[:n]
+
+# Random walk of mark/index prices and funding rates per symbol
+class SyntheticMarket:
+    def __init__(self, symbols: list, seed: int = 0):
+        self.symbols = symbols
+        self.random = random.Random(seed)
+        self.prices = {s: self.random.uniform(0.01, 50000.0) for s in symbols}
+        self.rates = {s: self.random.uniform(-0.0005, 0.0005) for s in symbols}
+
+    # One markPriceUpdate list for all symbols (or the given ones) at event_time (milliseconds)
+    def items(self, event_time: int, symbols: list = None) -> list:
+        next_funding = (event_time // 28800000 + 1) * 28800000
+        items = []
+        for s in self.symbols if symbols is None else symbols:
+            self.prices[s] *= 1 + self.random.gauss(0, 0.0005)
+            self.rates[s] += self.random.gauss(0, 0.000002)
+            mark = self.prices[s]
+            items.append({
+                "e": "markPriceUpdate", "E": event_time, "s": s,
+                "p": f"{mark:.8f}", "P": f"{mark * 1.0001:.8f}", "i": f"{mark * 0.9999:.8f}",
+                "r": f"{self.rates[s]:.8f}", "T": next_funding,
+            })
+        return items
+
+    # Raw frame text as received from the websocket
+    def frame(self, event_time: int) -> str:
+        return json.dumps({"stream": "!markPrice@arr", "data": self.items(event_time)})
@@ -0,0 +1,97 @@
+import json
+import logging
+import numpy as np
+import pandas as pd
+
+from main import FundingRateManager
+from intervals import IntervalSet
+from sinks import MemorySink
+from synthetic import SyntheticMarket, synthetic_symbols
+
+logger = logging.getLogger("FundingRate_Test")
+hour_start = 1700006400   # an hour boundary, the run covers exactly one 1h bar
+
+
+def bucket(timestamp: int, period: int) -> int:
+    return -(-timestamp // period) * period
+
+# Bars of one interval recomputed from their children: mean of the child means, last child's funding rate
+def naive_rollup(child: dict, period: int) -> dict:
+    barlar = {}
+    for timestamp in sorted(child):
+        for symbol, (r, r_mean, p_mean, i_mean) in child[timestamp].items():
+            barlar.setdefault(bucket(timestamp, period), {}).setdefault(symbol, []).append((r, r_mean, p_mean, i_mean))
+    return {timestamp: {symbol: (rows[-1][0], *np.mean([row[1:] for row in rows], axis=0))
+                        for symbol, rows in symbols.items()}
+            for timestamp, symbols in barlar.items()}
+
+def test_bars_match_naive_recomputation():
+    symbols = synthetic_symbols(4)
+    market = SyntheticMarket(symbols, seed=1)
+    sink = MemorySink()
+    manager = FundingRateManager(sink, logger, init_coins=False, intervals=IntervalSet(("1m", "5m", "1h")))
+
+    ticks = {}   # 1m close -> symbol -> [(r, p, i)]
+    for k in range(1, 3601):
+        event_ms = (hour_start + k) * 1000
+        gonderilen = [s for j, s in enumerate(symbols) if (k + j) % 7]   # every symbol misses some frames
+        items = market.items(event_ms, gonderilen)
+        for item in items:
+            ticks.setdefault(bucket(hour_start + k, 60), {}).setdefault(item["s"], []).append(
+                (float(item["r"]), float(item["p"]), float(item["i"])))
+        message = json.dumps({"stream": "!markPrice@arr", "data": items})
+        sink.insert_bars(manager.ingest_frame(manager.decoder.decode(message)))
+
+    expected = {"1m": {timestamp: {symbol: (rows[-1][0], *np.mean(rows, axis=0)) for symbol, rows in per_symbol.items()}
+                       for timestamp, per_symbol in ticks.items()}}
+    expected["5m"] = naive_rollup(expected["1m"], 300)
+    expected["1h"] = naive_rollup(expected["5m"], 3600)
+    assert (len(expected["1m"]), len(expected["5m"]), len(expected["1h"])) == (60, 12, 1)
+
+    for interval, barlar in expected.items():
+        for symbol in symbols:
+            rows = sink.bars[interval][symbol]
+            assert [row["timestamp"] for row in rows] == sorted(barlar)
+            for row in rows:
+                r, r_mean, p_mean, i_mean = barlar[row["timestamp"]][symbol]
+                assert row["funding_rate"] == r
+                assert np.allclose([row["funding_rate_mean"], row["mark_price_mean"], row["index_price_mean"]],
+                                   [r_mean, p_mean, i_mean], rtol=1e-12, atol=1e-15)
+
+
+# Frames of one hour for the given symbols, every symbol missing from some of them
+def hour_of_frames(symbols: list) -> list:
+    market = SyntheticMarket(symbols, seed=2)
+    return [json.dumps({"stream": "!markPrice@arr", "data": market.items((hour_start + k) * 1000, symbols[k % 3:])})
+            for k in range(1, 3601)]
+
+def feed(manager: FundingRateManager, sink: MemorySink, messages: list):
+    for message in messages:
+        sink.insert_bars(manager.ingest_frame(manager.decoder.decode(message)))
+
+def bar_rows(sink: MemorySink, interval: str, after: int, upto: int) -> pd.DataFrame:
+    rows = [dict(row, symbol=symbol) for symbol, symbol_rows in sink.bars[interval].items() for row in symbol_rows]
+    frame = pd.DataFrame(rows)
+    return frame[(frame["timestamp"] > after) & (frame["timestamp"] <= upto)]
+
+def test_restart_mid_hour_rehydrates_the_open_rollups():
+    symbols = synthetic_symbols(5)
+    messages = hour_of_frames(symbols)
+    intervals = IntervalSet(("1m", "5m", "1h"))
+    kesintisiz = MemorySink()
+    feed(FundingRateManager(kesintisiz, logger, init_coins=False, intervals=intervals), kesintisiz, messages)
+
+    sink = MemorySink()
+    feed(FundingRateManager(sink, logger, init_coins=False, intervals=intervals), sink, messages[:1920])
+    restarted = FundingRateManager(sink, logger, init_coins=False, intervals=intervals)   # 1m bar 1920 was the last one
+    restarted.rehydrate_from([("5m", bar_rows(sink, "1m", hour_start + 1800, hour_start + 1920)),
+                              ("1h", bar_rows(sink, "5m", hour_start, hour_start + 1920))])
+    feed(restarted, sink, messages[1920:])
+
+    for symbol in symbols:
+        assert sink.bars["5m"][symbol] == kesintisiz.bars["5m"][symbol]
+        (beklenen,), (bar,) = kesintisiz.bars["1h"][symbol], sink.bars["1h"][symbol]
+        assert bar["timestamp"] == beklenen["timestamp"] and bar["funding_rate"] == beklenen["funding_rate"]
+        assert np.allclose([bar[c] for c in ("funding_rate_mean", "mark_price_mean", "index_price_mean")],
+                           [beklenen[c] for c in ("funding_rate_mean", "mark_price_mean", "index_price_mean")],
+                           rtol=1e-12, atol=1e-15)
@@ -0,0 +1,98 @@
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_batch import BarBatch
+from sinks import MemorySink, TeeSink
+from write_queue import RejectedBars
+from archive import ParquetArchive, ArchiveSink, ArchiveReader, export_tables
+
+logger = logging.getLogger("FundingRate_Test")
+day = 1700006400 - 1700006400 % 86400   # a UTC midnight
+
+
+def bars_at(timestamp: int, symbols=("BTCUSDT", "ETHUSDT"), interval: str = "1m") -> BarBatch:
+    n = len(symbols)
+    return BarBatch(interval, timestamp, list(symbols), {
+        "funding_rate": np.full(n, timestamp / 1e10), "funding_rate_mean": np.full(n, timestamp / 1e10),
+        "mark_price_mean": np.arange(n) + 100.0, "index_price_mean": np.arange(n) + 99.0,
+    })
+
+def test_live_bars_round_trip_and_split_by_day(tmp_path):
+    sink = ArchiveSink(ParquetArchive(str(tmp_path)), logger=logger)
+    closes = [day - 120, day - 60, day, day + 60, day + 120]
+    for timestamp in closes:
+        assert sink.insert_bars([bars_at(timestamp)]) == {"archive/1m": 2}
+    assert sink.rows["1m"] == 6   # the first day was written when the second one started
+    sink.close()
+
+    frame = ArchiveReader(str(tmp_path)).read("1m")
+    assert list(frame["timestamp"]) == closes * 2 and list(frame["symbol"]) == ["BTCUSDT"] * 5 + ["ETHUSDT"] * 5
+    np.testing.assert_allclose(frame["mark_price_mean"], [100.0] * 5 + [101.0] * 5)
+    assert frame["open_interest"].isna().all()
+    assert sorted(p.name for p in (tmp_path / "1m").iterdir()) == ["date=2023-11-14", "date=2023-11-15"]
+
+def test_late_open_interest_is_merged_into_its_bar(tmp_path):
+    sink = ArchiveSink(ParquetArchive(str(tmp_path)))
+    sink.insert_bars([bars_at(day + 60)])
+    sink.insert_bars([BarBatch("1m", day + 60, ["BTCUSDT"], {"open_interest": np.array([1234.5]),
+                                                             "oi_transaction_timestamp": np.array([day + 41])})])
+    sink.close()
+    frame = ArchiveReader(str(tmp_path)).read("1m", symbols=["btcusdt"])
+    assert len(frame) == 1
+    assert frame["open_interest"].iat[0] == 1234.5 and frame["mark_price_mean"].iat[0] == 100.0
+
+def test_reader_filters_range_symbols_and_columns(tmp_path):
+    sink = ArchiveSink(ParquetArchive(str(tmp_path)))
+    for k in range(1, 6):
+        sink.insert_bars([bars_at(day + 3600 * k, interval="1h")])
+    sink.close()
+    frame = ArchiveReader(str(tmp_path)).read("1h", start=day + 7200, end=day + 14400, symbols=["ETHUSDT"],
+                                               columns=["funding_rate"])
+    assert list(frame.columns) == ["symbol", "timestamp", "funding_rate"]
+    assert list(frame["timestamp"]) == [day + 7200, day + 10800, day + 14400]
+    assert ArchiveReader(str(tmp_path)).read("1d").empty
+
+
+# iter_bar_chunks of a DatabaseHandler over per-coin tables held in memory
+class StubDatabase:
+    storage_mode = "per_symbol"
+
+    def __init__(self, rows: dict):
+        self.rows = rows   # coin -> DataFrame
+
+    def iter_bar_chunks(self, interval, start_ts, end_ts, coin_name=None, chunk_rows=50000):
+        frame = self.rows[coin_name]
+        frame = frame[(frame["timestamp"] > start_ts) & (frame["timestamp"] <= end_ts)]
+        for i in range(0, len(frame), chunk_rows):
+            parca = frame.iloc[i:i + chunk_rows].copy()
+            parca.insert(0, "symbol", coin_name.upper())
+            yield parca
+
+def test_export_continues_after_the_last_export(tmp_path):
+    rows = {coin: pd.DataFrame({"timestamp": day + 60 * np.arange(1, 101), "funding_rate": 0.0001 * k})
+            for k, coin in enumerate(["btcusdt", "ethusdt"])}
+    db = StubDatabase(rows)
+    archive = ParquetArchive(str(tmp_path))
+    assert export_tables(db, archive, ["1m"], ["btcusdt", "ethusdt"], until=day + 3000, chunk_rows=16) == 100
+    assert archive.exported_upto("1m") == day + 3000
+    assert export_tables(db, archive, ["1m"], ["btcusdt", "ethusdt"], until=day + 6000, chunk_rows=16) == 100
+    frame = ArchiveReader(str(tmp_path)).read("1m")
+    assert len(frame) == 200 and not frame.duplicated(["symbol", "timestamp"]).any()
+    assert ParquetArchive.read_manifest(str(tmp_path))["exported"] == {"1m": day + 6000}
+
+
+# Primary sink that commits ETHUSDT and rejects BTCUSDT for good
+class RejectingSink:
+    def insert_bars(self, bars) -> dict:
+        raise RejectedBars({"oi_ETHUSDT": len(bars)}, [b.select(np.array(b.symbols) == "BTCUSDT") for b in bars],
+                           "table oi_BTCUSDT is broken")
+
+def test_tee_sink_archives_bars_the_primary_partly_rejected():
+    archive = MemorySink()
+    tee = TeeSink(RejectingSink(), archive, logger)
+    with pytest.raises(RejectedBars) as e:
+        tee.insert_bars([bars_at(day + 60)])
+    assert e.value.written == {"oi_ETHUSDT": 1}
+    assert sorted(archive.bars["1m"]) == ["BTCUSDT", "ETHUSDT"]
@@ -0,0 +1,117 @@
+import logging
+import numpy as np
+import pytest
+from mysql.connector import errors as mysql_errors
+
+from bar_batch import BarBatch
+from intervals import IntervalSet
+from database_handler import DatabaseHandler
+from write_queue import RejectedBars
+
+logger = logging.getLogger("FundingRate_Test")
+bar_close = 1700006400
+bar_datetime = BarBatch("1m", bar_close, [], {}).datetime   # local time, as the tables hold it
+
+
+# mysql.connector connection stand-in: executemany calls are kept until commit, `fail` maps a table
+# name to the exception every statement on it raises
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.pending = []
+
+    @property
+    def in_transaction(self) -> bool:
+        return bool(self.pending)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.server.committed.append(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+    def close(self):
+        pass
+
+class FakeCursor:
+    def __init__(self, conn: FakeConnection):
+        self.conn = conn
+        self.rowcount = 0
+
+    def executemany(self, sql_str: str, params: list):
+        table_name = sql_str.split(" INTO ")[1].split(" ")[0]
+        self.conn.server.attempts.append(table_name)
+        if table_name in self.conn.server.fail:
+            raise self.conn.server.fail[table_name]
+        self.conn.pending.append((table_name, sql_str, params))
+        self.rowcount = len(params)
+
+    def close(self):
+        pass
+
+class FakeServer:
+    def __init__(self):
+        self.committed = []   # one list of (table, sql, params) per transaction
+        self.attempts = []
+        self.fail = {}
+
+def handler(storage_mode: str = "per_symbol") -> (DatabaseHandler, FakeServer):
+    db = DatabaseHandler(logger, intervals=IntervalSet(("1m", "5m")))
+    server = FakeServer()
+    db.pool._open = lambda: FakeConnection(server)
+    db.storage_mode = storage_mode
+    return db, server
+
+def bars() -> list:
+    return [BarBatch("1m", bar_close, ["BTCUSDT", "ETHUSDT"], {"funding_rate": np.array([0.0001, np.nan]),
+                                                              "mark_price_mean": np.array([37000.5, 2050.25])}),
+            BarBatch("5m", bar_close, ["BTCUSDT"], {"funding_rate": np.array([0.0002])})]
+
+
+def test_bars_go_out_as_one_transaction_with_one_statement_per_table():
+    db, server = handler()
+    assert db.insert_bars(bars()) == {"oi_BTCUSDT": 1, "oi_ETHUSDT": 1, "oi5m_BTCUSDT": 1}
+    (transaction,) = server.committed
+    assert [table for table, _, _ in transaction] == ["oi_BTCUSDT", "oi_ETHUSDT", "oi5m_BTCUSDT"]
+    _, sql_str, params = transaction[1]
+    assert sql_str == ("INSERT INTO oi_ETHUSDT (timestamp, datetime, funding_rate, mark_price_mean) VALUES (%s, %s, %s, %s)"
+                       " ON DUPLICATE KEY UPDATE funding_rate = IF(funding_rate IS NULL, VALUES(funding_rate), funding_rate),"
+                       " mark_price_mean = IF(mark_price_mean IS NULL, VALUES(mark_price_mean), mark_price_mean);")
+    assert params == [(bar_close, bar_datetime, None, 2050.25)]   # NaN is bound as NULL
+
+def test_wide_layout_writes_one_statement_per_interval():
+    db, server = handler("wide")
+    db.symbol_ids = {"BTCUSDT": 1}   # ETHUSDT has no COINS.id yet
+    assert db.insert_bars(bars()) == {"fr_1m": 1, "fr_5m": 1}
+    (transaction,) = server.committed
+    table_name, sql_str, params = transaction[0]
+    assert table_name == "fr_1m" and sql_str.startswith("INSERT INTO fr_1m (symbol_id, timestamp, datetime, funding_rate")
+    assert params == [(1, bar_close, bar_datetime, 0.0001, 37000.5)]
+
+def test_statement_texts_are_cached():
+    db, _ = handler()
+    columns = ("timestamp", "datetime", "funding_rate")
+    assert db.insert_sql("oi_BTCUSDT", columns) is db.insert_sql("oi_BTCUSDT", list(columns))
+    assert db.insert_sql("oi_BTCUSDT", columns, upsert=False, ignore=True) == \
+        "INSERT IGNORE INTO oi_BTCUSDT (timestamp, datetime, funding_rate) VALUES (%s, %s, %s);"
+
+
+def test_transient_errors_are_retried_then_reported_as_none():
+    db, server = handler()
+    server.fail["oi_ETHUSDT"] = mysql_errors.OperationalError("Lost connection", errno=2013)
+    assert db.insert_bars(bars()) is None
+    assert server.committed == [] and server.attempts.count("oi_ETHUSDT") == 4   # first try and 3 retries
+
+def test_a_table_that_can_not_be_written_is_rejected_alone():
+    db, server = handler()
+    server.fail["oi_ETHUSDT"] = mysql_errors.ProgrammingError("Table 'oi_ETHUSDT' doesn't exist", errno=1146)
+    with pytest.raises(RejectedBars) as e:
+        db.insert_bars(bars())
+    assert e.value.written == {"oi_BTCUSDT": 1, "oi5m_BTCUSDT": 1}
+    assert [(b.interval, b.symbols) for b in e.value.rejected] == [("1m", ["ETHUSDT"])]
+    assert e.value.rejected[0].columns["mark_price_mean"].tolist() == [2050.25]
+    assert [[table for table, _, _ in transaction] for transaction in server.committed] == [["oi_BTCUSDT"], ["oi5m_BTCUSDT"]]
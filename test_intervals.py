@@ -0,0 +1,42 @@
+import json
+import logging
+import pytest
+
+from main import FundingRateManager
+from intervals import IntervalSet, interval_seconds, table_prefix
+from sinks import MemorySink
+from synthetic import SyntheticMarket, synthetic_symbols
+
+logger = logging.getLogger("FundingRate_Test")
+
+
+def test_interval_names_and_table_prefixes():
+    assert [interval_seconds(i) for i in ("1s", "10s", "15m", "8h", "1d")] == [1, 10, 900, 28800, 86400]
+    assert table_prefix("1m") == "oi_" and table_prefix("8h") == "oi8h_"
+    for name in ("1w", "0m", "m", "1.5h"):
+        with pytest.raises(ValueError):
+            interval_seconds(name)
+
+def test_interval_set_is_ordered_and_validated(monkeypatch):
+    intervals = IntervalSet(["8h", " 1m", "15m", "4h", ""])
+    assert intervals.names == ["1m", "15m", "4h", "8h"] and intervals.base == "1m"
+    assert intervals.rollup_levels == (("15m", 900), ("4h", 14400), ("8h", 28800))
+    assert intervals.closing(28800) == ["1m", "15m", "4h", "8h"] and intervals.closing(900) == ["1m", "15m"]
+    for invalid in (["5m", "7m"], ["60s", "1m"], []):
+        with pytest.raises(ValueError):
+            IntervalSet(invalid)
+    monkeypatch.setenv("FUNDING_RATE_INTERVALS", "1s,10s")
+    assert IntervalSet.from_env().names == ["1s", "10s"] and IntervalSet.from_env().oi_interval == "1s"
+
+def test_second_bars_roll_up_to_minutes():
+    symbols = synthetic_symbols(3)
+    market = SyntheticMarket(symbols, seed=4)
+    sink = MemorySink()
+    manager = FundingRateManager(sink, logger, init_coins=False, intervals=IntervalSet(("1s", "10s", "1m")))
+    start = 1700006400
+    for k in range(1, 121):
+        message = json.dumps({"stream": "!markPrice@arr", "data": market.items((start + k) * 1000)})
+        sink.insert_bars(manager.ingest_frame(manager.decoder.decode(message)))
+    assert [len(sink.bars[interval]["BTCUSDT"]) for interval in ("1s", "10s", "1m")] == [120, 12, 2]
+    assert [row["timestamp"] for row in sink.bars["1m"]["BTCUSDT"]] == [start + 60, start + 120]
+    assert sink.bars["1m"]["BTCUSDT"][-1]["funding_rate"] == sink.bars["1s"]["BTCUSDT"][-1]["funding_rate"]
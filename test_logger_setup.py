@@ -0,0 +1,44 @@
+import json
+import logging
+
+import logger_setup
+from logger_setup import LoggerSetup, RepeatFilter
+
+
+def record(message: str, level: int = logging.WARNING, *args) -> logging.LogRecord:
+    return logging.LogRecord("FundingRate_Test", level, __file__, 1, message, args, None)
+
+def test_repeated_warnings_are_suppressed_and_counted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logger_setup.time, "monotonic", lambda: now[0])
+    repeat_filter = RepeatFilter(interval=60)
+    assert repeat_filter.filter(record("insert_bars error: %s", logging.WARNING, "lost connection"))
+    for _ in range(5):
+        now[0] += 1
+        assert not repeat_filter.filter(record("insert_bars error: %s", logging.WARNING, "lost connection"))
+    assert repeat_filter.filter(record("insert_bars error: %s", logging.WARNING, "deadlock"))   # another message
+    assert repeat_filter.filter(record("insert_bars error: %s", logging.INFO, "lost connection"))   # below WARNING
+
+    now[0] = 1061
+    sonraki = record("insert_bars error: %s", logging.WARNING, "lost connection")
+    assert repeat_filter.filter(sonraki)
+    assert sonraki.getMessage() == "insert_bars error: lost connection (suppressed 5 repeats in the last 61s)"
+    now[0] += 1
+    sonraki = record("insert_bars error: %s", logging.WARNING, "lost connection")
+    assert not repeat_filter.filter(sonraki)
+
+def test_records_are_written_by_the_listener_as_json_lines(tmp_path):
+    log_path = tmp_path / "funding_rate.log"
+    setup = LoggerSetup(str(log_path), json_lines=True, repeat_interval=60)
+    try:
+        logger = setup.get_logger()
+        logger.info("Websocket opened")
+        for _ in range(3):
+            logger.warning("Websocket stale, no frame for 15s")
+    finally:
+        setup.stop()
+        logging.getLogger().removeHandler(setup.handler)
+    lines = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [(line["level"], line["message"]) for line in lines] == [
+        ("INFO", "Websocket opened"), ("WARNING", "Websocket stale, no frame for 15s")]
+    assert lines[0]["logger"] == "FundingRate_Logger" and lines[0]["thread"] == "MainThread"
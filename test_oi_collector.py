@@ -0,0 +1,44 @@
+import asyncio
+import logging
+import aiohttp
+
+from synthetic import synthetic_symbols
+from oi_collector import OpenInterestCollector
+from fake_oi_server import FakeOpenInterestServer
+
+logger = logging.getLogger("FundingRate_Test")
+
+
+# One poll_once of the collector against the fake server. Also returns whether a further request
+# would have to wait for the collector's own weight budget.
+async def poll(server: FakeOpenInterestServer, symbols: list, **kwargs):
+    url = await server.start()
+    collector = OpenInterestCollector(lambda: symbols, logger, base_url=url, concurrency=len(symbols), **kwargs)
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
+            await collector.poll_once(session, symbols)
+        try:
+            await asyncio.wait_for(collector.limiter.acquire(), 0.2)
+            blocked = False
+        except asyncio.TimeoutError:
+            blocked = True
+    finally:
+        await server.stop()
+    return collector, blocked
+
+def test_oi_collector_backs_off_on_429():
+    symbols = synthetic_symbols(10)
+    server = FakeOpenInterestServer(weight_limit=5)
+    collector, blocked = asyncio.run(poll(server, symbols, weight_limit=100))
+    assert collector.requests == 10
+    assert collector.rate_limited > 0
+    assert len(collector.snapshots) == server.requests == 10 - collector.rate_limited
+    assert blocked   # Retry-After pauses every later request
+
+def test_oi_collector_keeps_its_weight_share():
+    symbols = synthetic_symbols(5)
+    server = FakeOpenInterestServer(weight_limit=2400)
+    collector, blocked = asyncio.run(poll(server, symbols, weight_limit=10, weight_share=0.5))
+    assert collector.rate_limited == 0 and collector.errors == 0
+    assert sorted(collector.snapshots) == sorted(symbols)
+    assert blocked   # 5 of the 5 requests allowed this minute are spent
@@ -0,0 +1,83 @@
+import os
+import json
+import logging
+import numpy as np
+from urllib.request import urlopen
+from urllib.error import HTTPError
+
+from bar_batch import BarBatch
+from tick_store import TickStore
+from query_api import BarCache, LatestSnapshot, LatestSnapshotReader, QueryServer
+
+logger = logging.getLogger("FundingRate_Test")
+
+
+def batch_at(interval: str, timestamp: int, symbols: list) -> BarBatch:
+    return BarBatch(interval, timestamp, symbols, {"funding_rate": np.array([timestamp / 1e8] * len(symbols))})
+
+def get(port: int, path: str):
+    try:
+        with urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_bar_cache_keeps_the_newest_bars_in_order():
+    bar_cache = BarCache({"1m": 3})
+    bar_cache.add([batch_at("1m", t, ["BTCUSDT", "ETHUSDT"]) for t in (60, 120, 180, 240)])
+    bar_cache.add([batch_at("1m", 180, ["BTCUSDT"]), batch_at("1m", 300, [])])   # late and empty batches
+    assert [batch.timestamp for batch in bar_cache.batches["1m"]] == [120, 180, 240]
+    assert [row["timestamp"] for row in bar_cache.recent("1m", "BTCUSDT", limit=2)] == [180, 240]
+    assert bar_cache.recent("1m", "XRPUSDT", limit=2) == []
+    assert bar_cache.latest("1h") is None
+
+def test_bar_cache_sizes_unconfigured_intervals_to_a_day():
+    bar_cache = BarCache()
+    assert bar_cache.depth_of("1s") == 1440 and bar_cache.depth_of("15m") == 96 and bar_cache.depth_of("2d") == 30
+    bar_cache.add([batch_at("15m", 900 * k, ["BTCUSDT"]) for k in range(1, 101)])
+    assert len(bar_cache.batches["15m"]) == 96
+
+def test_snapshot_is_read_back_by_name():
+    tick_store = TickStore()
+    snapshot = LatestSnapshot(f"funding_rate_test_{os.getpid()}", capacity=2)
+    try:
+        values = {"r": np.array([1e-4, 2e-4, 3e-4]), "p": np.array([100.0, 10.0, 1.0]), "i": np.array([99.0, 9.0, 0.9]),
+                  "E": np.array([1000, 1000, 1000]), "T": np.array([28800000] * 3)}
+        slots = np.array([tick_store.slot(s) for s in ("BTCUSDT", "ETHUSDT", "XRPUSDT")])
+        tick_store.ingest_columns(slots, values)
+        snapshot.publish(tick_store, slots, values)
+        reader = LatestSnapshotReader(snapshot.name)
+        try:
+            latest = reader.latest()
+        finally:
+            reader.close()
+    finally:
+        snapshot.close()
+    assert latest["seq"] == 2 and list(latest["symbols"]) == ["BTCUSDT", "ETHUSDT"]   # beyond capacity left out
+    assert latest["symbols"]["ETHUSDT"] == {"funding_rate": 2e-4, "mark_price": 10.0, "index_price": 9.0,
+                                            "event_time": 1000, "next_funding_time": 28800000}
+
+def test_query_server_serves_bars_and_latest_ticks():
+    tick_store = TickStore()
+    bar_cache = BarCache()
+    bar_cache.add([batch_at("1m", t, ["BTCUSDT", "ETHUSDT"]) for t in (60, 120, 180)])
+    snapshot = LatestSnapshot(f"funding_rate_test_{os.getpid()}")
+    values = {"r": np.array([1e-4]), "p": np.array([100.0]), "i": np.array([99.0]),
+              "E": np.array([1000]), "T": np.array([28800000])}
+    slots = np.array([tick_store.slot("BTCUSDT")])
+    snapshot.publish(tick_store, slots, values)
+    query_server = QueryServer(bar_cache, snapshot, port=0)
+    query_server.start()
+    try:
+        status, body = get(query_server.port, "/bars?interval=1m&symbol=btcusdt&limit=2")
+        assert status == 200 and [row["timestamp"] for row in body["bars"]] == [120, 180]
+        status, body = get(query_server.port, "/bars?interval=1m")
+        assert status == 200 and sorted(body["bars"]) == ["BTCUSDT", "ETHUSDT"]
+        assert body["bars"]["BTCUSDT"]["timestamp"] == 180
+        status, body = get(query_server.port, "/latest?symbol=BTCUSDT")
+        assert status == 200 and body["symbols"]["BTCUSDT"]["mark_price"] == 100.0
+        assert get(query_server.port, "/bars?interval=1m&symbol=BTCUSDT&limit=x")[0] == 400
+        assert get(query_server.port, "/funding")[0] == 404
+    finally:
+        query_server.stop()
+        snapshot.close()
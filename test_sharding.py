@@ -0,0 +1,92 @@
+import logging
+import numpy as np
+
+from main import FundingRateManager
+from intervals import IntervalSet
+from sinks import MemorySink
+from bar_batch import BarBatch
+from decoder import MarkPriceFrame
+from synthetic import SyntheticMarket, synthetic_symbols
+from sharding import ShardCoordinator, FrameBatcher, assign_shards, shard_of
+
+logger = logging.getLogger("FundingRate_Test")
+start = 1700006400
+
+
+# Stands in for a worker process that is still running
+class AliveProcess:
+    exitcode = None
+
+    def is_alive(self) -> bool:
+        return True
+
+def frame_of(symbols: list, second: int) -> MarkPriceFrame:
+    return MarkPriceFrame.from_items(SyntheticMarket(symbols).items(second * 1000))
+
+def test_shards_are_stable_and_cover_every_symbol():
+    symbols = synthetic_symbols(50)
+    parcalar = assign_shards([s.lower() for s in symbols] + symbols, 4)
+    assert sorted(s for parca in parcalar for s in parca) == sorted(symbols)
+    assert all(shard_of(s, 4) == shard for shard, parca in enumerate(parcalar) for s in parca)
+    assert shard_of("BTCUSDT", 4) == shard_of("btcusdt", 4)
+
+def test_frame_batcher_groups_the_messages_of_one_second():
+    batcher = FrameBatcher(max_wait=2.0)
+    assert batcher.add(frame_of(["BTCUSDT"], start + 1)) == []
+    assert batcher.add(frame_of(["ETHUSDT"], start + 1)) == []
+    kapanan = batcher.add(frame_of(["BTCUSDT"], start + 2))   # a later second closes the frame
+    assert [frame.symbols for frame in kapanan] == [["BTCUSDT", "ETHUSDT"]]
+    kapanan = batcher.add(frame_of(["BTCUSDT"], start + 2))   # so does a symbol already in it
+    assert [frame.symbols for frame in kapanan] == [["BTCUSDT"]]
+    assert not batcher.due(batcher.started + 1) and batcher.due(batcher.started + 2)
+    assert batcher.flush().symbols == ["BTCUSDT"]
+
+# Coordinator over a MemorySink without worker processes; the shards' bars are handed to _on_bars
+def coordinator_of(shards: list, intervals: IntervalSet) -> ShardCoordinator:
+    manager = FundingRateManager(MemorySink(), logger, init_coins=False, intervals=intervals)
+    coordinator = ShardCoordinator(manager, len(shards), "ws://127.0.0.1/stream?streams=", logger, merge_timeout=5.0)
+    coordinator.workers = {shard: [AliveProcess(), None, symbols] for shard, symbols in enumerate(shards)}
+    return coordinator
+
+def test_merged_bars_match_a_single_process():
+    intervals = IntervalSet(("1m", "5m"))
+    symbols = synthetic_symbols(12)
+    shards = assign_shards(symbols, 3)
+    market = SyntheticMarket(symbols, seed=3)
+    tek = FundingRateManager(MemorySink(), logger, init_coins=False, intervals=intervals)
+    workers = [FundingRateManager(None, logger, init_coins=False, intervals=intervals) for _ in shards]
+    coordinator = coordinator_of(shards, intervals)
+
+    for k in range(1, 601):
+        items = market.items((start + k) * 1000, symbols[k % 4:])
+        tek.db_handler.insert_bars(tek.ingest_frame(MarkPriceFrame.from_items(items)))
+        for shard, worker in enumerate(workers):
+            parca = [item for item in items if item["s"] in shards[shard]]
+            kapanan_barlar = worker.ingest_frame(MarkPriceFrame.from_items(parca))
+            if kapanan_barlar:
+                coordinator._on_bars(shard, kapanan_barlar)
+        coordinator._drain(now=0.0)
+    assert not coordinator.pending and coordinator.merged == 10 and coordinator.late == 0   # 5m bars close with a 1m bar
+
+    merged, expected = coordinator.manager.db_handler.bars, tek.db_handler.bars
+    for interval in ("1m", "5m"):
+        assert sorted(merged[interval]) == sorted(symbols)
+        for symbol in symbols:
+            assert merged[interval][symbol] == expected[interval][symbol]
+
+def bars_of(symbols: list, timestamp: int) -> list:
+    return [BarBatch("1m", timestamp, symbols, {"funding_rate": np.zeros(len(symbols))})]
+
+def test_a_quiet_shard_holds_a_close_until_the_timeout():
+    coordinator = coordinator_of([["BTCUSDT"], ["ETHUSDT"]], IntervalSet(("1m",)))
+    sink = coordinator.manager.db_handler
+    coordinator._on_bars(0, bars_of(["BTCUSDT"], start + 60))
+    first = coordinator.pending[start + 60]["first"]
+    coordinator._drain(now=first + 1)
+    assert start + 60 in coordinator.pending and not sink.bars
+    coordinator._drain(now=first + 5)
+    assert sorted(sink.bars["1m"]) == ["BTCUSDT"] and coordinator.written_upto == start + 60
+
+    coordinator._on_bars(1, bars_of(["ETHUSDT"], start + 60))   # the late shard is written by itself
+    assert coordinator.late == 1 and not coordinator.pending
+    assert [row["timestamp"] for row in sink.bars["1m"]["ETHUSDT"]] == [start + 60]
@@ -0,0 +1,102 @@
+import logging
+import numpy as np
+import pandas as pd
+
+from main import FundingRateManager
+from tick_store import TickStore
+from symbol_registry import SymbolRegistry
+from synthetic import synthetic_symbols
+
+logger = logging.getLogger("FundingRate_Test")
+
+
+# DatabaseHandler stand-in: COINS in memory, the tables of `failing` symbols can not be created
+class StubDatabase:
+    coin_list_table = "COINS"
+    storage_mode = "per_symbol"
+    table_prefixes = {"1m": "oi_", "5m": "oi5m_"}
+
+    def __init__(self, symbols: list, existing: list = (), failing: set = ()):
+        self.symbols = list(symbols)
+        self.tables = {self.table_name(s, interval) for s in existing for interval in self.table_prefixes}
+        self.failing = set(failing)
+        self.symbol_ids = {}
+        self.created = []
+
+    def table_name(self, coin: str, interval: str) -> str:
+        return self.table_prefixes[interval] + coin.upper()
+
+    def coin_list_database(self):
+        return pd.DataFrame({"id": range(1, len(self.symbols) + 1), "parite": self.symbols, "oi_pool_id": 0})
+
+    def get_tables(self, prefix: str = "oi"):
+        return pd.DataFrame(sorted(self.tables))
+
+    def db_yeni_coin_ekle(self, coin_listesi) -> list:
+        olusturulan = [coin for coin in coin_listesi if coin not in self.failing]
+        for coin in olusturulan:
+            self.tables.update(self.table_name(coin, interval) for interval in self.table_prefixes)
+        self.created.append(olusturulan)
+        return olusturulan
+
+    def add_coins(self, coin_listesi):
+        self.symbols.extend(c for c in coin_listesi if c not in self.symbols)
+
+
+def ready_symbols(registry: SymbolRegistry) -> list:
+    store = registry.tick_store
+    return [s for s, ready in zip(store.symbols, registry.ready_mask(store.size)) if ready]
+
+def test_manager_starts_with_a_large_universe():
+    symbols = synthetic_symbols(250)
+    db = StubDatabase(symbols, existing=symbols[:100])
+    manager = FundingRateManager(db, logger)
+    assert manager.tick_store.size == 250
+    assert sorted(ready_symbols(manager.registry)) == sorted(symbols)
+    assert db.created == [sorted(symbols[100:])]   # one batch, only the missing ones
+
+def test_failed_tables_are_retried_before_the_symbol_is_ready():
+    symbols = synthetic_symbols(20)
+    db = StubDatabase(symbols, failing={"ETHUSDT"})
+    registry = SymbolRegistry(db, TickStore(), logger)
+    registry.refresh()
+    registry.sync()
+    assert "ETHUSDT" not in ready_symbols(registry) and len(ready_symbols(registry)) == 19
+    assert registry.refresh() == ([], [])   # COINS unchanged, the failed symbol is retried anyway
+    db.failing.clear()
+    registry.refresh()
+    registry.sync()
+    assert sorted(ready_symbols(registry)) == sorted(symbols)
+    assert db.created[-1] == ["ETHUSDT"]
+
+def test_stream_symbols_are_registered_and_removed_ones_retired():
+    db = StubDatabase(["BTCUSDT", "ETHUSDT"])
+    registry = SymbolRegistry(db, TickStore(), logger)
+    registry.refresh()
+    registry.sync()
+    registry.tick_store.slot("NEWUSDT")   # first tick of a symbol missing from COINS
+    registry.sync()
+    registry.register_new()
+    registry.sync()
+    assert "NEWUSDT" in db.symbols and ready_symbols(registry) == ["BTCUSDT", "ETHUSDT", "NEWUSDT"]
+
+    db.symbols.remove("ETHUSDT")
+    added, removed = registry.refresh()
+    registry.sync()
+    assert (added, removed) == ([], ["ETHUSDT"])
+    assert "ETHUSDT" in registry.retired and ready_symbols(registry) == ["BTCUSDT", "NEWUSDT"]
+
+def test_ticks_retire_and_revive_symbols():
+    db = StubDatabase(["BTCUSDT", "ETHUSDT"])
+    registry = SymbolRegistry(db, TickStore(), logger, retire_after=60)
+    registry.refresh()
+    registry.sync()
+    slots = np.array([registry.tick_store.slot("BTCUSDT"), registry.tick_store.slot("ETHUSDT")])
+    registry.tick_store.ingest_columns(slots, {"r": np.zeros(2), "p": np.ones(2), "i": np.ones(2),
+                                               "E": np.array([1000, 1100]), "T": np.zeros(2, dtype=np.int64)})
+    registry.retire_stale(now=1130)
+    assert registry.retired == {"BTCUSDT"} and registry.active_symbols == ["ETHUSDT"]
+    registry.tick_store.ingest_columns(slots[:1], {"r": np.zeros(1), "p": np.ones(1), "i": np.ones(1),
+                                                   "E": np.array([1140]), "T": np.zeros(1, dtype=np.int64)})
+    registry.retire_stale(now=1150)
+    assert registry.retired == set()
@@ -0,0 +1,29 @@
+import json
+import numpy as np
+
+from tick_store import TickStore
+from decoder import make_decoder
+from synthetic import SyntheticMarket, synthetic_symbols
+
+
+def frame(market: SyntheticMarket, event_ms: int, symbols: list = None):
+    return make_decoder().decode(json.dumps({"stream": "!markPrice@arr", "data": market.items(event_ms, symbols)}))
+
+def test_keeps_the_latest_values_only():
+    symbols = synthetic_symbols(40)
+    market = SyntheticMarket(symbols, seed=3)
+    store = TickStore()
+    for k in range(200):
+        last = frame(market, 1700006400000 + k * 1000, symbols if k % 2 else symbols[:10])
+        store.ingest(last)
+    assert store.size == 40 and store.symbols == symbols
+    assert all(arr.shape == (len(store.ticks),) for arr in store.columns.values())   # no per-tick rows
+    assert list(store.ticks[:3]) == [200, 200, 200] and store.ticks[39] == 100
+    np.testing.assert_array_equal(store.last("r")[:40], last.values["r"])
+    assert store.last_value("ETHUSDT", "E") == 1700006400 + 199
+
+def test_slots_are_stable_while_growing():
+    store = TickStore(["BTCUSDT"])
+    slots = [store.slot(s) for s in synthetic_symbols(100)]
+    assert slots == list(range(100)) and store.slot("BTCUSDT") == 0
+    assert len(store.ticks) >= 100
@@ -0,0 +1,119 @@
+import time
+import threading
+import logging
+import numpy as np
+
+from bar_batch import BarBatch
+from sinks import MemorySink
+from spool import WriteAheadSpool
+from write_queue import BarWriteQueue
+
+logger = logging.getLogger("FundingRate_Test")
+
+
+def bars_at(timestamp: int) -> list:
+    return [BarBatch("1m", timestamp, ["BTCUSDT"], {"funding_rate": np.array([timestamp / 1e8])})]
+
+# MemorySink that fails every call while `down`, and every call holding a bar of a `bad` timestamp
+class FlakySink(MemorySink):
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.bad = set()
+
+    def insert_bars(self, bars) -> dict:
+        if self.down or any(batch.timestamp in self.bad for batch in bars):
+            return None
+        return super().insert_bars(bars)
+
+    def written(self) -> list:
+        return [row["timestamp"] for row in self.bars["1m"]["BTCUSDT"]]
+
+def spooled_queue(tmp_path, sink, timestamps: list) -> BarWriteQueue:
+    write_queue = BarWriteQueue(sink, logger, spool=WriteAheadSpool(str(tmp_path)), max_backoff=0, poison_after=3,
+                                spill_path=str(tmp_path / "spill"))
+    sink.down = True   # every record stays pending
+    for timestamp in timestamps:
+        write_queue._flush([(time.time(), bars_at(timestamp))])
+    sink.down = False
+    return write_queue
+
+def drain(write_queue: BarWriteQueue, times: int = 10):
+    for _ in range(times):
+        write_queue._drain_pending()
+
+def test_poisoned_record_in_the_middle_of_a_chunk_is_dead_lettered(tmp_path):
+    sink = FlakySink()
+    write_queue = spooled_queue(tmp_path, sink, [60, 120, 180, 240])
+    sink.bad = {120}
+    drain(write_queue)
+    assert sink.written() == [60, 180, 240]
+    assert [bars[0].timestamp for bars in write_queue.spool.dead_letters()] == [120]
+    assert write_queue.spool.pending == 0 and not write_queue._pending
+
+def test_failures_behind_the_last_written_record_stay_pending(tmp_path):
+    sink = FlakySink()
+    write_queue = spooled_queue(tmp_path, sink, [60, 120, 180, 240])
+    sink.bad = {120, 240}
+    drain(write_queue)
+    assert sink.written() == [60, 180]
+    assert [bars[0].timestamp for bars in write_queue.spool.dead_letters()] == [120]
+    assert [seq for seq, _ in write_queue._pending] == [4] and write_queue.spool.pending == 1
+
+def test_outage_never_dead_letters(tmp_path):
+    sink = FlakySink()
+    write_queue = spooled_queue(tmp_path, sink, [60, 120, 180])
+    sink.down = True
+    drain(write_queue)
+    assert write_queue.dead_lettered_rows == 0 and len(write_queue._pending) == 3
+    sink.down = False
+    drain(write_queue, 1)
+    assert sink.written() == [60, 120, 180] and write_queue.spool.pending == 0
+
+
+def test_drop_oldest_keeps_the_newest_frames(tmp_path):
+    write_queue = BarWriteQueue(MemorySink(), logger, maxsize=2, policy="drop_oldest", spill_path=str(tmp_path / "spill"))
+    for timestamp in (60, 120, 180):
+        write_queue.put(bars_at(timestamp))
+    assert write_queue.dropped_frames == 1
+    assert [bars[0].timestamp for _, bars in write_queue.queue.queue] == [120, 180]
+
+def test_spilled_frames_are_written_in_order(tmp_path):
+    sink = FlakySink()
+    write_queue = BarWriteQueue(sink, logger, maxsize=2, policy="spill", spill_path=str(tmp_path / "spill"))
+    for timestamp in (60, 120, 180, 240):
+        write_queue.put(bars_at(timestamp))
+    assert write_queue.spilled_frames == 2 and write_queue.depth == 4
+    write_queue.start()
+    write_queue.stop()
+    assert sink.written() == [60, 120, 180, 240]
+    assert write_queue.depth == 0 and not (tmp_path / "spill").exists()
+
+def test_frames_spilled_before_a_restart_are_written(tmp_path):
+    spill_path = str(tmp_path / "spill")
+    onceki = BarWriteQueue(MemorySink(), logger, maxsize=1, policy="spill", spill_path=spill_path)
+    for timestamp in (60, 120, 180):
+        onceki.put(bars_at(timestamp))   # the process dies with 120 and 180 in the spill file
+    with open(spill_path, "a") as f:
+        f.write('[1700000000.0, [{"interval"')   # and a line torn by the crash
+
+    sink = FlakySink()
+    write_queue = BarWriteQueue(sink, logger, maxsize=1, policy="spill", spill_path=spill_path)
+    write_queue.start()
+    assert write_queue.spilled_frames == 2
+    write_queue.put(bars_at(240))
+    write_queue.stop()
+    assert sink.written() == [120, 180, 240]
+
+def test_block_waits_for_the_writer(tmp_path):
+    sink = FlakySink()
+    write_queue = BarWriteQueue(sink, logger, maxsize=1, policy="block", spill_path=str(tmp_path / "spill"))
+    write_queue.put(bars_at(60))
+    producer = threading.Thread(target=write_queue.put, args=(bars_at(120),))
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive()   # the callback waits instead of losing the frame
+    write_queue.start()
+    producer.join(5)
+    write_queue.stop()
+    assert sink.written() == [60, 120]
@@ -0,0 +1,37 @@
+import time
+import asyncio
+import logging
+
+from synthetic import synthetic_symbols
+from ws_client import MarkPriceStream
+from fake_ws_server import FakeMarkPriceServer
+
+logger = logging.getLogger("FundingRate_Test")
+
+
+# Runs a MarkPriceStream against the fake server until it got `frames` frames
+async def stream_frames(server: FakeMarkPriceServer, frames: int, stale_after: float = 15.0) -> MarkPriceStream:
+    url = await server.start()
+    stream = MarkPriceStream(url, lambda message: None, logger, stale_after=stale_after, min_backoff=0.01, max_backoff=0.05)
+    task = asyncio.create_task(stream.run())
+    try:
+        deadline = time.monotonic() + 10
+        while stream.frames < frames and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+    finally:
+        await stream.stop()
+        await asyncio.wait_for(task, 5)
+        await server.stop()
+    return stream
+
+def test_stream_reconnects_after_close():
+    server = FakeMarkPriceServer(n_symbols=5, interval=0.01, close_after=3)
+    stream = asyncio.run(stream_frames(server, 10))
+    assert stream.frames >= 10
+    assert stream.reconnects >= 3 and server.connections >= 4
+
+def test_stream_reconnects_after_stall():
+    server = FakeMarkPriceServer(n_symbols=5, interval=0.01, stall_after=2)
+    stream = asyncio.run(stream_frames(server, 4, stale_after=0.2))
+    assert stream.frames >= 4
+    assert stream.reconnects >= 1 and server.connections >= 2
@@ -0,0 +1,69 @@
+import numpy as np
+
+# Preallocated, per-symbol latest markPriceUpdate values.
+# Every symbol owns one slot; each field is one array over the slots, so a whole !markPrice@arr
+# frame is written with a single fancy-indexed assignment per field. No ticks are retained: the
+# bar aggregators fold every frame into running sums, only the last values are read back.
+class TickStore:
+    float_fields = ("r", "p", "i")   # funding rate, mark price, index price
+    int_fields = ("E", "T")          # event time, next funding time (seconds)
+
+    def __init__(self, symbols=()):
+        self.symbol_index = {}   # symbol -> slot
+        self.symbols = []        # slot -> symbol
+        self.ticks = np.zeros(0, dtype=np.int64)   # total ticks written per slot
+        self.columns = {f: np.empty(0, dtype=np.float64) for f in self.float_fields}
+        self.columns.update({f: np.empty(0, dtype=np.int64) for f in self.int_fields})
+        self._reserve(max(len(symbols), 16))
+        for symbol in symbols:
+            self.slot(symbol)
+
+    # Grows every column (amortized doubling)
+    def _reserve(self, rows: int):
+        old_rows = len(self.ticks)
+        if rows <= old_rows:
+            return
+        self.ticks = np.concatenate([self.ticks, np.zeros(rows - old_rows, dtype=np.int64)])
+        for field, arr in self.columns.items():
+            grown = np.zeros(rows, dtype=arr.dtype)
+            grown[:old_rows] = arr
+            self.columns[field] = grown
+
+    # Returns the slot of a symbol, registering it on first sight
+    def slot(self, symbol: str) -> int:
+        idx = self.symbol_index.get(symbol)
+        if idx is None:
+            idx = len(self.symbols)
+            if idx >= len(self.ticks):
+                self._reserve(2 * len(self.ticks))
+            self.symbol_index[symbol] = idx
+            self.symbols.append(symbol)
+        return idx
+
+    @property
+    def size(self) -> int:
+        return len(self.symbols)
+
+    # Ingests a decoded !markPrice@arr frame (decoder.MarkPriceFrame, E and T in seconds) in one step.
+    # Returns the slots and the columnar values so aggregators can fold the same frame.
+    def ingest(self, frame):
+        slots = np.fromiter((self.slot(symbol) for symbol in frame.symbols), dtype=np.int64, count=len(frame))
+        self.ingest_columns(slots, frame.values)
+        return slots, frame.values
+
+    # Writes already-columnar values (field -> 1-D array aligned with slots) as the latest values.
+    # A symbol is expected at most once per frame, as Binance sends it.
+    def ingest_columns(self, slots: np.ndarray, values: dict):
+        if len(slots) == 0:
+            return
+        for field, arr in self.columns.items():
+            arr[slots] = values[field]
+        self.ticks[slots] += 1
+
+    # Per-symbol most recent value of a field
+    def last(self, field: str) -> np.ndarray:
+        return self.columns[field][:self.size]
+
+    # Most recent value of a field for one symbol
+    def last_value(self, symbol: str, field: str):
+        return self.columns[field][self.symbol_index[symbol]]
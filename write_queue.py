@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+
+from bar_batch import BarBatch
+
+# Raised by a sink when part of the bars can never be written (a missing table, a value the column
+# does not take) after everything else was committed. `written` is the usual {table: rows} result,
+# `rejected` the BarBatch list that failed; the write queue moves those to the dead letter file.
+class RejectedBars(Exception):
+    def __init__(self, written: dict, rejected: list, reason: str):
+        super().__init__(reason)
+        self.written = written
+        self.rejected = rejected
+        self.reason = reason
+
+
+# Bounded queue between the websocket callback and the database.
+# The callback only enqueues finished bars (the BarBatch list of one frame), a single
+# writer thread drains the queue in batches and hands every batch to sink.insert_bars in one go.
+#
+# Backpressure when the queue is full:
+#   "block"       the callback waits for room (nothing is lost, reading the socket stalls)
+#   "drop_oldest" the oldest queued frame is discarded
+#   "spill"       frames go to a JSON-lines file and are written once the queue has drained;
+#                 while the file holds frames new ones are spilled too, so the order is kept
+#
+# With a WriteAheadSpool every batch is appended and fsynced before the database write and
+# acknowledged after the commit. Failed batches stay pending (in memory and in the spool) and are
+# replayed in order, after sink.reset_connection(), with exponential backoff between attempts.
+#
+# A record must not hold the queue forever: bars a sink rejects for good (RejectedBars) go to the
+# spool's dead letter file right away, and a chunk still failing after poison_after attempts is
+# written one record at a time. A record that fails while a later one is written is dead-lettered,
+# so an outage (every write fails) never dead-letters anything.
+class BarWriteQueue:
+    policies = ("block", "drop_oldest", "spill")
+
+    def __init__(self, sink, logger, maxsize: int = 1000, policy: str = "block", batch_size: int = 64,
+                 spill_path: str = None, spool=None, max_backoff: float = 30.0, metrics=None,
+                 poison_after: int = 5):
+        if policy not in self.policies:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.sink = sink
+        self.logger = logger
+        self.policy = policy
+        self.batch_size = batch_size
+        self.spill_path = spill_path or (os.path.expanduser('~') + "/funding_rate_spill.jsonl")
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.spool = spool
+        self.max_backoff = max_backoff
+        self.metrics = metrics   # metrics.Metrics, flush durations and row counts are recorded when given
+        self.poison_after = poison_after
+        self._pending = deque()   # (spool seq, bars) not written yet, oldest first
+        self._failures = 0
+        self._retry_at = 0.0
+        self._spill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.spilled_frames = 0   # frames waiting in the spill file
+        self.dropped_frames = 0
+        self.written_batches = 0
+        self.written_rows = 0
+        self.failed_batches = 0
+        self.dead_lettered_rows = 0
+        self.last_flush_seconds = 0.0
+        self.last_flush_rows = 0
+
+    # Called from the websocket callback
+    def put(self, bars: list):
+        if not bars:
+            return
+        item = (time.time(), bars)
+        if self.policy == "spill" and self.spilled_frames:
+            self._spill(item)
+            return
+        if self.policy == "block":
+            self.queue.put(item)
+            return
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == "spill":
+                self._spill(item)
+                return
+            while True:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    continue
+
+    def _spill(self, item):
+        with self._spill_lock:
+            with open(self.spill_path, "a") as f:
+                f.write(json.dumps([item[0], [batch.to_payload() for batch in item[1]]]) + "\n")
+            self.spilled_frames += 1
+
+    # Takes every spilled frame back, oldest first, and empties the file
+    def _unspill(self) -> list:
+        with self._spill_lock:
+            if not self.spilled_frames:
+                return []
+            items = []
+            with open(self.spill_path) as f:
+                for line in f:
+                    enqueued_at, bars = json.loads(line)
+                    items.append((enqueued_at, [BarBatch.from_payload(batch) for batch in bars]))
+            os.remove(self.spill_path)
+            self.spilled_frames = 0
+            return items
+
+    # Frames waiting to be written (queue + spill file)
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize() + self.spilled_frames
+
+    # Age in seconds of the oldest frame still waiting in the queue
+    @property
+    def lag(self) -> float:
+        with self.queue.mutex:
+            oldest = self.queue.queue[0][0] if self.queue.queue else None
+        return 0.0 if oldest is None else time.time() - oldest
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "spool_pending": len(self._pending),
+            "lag_seconds": self.lag,
+            "spilled_frames": self.spilled_frames,
+            "dropped_frames": self.dropped_frames,
+            "written_batches": self.written_batches,
+            "written_rows": self.written_rows,
+            "failed_batches": self.failed_batches,
+            "dead_lettered_rows": self.dead_lettered_rows,
+            "last_flush_seconds": self.last_flush_seconds,
+            "last_flush_rows": self.last_flush_rows,
+        }
+
+    # Metrics collector: queue state read at scrape time
+    def collect(self):
+        yield "write_queue_depth", {}, self.depth
+        yield "write_queue_lag_seconds", {}, round(self.lag, 3)
+        yield "write_queue_dropped_frames", {}, self.dropped_frames
+        yield "spool_pending_batches", {}, len(self._pending)
+        yield "dead_lettered_rows", {}, self.dead_lettered_rows
+
+    # Keeps bars that can never be written in the spool's dead letter file (only logged without a spool)
+    def _dead_letter(self, bars: list, reason: str):
+        satir = sum(len(batch) for batch in bars)
+        self.dead_lettered_rows += satir
+        if self.spool is not None:
+            self.spool.dead_letter(bars)
+        self.logger.error(f"Writer: {satir} rows moved to the dead letter file ({reason}): " +
+                          ", ".join(f"{batch.interval}@{batch.timestamp}" for batch in bars))
+
+    # Writes bars with a single sink call, returns False if the sink failed
+    def _write(self, bars: list, frames: int) -> bool:
+        start = time.perf_counter()
+        try:
+            satir_sayilari = self.sink.insert_bars(bars)
+        except RejectedBars as e:   # The rest went through, the rejected part would fail on every retry
+            self._dead_letter(e.rejected, e.reason)
+            satir_sayilari = e.written
+        self.last_flush_seconds = time.perf_counter() - start
+        if self.metrics is not None:
+            self.metrics.observe("db_flush_seconds", self.last_flush_seconds)
+        if satir_sayilari is None:
+            self.failed_batches += 1
+            self.logger.warning(f"Writer: batch of {frames} frames could not be written")
+            if self.metrics is not None:
+                self.metrics.inc("db_flush_failures_total")
+            return False
+        self.written_batches += 1
+        self.last_flush_rows = sum(satir_sayilari.values())
+        self.written_rows += self.last_flush_rows
+        if self.metrics is not None:
+            self.metrics.inc("db_rows_written_total", self.last_flush_rows)
+        return True
+
+    # Writes one batch of frames. Without a spool a failed batch is lost (logged only).
+    def _flush(self, items: list):
+        bars = [bar for _, frame_bars in items for bar in frame_bars]
+        if self.spool is None:
+            self._write(bars, len(items))
+            return
+        seq = self.spool.append(bars)
+        self.spool.sync()
+        self._pending.append((seq, bars))
+        self._drain_pending()
+
+    # Replays the pending spool records in order, a few records per sink call, acknowledging as it goes
+    def _drain_pending(self):
+        while self._pending and time.time() >= self._retry_at:
+            chunk = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+            if not self._write([bar for _, bars in chunk for bar in bars], len(chunk)):
+                self._failures += 1
+                if self._failures >= self.poison_after and self._isolate_poisoned(chunk):
+                    continue
+                self._retry_at = time.time() + min(self.max_backoff, 0.5 * 2 ** self._failures)
+                reset_connection = getattr(self.sink, "reset_connection", None)
+                if reset_connection is not None:
+                    reset_connection()
+                return
+            if self._failures:
+                self.logger.info(f"Writer: sink is back after {self._failures} failed attempts, replaying the spool")
+            self._failures = 0
+            for _ in chunk:
+                self._pending.popleft()
+            self.spool.ack(chunk[-1][0])
+
+    # Writes the records of a failing chunk one at a time. The failed records followed by a written one
+    # hold something the sink will never take: they are dead-lettered and everything up to the last
+    # written record is acknowledged. Failures after it (the sink went down meanwhile) stay pending.
+    def _isolate_poisoned(self, chunk: list) -> bool:
+        basarili = [self._write(bars, 1) for _, bars in chunk]
+        if not any(basarili):
+            return False
+        son = max(i for i, ok in enumerate(basarili) if ok)
+        for (_, bars), ok in zip(chunk[:son + 1], basarili):
+            if not ok:
+                self._dead_letter(bars, f"failed {self._failures} times while later records were written")
+        for _ in range(son + 1):
+            self._pending.popleft()
+        self.spool.ack(chunk[son][0])
+        self._failures = 0
+        return True
+
+    # Blocks for the next frame, then drains whatever else is queued up to batch_size frames
+    def _next_batch(self, timeout: float) -> list:
+        try:
+            items = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return self._unspill()
+        while len(items) < self.batch_size:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while not (self._stop.is_set() and self.depth == 0):
+            items = self._next_batch(timeout=0.5)
+            for i in range(0, len(items), self.batch_size):
+                self._flush(items[i:i + self.batch_size])
+            if self._pending:
+                self._drain_pending()
+        if self._pending:
+            self.logger.warning(f"Writer stopped with {len(self._pending)} batches left in the spool")
+
+    def start(self):
+        if self.spool is not None:   # Records left over by a previous run go first
+            self._pending.extend(self.spool.replay())
+        if os.path.exists(self.spill_path):   # Frames spilled before a restart, written before newer spills
+            with open(self.spill_path, "r+b") as f:
+                data = f.read()
+                f.truncate(data.rfind(b"\n") + 1)   # a line torn by a crash would swallow the next one
+            self.spilled_frames = data.count(b"\n")
+            if self.spilled_frames:
+                self.logger.info(f"Writer: {self.spilled_frames} frames left in {self.spill_path} by a previous run")
+        self._thread = threading.Thread(target=self._run, name="bar-writer", daemon=True)
+        self._thread.start()
+
+    # Stops the writer after the queued frames are written
+    def stop(self, timeout: float = 30.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,75 @@
+import time
+import random
+import asyncio
+import websockets
+
+# asyncio ingestion engine for a Binance stream (e.g. !markPrice@arr).
+# Exactly one reader task owns the socket; on_frame(message) is called for every text frame.
+# A connection that closes, errors or goes silent for stale_after seconds is dropped and
+# re-opened after an exponential backoff with full jitter, so reconnects never nest.
+class MarkPriceStream:
+    def __init__(self, url: str, on_frame, logger, stale_after: float = 15.0,
+                 min_backoff: float = 0.05, max_backoff: float = 30.0, open_timeout: float = 10.0):
+        self.url = url
+        self.on_frame = on_frame
+        self.logger = logger
+        self.stale_after = stale_after
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.open_timeout = open_timeout
+
+        self.reconnects = 0
+        self.frames = 0
+        self.last_frame_at = None   # local clock of the last frame
+        self._ws = None
+        self._stopped = False
+
+    # Metrics collector: connection state read at scrape time
+    def collect(self):
+        yield "websocket_reconnects", {}, self.reconnects
+        yield "websocket_frames", {}, self.frames
+        if self.last_frame_at is not None:
+            yield "websocket_last_frame_age_seconds", {}, round(time.time() - self.last_frame_at, 3)
+
+    # Delay before the given (0-based) reconnect attempt
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.min_backoff * 2 ** attempt))
+
+    # Reads frames until the connection closes or goes stale
+    async def _read(self, ws):
+        while True:
+            message = await asyncio.wait_for(ws.recv(), timeout=self.stale_after)
+            self.frames += 1
+            self.last_frame_at = time.time()
+            self.on_frame(message)
+
+    async def run(self):
+        attempt = 0
+        while not self._stopped:
+            frames_before = self.frames
+            try:
+                async with websockets.connect(self.url, open_timeout=self.open_timeout, max_size=None) as ws:
+                    self._ws = ws
+                    self.logger.info(f"Websocket opened: {self.url}")
+                    await self._read(ws)
+            except asyncio.TimeoutError:
+                self.logger.warning(f"Websocket stale, no frame for {self.stale_after}s")
+            except Exception as e:
+                if not self._stopped:
+                    self.logger.warning(f"Websocket error: {type(e).__name__}: {e}")
+            finally:
+                self._ws = None
+            if self._stopped:
+                break
+            if self.frames > frames_before:   # The connection was healthy, start the backoff over
+                attempt = 0
+            self.reconnects += 1
+            delay = self.backoff(attempt)
+            attempt += 1
+            self.logger.info(f"Websocket reconnect #{self.reconnects} in {delay:.3f}s")
+            await asyncio.sleep(delay)
+
+    async def stop(self):
+        self._stopped = True
+        if self._ws is not None:
+            await self._ws.close()